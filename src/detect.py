@@ -0,0 +1,139 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from .watermark.hash_policy import KeyedHashPolicy
+from .watermark.table_store import load_detection_table
+from .watermark.table_detector import JamoTableDetector
+from .watermark.text_detector import JamoTextDetector
+from .watermark.schedule import EmbeddingSchedule
+from .watermark.long_detector import JamoLongDocumentDetector, DEFAULT_CHUNK_TOKENS
+
+# Detection-only entry point. Neither torch nor transformers is imported unless --export-table is used.
+#
+#   # Once, on a host with the model: export the detection table of the tokenizer
+#   python -m src.detect --export-table tables/kogpt2 --model skt/kogpt2-base-v2 --message "Read Me If You Can"
+#
+#   # Detection workers: token ids (one document per line, space separated)
+#   python -m src.detect --table tables/kogpt2 --message "Read Me If You Can" < ids.txt
+#
+#   # Detection workers: raw text (one document per line, tokenizer-free heuristic)
+#   python -m src.detect --text --message "Read Me If You Can" < texts.txt
+#
+#   # Repeating payload: the whole input is one (arbitrarily long) document, scored in chunks
+#   python -m src.detect --text --long --workers 4 --message "Read Me If You Can" < book.txt
+#
+# Text generated with a KeyedHashPolicy is detected (and its table exported) with the same --hash-key.
+
+def hash_policy_from_args(args: argparse.Namespace, mode: str | None = None, k_bits: int | None = None) -> KeyedHashPolicy | None:
+    """
+    KeyedHashPolicy of --hash-key (None without a key). mode and k_bits default to --mode / --k-bits.
+    """
+    if not args.hash_key:
+        return None
+    return KeyedHashPolicy(
+        mode=mode or args.mode, k_bits=k_bits or args.k_bits, key=args.hash_key, use_context=not args.hash_no_context
+    )
+
+def table_hash_policy(args: argparse.Namespace) -> KeyedHashPolicy | None:
+    if not args.hash_key:
+        return None
+    _, meta = load_detection_table(args.table)
+    return hash_policy_from_args(args, meta['mode'], meta['k_bits'])
+
+def export_table(path: str, model_name: str, message: str, mode: str, k_bits: int, hash_policy: KeyedHashPolicy | None = None):
+    from transformers import AutoTokenizer
+    from .watermark.detector import JamoWatermarkDetector
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    detector = JamoWatermarkDetector(tokenizer=tokenizer, original_message=message, mode=mode, k_bits=k_bits, hash_policy=hash_policy)
+    detector.export_detection_table(path)
+
+def detect_long(args: argparse.Namespace, schedule: EmbeddingSchedule):
+    if not args.text and not args.table:
+        raise SystemExit("either --table or --text is required")
+
+    mode, k_bits = args.mode, args.k_bits
+    hash_policy = hash_policy_from_args(args)
+    if args.table:
+        table_detector = JamoTableDetector(args.table, args.message, schedule=schedule, hash_policy=table_hash_policy(args))
+        mode, k_bits, hash_policy = table_detector.mode, table_detector.k_bits, table_detector.hash_policy
+    detector = JamoLongDocumentDetector(
+        args.message, mode=mode, k_bits=k_bits, schedule=schedule, chunk_tokens=args.chunk_tokens, hash_policy=hash_policy
+    )
+
+    stream = open(args.input, encoding='utf-8') if args.input else sys.stdin
+    try:
+        if args.text:
+            result = detector.detect_text(stream, workers=args.workers)
+        else:
+            id_pieces = (np.array(line.split(), dtype=np.int64) for line in stream)
+            result = detector.detect_token_ids(
+                id_pieces, table_detector.hashes, workers=args.workers, syllables=table_detector.syllables
+            )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    print(json.dumps({key: result[key] for key in ('z_score', 'num_chunks', 'hangul_tokens', 'locations')}))
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Jamo watermark detection")
+    parser.add_argument('--message', required=True, help="Original watermark message")
+    parser.add_argument('--table', help="Detection table directory (token id input)")
+    parser.add_argument('--text', action='store_true', help="Read raw text instead of token ids")
+    parser.add_argument('--mode', default='robustness', help="Hash mode for --text / --export-table")
+    parser.add_argument('--k-bits', type=int, default=2, help="Bits per step for --text / --export-table")
+    parser.add_argument('--export-table', metavar='DIR', help="Export the detection table of --model to DIR and exit")
+    parser.add_argument('--model', default="skt/kogpt2-base-v2", help="Tokenizer to export with --export-table")
+    parser.add_argument('--alignment', action='store_true', help="Alignment-based (insertion/deletion robust) detection")
+    parser.add_argument('--schedule-key', help="Key of the keyed channel schedule used at generation (default: round robin)")
+    parser.add_argument('--hash-key', help="Secret key of the KeyedHashPolicy used at generation (default: plain modulo hash)")
+    parser.add_argument('--hash-no-context', action='store_true', help="The keyed hash policy does not use the previous-token context")
+    parser.add_argument('--long', action='store_true', help="Treat the whole input as one long document with a repeating payload")
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help="Hangul tokens per chunk for --long")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes for --long")
+    parser.add_argument('--input', help="Input file (default: stdin)")
+    args = parser.parse_args(argv)
+    if args.hash_key == '':
+        parser.error("--hash-key must not be empty")
+
+    if args.export_table:
+        export_table(args.export_table, args.model, args.message, args.mode, args.k_bits, hash_policy_from_args(args))
+        return
+
+    if args.text and args.hash_key and not args.hash_no_context:
+        parser.error("--text cannot rebuild the previous-token context of --hash-key: use --table, "
+                     "or --hash-no-context for text generated without it")
+
+    schedule = EmbeddingSchedule(key=args.schedule_key)
+    if args.long:
+        detect_long(args, schedule)
+        return
+
+    if args.text:
+        detector = JamoTextDetector(args.message, mode=args.mode, k_bits=args.k_bits, schedule=schedule, hash_policy=hash_policy_from_args(args))
+    elif args.table:
+        detector = JamoTableDetector(args.table, args.message, schedule=schedule, hash_policy=table_hash_policy(args))
+    else:
+        parser.error("either --table or --text is required")
+
+    stream = open(args.input, encoding='utf-8') if args.input else sys.stdin
+    try:
+        for line in stream:
+            line = line.rstrip('\n')
+            document = line if args.text else [int(token) for token in line.split()]
+            if args.alignment:
+                accuracy, aligned_steps, z_score = detector.extract_payload_aligned(document)
+                print(json.dumps({'accuracy': accuracy, 'z_score': z_score, 'aligned_steps': aligned_steps}))
+            else:
+                accuracy, extracted_payload, z_score = detector.extract_payload(document)
+                print(json.dumps({'accuracy': accuracy, 'z_score': z_score, 'extracted_payload': extracted_payload}))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+import argparse
+import copy
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+import torch
+
+from ..watermark.detector import JamoWatermarkDetector
+from ..watermark.hash_policy import HashPolicy, KeyedHashPolicy
+from ..watermark.metrics import CHANNEL_NAMES, MetricsCollector, NullMetrics
+from ..watermark.jamo_utils import get_last_syllable_jamo
+from ..watermark.payload_mgr import PayloadManager
+from ..watermark.processor import JamoWatermarkProcessor
+from ..watermark.schedule import EmbeddingSchedule
+from ..model.inference import apply_inference_profile, inference_context, model_memory_bytes
+from ..model.tiny_model import load_tiny_model_and_tokenizer
+from ..model.generate import generate_watermarked_text, generate_watermarked_text_batch
+
+# Offline benchmark of the generation and detection hot paths.
+# Runs against a tiny randomly initialized GPT-2 and the synthetic Korean tokenizer from
+# load_tiny_model_and_tokenizer(), and writes a JSON file that can be compared across commits:
+#
+#   python -m src.evaluation.benchmark --output bench_new.json --compare bench_old.json
+
+MESSAGE = "Read Me If You Can"
+PROMPT = "인공지능은 인류의 삶을 어떻게 바꿀 것인가?"
+SCHEDULE_PROMPTS = ["인공지능은", "안녕하세요", "세상은 넓다", "오늘 아침 뉴스에 따르면"]
+
+# Embedding schedules compared by bench_schedule(); 'round_robin' is the original fixed policy
+SCHEDULES = {
+    'round_robin': lambda: EmbeddingSchedule(),
+    'keyed': lambda: EmbeddingSchedule(key='benchmark'),
+    'keyed_adaptive': lambda: EmbeddingSchedule(key='benchmark', target_match_rate=0.9),
+}
+
+# CPU inference profiles compared by bench_inference_profiles() (model/inference.py). 'compiled'
+# is opt-in: its first-call compilation dominates a run this short.
+PROFILES = ('fp32', 'fp32_inference', 'bf16', 'int8')
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _median_time(fn, repeat: int) -> float:
+    """
+    Median wall time (seconds) of `repeat` calls of fn().
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def bench_micro(num_calls: int = 100_000) -> dict:
+    """
+    Per-call cost of get_last_syllable_jamo and HashPolicy.calculate_channel_hashes (plain and keyed).
+    """
+    rng = random.Random(0)
+    tokens = [''.join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.randint(1, 4))) for _ in range(1000)]
+    jamo = [get_last_syllable_jamo(token) for token in tokens]
+    hash_policy = HashPolicy(mode='robustness', k_bits=2)
+    keyed_policy = KeyedHashPolicy(mode='robustness', k_bits=2, key='benchmark')
+
+    def run_jamo():
+        for i in range(num_calls):
+            get_last_syllable_jamo(tokens[i % 1000])
+
+    def run_hash():
+        for i in range(num_calls):
+            hash_policy.calculate_channel_hashes(*jamo[i % 1000])
+
+    def run_keyed_hash():
+        for i in range(num_calls):
+            keyed_policy.calculate_channel_hashes(*jamo[i % 1000])
+
+    return {
+        'get_last_syllable_jamo_ns': _median_time(run_jamo, 3) / num_calls * 1e9,
+        'calculate_channel_hashes_ns': _median_time(run_hash, 3) / num_calls * 1e9,
+        'keyed_calculate_channel_hashes_ns': _median_time(run_keyed_hash, 3) / num_calls * 1e9,
+    }
+
+class _StepTimer(NullMetrics):
+    """
+    Metrics sink keeping every raw per-step latency of the generation loop (for medians).
+    """
+    enabled = True
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+
+    def observe(self, name: str, value: float, **labels):
+        if name.endswith('_seconds'):
+            self.samples.setdefault(name, []).append(value)
+
+def bench_generation_steps(model, tokenizer, processor, payload_bits: str, k_bits: int, num_steps: int) -> dict:
+    """
+    Per-step latency of each phase of the generate_watermarked_text loop (cached decoding), taken by
+    the loop's own instrumentation so the measured steps are exactly the real ones.
+    """
+    timer = _StepTimer()
+    default_metrics, processor.metrics = processor.metrics, timer
+    try:
+        generator = torch.Generator().manual_seed(0)
+        start = time.perf_counter()
+        # Keep embedding (cycle the payload) so every step exercises the watermark path
+        _, output_ids = generate_watermarked_text(
+            model, tokenizer, processor, PROMPT, payload_bits,
+            k_bits=k_bits, max_length=num_steps, generator=generator, repeat_payload=True
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        processor.metrics = default_metrics
+
+    num_new_tokens = output_ids.size(1) - len(tokenizer.encode(PROMPT))
+    results = {'step_ms': elapsed / max(num_new_tokens, 1) * 1e3}
+    for phase, metric in (('forward', 'forward'), ('bias_logits', 'bias'), ('sampling', 'sampling'), ('check_token_match', 'check')):
+        samples = timer.samples.get(f'jamo_generation_{metric}_seconds')
+        if samples:
+            results[f'{phase}_ms'] = statistics.median(samples) * 1e3
+    return results
+
+def bench_generation(model, tokenizer, processor, payload_bits: str, k_bits: int, max_length: int) -> dict:
+    """
+    End-to-end tokens/sec of generate_watermarked_text, with and without the KV cache.
+    """
+    results = {}
+    for use_cache in (True, False):
+        generator = torch.Generator().manual_seed(0)
+        start = time.perf_counter()
+        _, output_ids = generate_watermarked_text(
+            model, tokenizer, processor, PROMPT, payload_bits,
+            k_bits=k_bits, max_length=max_length, use_cache=use_cache, generator=generator
+        )
+        elapsed = time.perf_counter() - start
+        num_new_tokens = output_ids.size(1) - len(tokenizer.encode(PROMPT))
+        results['cached' if use_cache else 'uncached'] = {
+            'tokens_per_sec': num_new_tokens / elapsed,
+            'ms_per_token': elapsed / max(num_new_tokens, 1) * 1e3,
+        }
+    return results
+
+def bench_instrumentation(model, tokenizer, processor, payload_bits: str, k_bits: int, max_length: int) -> dict:
+    """
+    Watermark statistics collected by MetricsCollector during one cached generation, and the
+    instrumentation overhead relative to the default no-op metrics.
+    """
+    def run() -> float:
+        generator = torch.Generator().manual_seed(0)
+        start = time.perf_counter()
+        generate_watermarked_text(
+            model, tokenizer, processor, PROMPT, payload_bits,
+            k_bits=k_bits, max_length=max_length, generator=generator
+        )
+        return time.perf_counter() - start
+
+    plain_elapsed = run()
+    metrics = MetricsCollector()
+    default_metrics, processor.metrics = processor.metrics, metrics
+    try:
+        instrumented_elapsed = run()
+    finally:
+        processor.metrics = default_metrics
+
+    results = {'overhead_ratio': instrumented_elapsed / plain_elapsed}
+    for channel, rate in metrics.channel_match_rates().items():
+        results[f'match_rate_{channel}'] = rate
+    for channel in CHANNEL_NAMES:
+        histogram = metrics.histogram('jamo_watermark_tokens_per_symbol', channel=channel)
+        if histogram is not None and histogram.count:
+            results[f'tokens_per_symbol_{channel}'] = histogram.sum / histogram.count
+    histogram = metrics.histogram('jamo_topk_non_hangul_fraction')
+    if histogram is not None and histogram.count:
+        results['topk_non_hangul_fraction'] = histogram.sum / histogram.count
+    return results
+
+def bench_schedule(model, tokenizer, k_bits: int, top_k: int, max_new_tokens: int = 600) -> dict:
+    """
+    Tokens spent per embedded payload bit under each embedding schedule (SCHEDULES) and hash mode.
+    Every prompt generates until its whole payload is embedded (or max_new_tokens); embedded bits
+    are counted by the detector with the same schedule.
+    """
+    packed_payload = PayloadManager().encode_packed(MESSAGE, k_bits=k_bits)
+    prompt_lengths = [len(tokenizer.encode(prompt)) for prompt in SCHEDULE_PROMPTS]
+
+    results = {}
+    for mode in ('robustness', 'quality'):
+        for name, make_schedule in SCHEDULES.items():
+            schedule = make_schedule()
+            processor = JamoWatermarkProcessor(tokenizer, mode, k_bits, top_k=top_k, schedule=schedule)
+            detector = JamoWatermarkDetector(tokenizer, MESSAGE, mode, k_bits, schedule=schedule)
+
+            generator = torch.Generator().manual_seed(0)
+            start = time.perf_counter()
+            _, sequences = generate_watermarked_text_batch(
+                model, tokenizer, processor, SCHEDULE_PROMPTS, [packed_payload] * len(SCHEDULE_PROMPTS),
+                k_bits=k_bits, max_length=max_new_tokens, stop_after_payload=True, generator=generator
+            )
+            elapsed = time.perf_counter() - start
+
+            num_new_tokens = sum(ids.size(1) - length for ids, length in zip(sequences, prompt_lengths))
+            accuracies = [result[0] for result in detector.extract_payload_batch([ids[0] for ids in sequences])]
+            embedded_bits = sum(accuracy * (len(packed_payload) // k_bits) * k_bits for accuracy in accuracies)
+            results[f'{mode}.{name}'] = {
+                'tokens_per_bit': num_new_tokens / embedded_bits if embedded_bits else float('inf'),
+                'embedded_fraction': sum(accuracies) / len(accuracies),
+                'seconds': elapsed,
+            }
+    return results
+
+def bench_inference_profiles(
+    model,
+    tokenizer,
+    k_bits: int,
+    top_k: int,
+    max_new_tokens: int = 600,
+    profiles: tuple[str, ...] = PROFILES,
+    accuracy_tolerance: float = 0.02,
+    z_tolerance: float = 0.1
+) -> dict:
+    """
+    Throughput, model memory and watermark detection of every CPU inference profile against the
+    first one (fp32).
+
+    Each profile is applied to a copy of `model` and generates SCHEDULE_PROMPTS with the same seed
+    until the payload is embedded. 'within_tolerance' is True when the mean detection accuracy is
+    within accuracy_tolerance of the reference and the mean z-score within z_tolerance (relative).
+    """
+    packed_payload = PayloadManager().encode_packed(MESSAGE, k_bits=k_bits)
+    detector = JamoWatermarkDetector(tokenizer, MESSAGE, 'robustness', k_bits)
+    prompt_lengths = [len(tokenizer.encode(prompt)) for prompt in SCHEDULE_PROMPTS]
+    prompt_ids = tokenizer.encode(PROMPT, return_tensors='pt')
+
+    results, reference = {}, None
+    for name in profiles:
+        profile_model = apply_inference_profile(copy.deepcopy(model), name)
+        processor = JamoWatermarkProcessor(tokenizer, 'robustness', k_bits, top_k=top_k)
+        with inference_context(profile_model):
+            log_probs = torch.log_softmax(profile_model(prompt_ids).logits[0, -1].float(), dim=-1)
+
+        generator = torch.Generator().manual_seed(0)
+        start = time.perf_counter()
+        _, sequences = generate_watermarked_text_batch(
+            profile_model, tokenizer, processor, SCHEDULE_PROMPTS, [packed_payload] * len(SCHEDULE_PROMPTS),
+            k_bits=k_bits, max_length=max_new_tokens, stop_after_payload=True, generator=generator
+        )
+        elapsed = time.perf_counter() - start
+
+        num_new_tokens = sum(ids.size(1) - length for ids, length in zip(sequences, prompt_lengths))
+        scores = detector.extract_payload_batch([ids[0] for ids in sequences])
+        row = {
+            'tokens_per_sec': num_new_tokens / elapsed,
+            'model_bytes': model_memory_bytes(profile_model),
+            'accuracy': statistics.fmean(score[0] for score in scores),
+            'z_score': statistics.fmean(score[2] for score in scores),
+        }
+        if reference is None:
+            reference = row | {'log_probs': log_probs}
+        row['max_logprob_diff'] = float((log_probs - reference['log_probs']).abs().max())
+        row['within_tolerance'] = (
+            abs(row['accuracy'] - reference['accuracy']) <= accuracy_tolerance
+            and abs(row['z_score'] - reference['z_score']) <= z_tolerance * max(abs(reference['z_score']), 1.0)
+        )
+        results[name] = row
+    return results
+
+def bench_detection(tokenizer, detector: JamoWatermarkDetector, payload_bits: str, num_docs: int, doc_len: int) -> dict:
+    """
+    Detection throughput of extract_payload (one document per call) and extract_payload_batch.
+    """
+    rng = random.Random(0)
+    docs = [[rng.randrange(len(tokenizer)) for _ in range(doc_len)] for _ in range(num_docs)]
+    doc_tensors = [torch.tensor([doc], dtype=torch.long) for doc in docs]
+    batch = torch.tensor(docs, dtype=torch.long)
+
+    def run_single():
+        for ids in doc_tensors:
+            detector.extract_payload(ids, payload_bits)
+
+    def run_batch():
+        detector.extract_payload_batch(batch, payload_bits)
+
+    results = {}
+    for name, fn in (('extract_payload', run_single), ('extract_payload_batch', run_batch)):
+        elapsed = _median_time(fn, 3)
+        results[name] = {
+            'docs_per_sec': num_docs / elapsed,
+            'tokens_per_sec': num_docs * doc_len / elapsed,
+        }
+    return results
+
+def run_benchmarks(k_bits: int = 2, top_k: int = 20, max_length: int = 200, num_docs: int = 200, doc_len: int = 300) -> dict:
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload_bits = PayloadManager().encode(MESSAGE)
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', k_bits, top_k=top_k)
+    detector = JamoWatermarkDetector(tokenizer, MESSAGE, 'robustness', k_bits)
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'num_threads': torch.get_num_threads(),
+            'config': {'k_bits': k_bits, 'top_k': top_k, 'max_length': max_length, 'num_docs': num_docs, 'doc_len': doc_len},
+        },
+        'micro': bench_micro(),
+        'generation_step': bench_generation_steps(model, tokenizer, processor, payload_bits, k_bits, num_steps=max_length),
+        'generation': bench_generation(model, tokenizer, processor, payload_bits, k_bits, max_length),
+        'instrumentation': bench_instrumentation(model, tokenizer, processor, payload_bits, k_bits, max_length),
+        'schedule': bench_schedule(model, tokenizer, k_bits, top_k),
+        'inference_profiles': bench_inference_profiles(model, tokenizer, k_bits, top_k),
+        'detection': bench_detection(tokenizer, detector, payload_bits, num_docs, doc_len),
+    }
+
+def _flatten(results: dict, prefix: str = '') -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if key == 'meta':
+            continue
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+def compare_results(old: dict, new: dict) -> list[tuple[str, float, float, float]]:
+    """
+    Returns (metric, old, new, new / old) for every metric present in both result files.
+    """
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    return [
+        (name, old_flat[name], new_flat[name], new_flat[name] / old_flat[name] if old_flat[name] else float('nan'))
+        for name in sorted(old_flat.keys() & new_flat.keys())
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark watermark generation and detection hot paths")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results")
+    parser.add_argument('--compare', help="Previous JSON results to compare against")
+    parser.add_argument('--k-bits', type=int, default=2)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--max-length', type=int, default=200)
+    parser.add_argument('--num-docs', type=int, default=200)
+    parser.add_argument('--doc-len', type=int, default=300)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.k_bits, args.top_k, args.max_length, args.num_docs, args.doc_len)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    for name, value in _flatten(results).items():
+        print(f"{name:60s} {value:14.3f}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+        print(f"\n--- Compared with {old['meta'].get('commit')} ---")
+        for name, old_value, new_value, ratio in compare_results(old, results):
+            print(f"{name:60s} {old_value:14.3f} -> {new_value:14.3f} ({ratio:6.2f}x)")
+
+if __name__ == "__main__":
+    main()
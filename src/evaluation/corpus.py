@@ -0,0 +1,86 @@
+import torch
+
+from ..watermark.processor import JamoWatermarkProcessor
+from ..model.load_model import load_model_and_tokenizer
+from ..model.tiny_model import load_tiny_model_and_tokenizer, load_tiny_tokenizer
+from ..model.batching import ContinuousBatcher
+from .jsonl_cache import JsonlCache
+
+# Shared text generation for the evaluation scripts.
+# A job is (key, prompt, payload, mode, k_bits); an empty payload gives an unwatermarked text.
+
+DEFAULT_PROMPTS = [
+    "인공지능은 인류의 삶을 어떻게 바꿀 것인가?",
+    "기후 변화에 대응하기 위해 우리가 할 수 있는 일은",
+    "오늘 아침 뉴스에 따르면",
+    "한국의 전통 음식 중에서 가장 유명한 것은",
+    "좋은 글을 쓰기 위해서는",
+    "우주 탐사의 미래는",
+    "건강한 생활 습관이란",
+    "역사를 배우는 이유는",
+]
+
+def load_eval_model_and_tokenizer(model_name: str):
+    """
+    load_model_and_tokenizer(), or the offline tiny model for model_name == 'tiny'.
+    """
+    if model_name == 'tiny':
+        return load_tiny_model_and_tokenizer()
+    return load_model_and_tokenizer(model_name)
+
+def load_eval_tokenizer(model_name: str):
+    """
+    Tokenizer only (for detection workers), without loading model weights.
+    """
+    if model_name == 'tiny':
+        return load_tiny_tokenizer()
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
+
+def generate_corpus(
+    model_name: str,
+    jobs: list[tuple[str, str, str, str, int]],
+    cache: JsonlCache,
+    top_k: int = 20,
+    max_length: int = 200,
+    batch_size: int = 8
+) -> dict[str, str]:
+    """
+    Generates the text of every job that is not cached yet (batched per (mode, k_bits)),
+    loading the model only if something is missing.
+
+    Every job samples with its own generator, seeded from its key, so a text does not depend on
+    which other jobs are generated with it (i.e. on what was already cached).
+
+    Returns:
+        key -> generated text for every job.
+    """
+    missing = [job for job in jobs if cache.get(job[0]) is None]
+    if missing:
+        model, tokenizer = load_eval_model_and_tokenizer(model_name)
+
+        groups = {}
+        for job in missing:
+            groups.setdefault((job[3], job[4]), []).append(job)
+
+        for (mode, k_bits), group in groups.items():
+            processor = JamoWatermarkProcessor(tokenizer=tokenizer, mode=mode, k_bits=k_bits, top_k=top_k)
+            batcher = ContinuousBatcher(model, tokenizer, processor, max_batch_size=batch_size)
+            jobs_by_key = {}
+            for job in group:
+                if job[0] in jobs_by_key:
+                    continue
+                jobs_by_key[job[0]] = job
+                batcher.submit(
+                    job[0], job[1], job[2], max_length=max_length,
+                    generator=torch.Generator().manual_seed(int(job[0][:8], 16))
+                )
+            while batcher.has_work():
+                records = []
+                for result in batcher.step():
+                    job = jobs_by_key[result.request_id]
+                    records.append({'key': job[0], 'prompt': job[1], 'mode': job[3], 'k_bits': job[4], 'text': result.text})
+                if records:
+                    cache.add_many(records)
+
+    return {job[0]: cache.get(job[0])['text'] for job in jobs}
@@ -0,0 +1,239 @@
+import argparse
+import json
+import math
+import os
+import statistics
+
+import torch
+
+from ..watermark.payload_mgr import PayloadManager
+from .corpus import DEFAULT_PROMPTS, generate_corpus, load_eval_model_and_tokenizer
+from .jsonl_cache import JsonlCache, cache_key
+
+# Quality evaluation: perplexity of watermarked vs unwatermarked texts under a reference LM.
+#
+# 1. Generates (or loads from cache) texts for every (mode, k_bits) configuration plus an
+#    unwatermarked baseline.
+# 2. Scores the generated continuation of every text with the reference model (the prompt is
+#    context only, so it does not dilute the watermark's quality cost): long texts are split into
+#    strided sliding windows, windows are batched by length, and scoring runs under torch.inference_mode.
+# 3. Reports the PPL distribution per configuration.
+#
+# Per-text losses are cached as JSONL keyed by (reference model, window, stride, prompt, text), so
+# changing a generation parameter only scores the new texts.
+#
+#   python -m src.evaluation.eval_quality --model tiny --ref-model tiny --num-texts 100
+
+def _window_jobs(token_ids: list[int], window: int, stride: int, skip: int = 0) -> list[tuple[list[int], int]]:
+    """
+    Splits a token sequence into sliding windows of at most `window` tokens, advancing by `stride`.
+    Each window is (token ids, number of trailing tokens scored in it); the leading tokens are
+    context already scored by the previous window. The first `skip` tokens (the prompt) are never
+    scored, and windows with nothing left to score are dropped.
+    """
+    if not 0 < stride <= window:
+        raise ValueError(f"stride must be in (0, window], got stride={stride}, window={window}")
+    windows = []
+    prev_end = 0
+    for begin in range(0, len(token_ids), stride):
+        end = min(begin + window, len(token_ids))
+        num_targets = end - max(prev_end, skip)
+        if num_targets > 0:
+            windows.append((token_ids[begin:end], num_targets))
+        prev_end = end
+        if end == len(token_ids):
+            break
+    return windows
+
+def _prompt_length(token_ids: list[int], prompt_ids: list[int]) -> int:
+    """
+    Number of leading tokens of a text that belong to its prompt (common prefix of both encodings).
+    """
+    length = 0
+    for token_id, prompt_id in zip(token_ids, prompt_ids):
+        if token_id != prompt_id:
+            break
+        length += 1
+    return length
+
+def score_texts(
+    model,
+    tokenizer,
+    texts: list[str],
+    window: int = 512,
+    stride: int = 256,
+    batch_size: int = 16,
+    prompts: list[str] | None = None
+) -> list[tuple[float, int]]:
+    """
+    Negative log-likelihood of each text under `model`.
+
+    Args:
+        prompts (list[str] | None): Prompt of each text; its tokens are context but are not scored.
+
+    Returns:
+        One (summed NLL, number of scored tokens) pair per text. PPL = exp(nll / num_tokens).
+    """
+    # Sliding-window jobs of every text, sorted by length so batches need little padding
+    jobs = []
+    for text_idx, text in enumerate(texts):
+        token_ids = tokenizer.encode(text)
+        skip = _prompt_length(token_ids, tokenizer.encode(prompts[text_idx])) if prompts is not None else 0
+        for window_ids, num_targets in _window_jobs(token_ids, window, stride, skip):
+            jobs.append((text_idx, window_ids, num_targets))
+    jobs.sort(key=lambda job: len(job[1]))
+
+    nll = [0.0] * len(texts)
+    num_tokens = [0] * len(texts)
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+
+    with torch.inference_mode():
+        for start in range(0, len(jobs), batch_size):
+            batch = jobs[start:start + batch_size]
+            max_len = max(len(window_ids) for _, window_ids, _ in batch)
+
+            input_ids = torch.full((len(batch), max_len), pad_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+            labels = torch.full((len(batch), max_len), -100, dtype=torch.long)
+            for row, (_, window_ids, num_targets) in enumerate(batch):
+                length = len(window_ids)
+                input_ids[row, :length] = torch.tensor(window_ids, dtype=torch.long)
+                attention_mask[row, :length] = 1
+                labels[row, length - num_targets:length] = input_ids[row, length - num_targets:length]
+
+            logits = model(input_ids, attention_mask=attention_mask).logits
+            shift_logits = logits[:, :-1, :].float()
+            shift_labels = labels[:, 1:]
+            token_nll = torch.nn.functional.cross_entropy(
+                shift_logits.reshape(-1, shift_logits.size(-1)), shift_labels.reshape(-1),
+                ignore_index=-100, reduction='none'
+            ).view(shift_labels.shape)
+            scored = shift_labels != -100
+
+            for row, (text_idx, _, _) in enumerate(batch):
+                nll[text_idx] += float(token_nll[row][scored[row]].sum())
+                num_tokens[text_idx] += int(scored[row].sum())
+
+    return list(zip(nll, num_tokens))
+
+def _ppl_summary(ppls: list[float]) -> dict:
+    if not ppls:
+        return {'num_texts': 0}
+    ordered = sorted(ppls)
+    return {
+        'num_texts': len(ppls),
+        'ppl_mean': statistics.fmean(ppls),
+        'ppl_median': statistics.median(ppls),
+        'ppl_std': statistics.pstdev(ppls),
+        'ppl_p10': ordered[int(0.1 * (len(ordered) - 1))],
+        'ppl_p90': ordered[int(0.9 * (len(ordered) - 1))],
+    }
+
+def run_evaluation(
+    model_name: str = "skt/kogpt2-base-v2",
+    ref_model_name: str | None = None,
+    prompts: list[str] = DEFAULT_PROMPTS,
+    num_texts: int = 32,
+    message: str = "Read Me If You Can",
+    modes: tuple[str, ...] = ('robustness', 'quality'),
+    k_bits_list: tuple[int, ...] = (1, 2),
+    top_k: int = 20,
+    max_length: int = 200,
+    seed: int = 0,
+    batch_size: int = 8,
+    window: int = 512,
+    stride: int = 256,
+    score_batch_size: int = 16,
+    cache_dir: str = '.quality_cache'
+) -> dict:
+    """
+    Generates and scores every configuration and returns the PPL table (see module comment).
+    """
+    ref_model_name = ref_model_name or model_name
+    payload_bits = PayloadManager().encode(message)
+    generation_cache = JsonlCache(os.path.join(cache_dir, 'generations.jsonl'))
+    loss_cache = JsonlCache(os.path.join(cache_dir, 'losses.jsonl'))
+
+    # 1. Texts per configuration; the unwatermarked baseline does not depend on mode/k_bits
+    configs = [('unwatermarked', '', 'robustness', 2)]
+    configs += [(f'{mode}/k{k_bits}', payload_bits, mode, k_bits) for mode in modes for k_bits in k_bits_list]
+    jobs_by_config = {}
+    for name, payload, mode, k_bits in configs:
+        jobs_by_config[name] = [
+            (cache_key('generation', model_name, prompts[i % len(prompts)], payload, mode, k_bits, top_k, max_length, seed, i),
+             prompts[i % len(prompts)], payload, mode, k_bits)
+            for i in range(num_texts)
+        ]
+    texts = generate_corpus(
+        model_name, [job for jobs in jobs_by_config.values() for job in jobs],
+        generation_cache, top_k=top_k, max_length=max_length, batch_size=batch_size
+    )
+
+    # 2. Reference-model losses of the continuations (cached per prompt and text)
+    def loss_key(prompt: str, text: str) -> str:
+        return cache_key('loss', ref_model_name, window, stride, prompt, text)
+
+    unscored = sorted({
+        (job[1], texts[job[0]]) for jobs in jobs_by_config.values() for job in jobs
+        if loss_cache.get(loss_key(job[1], texts[job[0]])) is None
+    })
+    if unscored:
+        ref_model, ref_tokenizer = load_eval_model_and_tokenizer(ref_model_name)
+        ref_model.eval()
+        scores = score_texts(
+            ref_model, ref_tokenizer, [text for _, text in unscored], window=window, stride=stride,
+            batch_size=score_batch_size, prompts=[prompt for prompt, _ in unscored]
+        )
+        loss_cache.add_many([
+            {'key': loss_key(prompt, text), 'nll': text_nll, 'num_tokens': text_tokens}
+            for (prompt, text), (text_nll, text_tokens) in zip(unscored, scores)
+        ])
+
+    # 3. PPL distribution per configuration
+    table = {}
+    for name, jobs in jobs_by_config.items():
+        ppls = []
+        for job in jobs:
+            record = loss_cache.get(loss_key(job[1], texts[job[0]]))
+            if record['num_tokens'] > 0:
+                ppls.append(math.exp(record['nll'] / record['num_tokens']))
+        table[name] = _ppl_summary(ppls)
+    return table
+
+def print_table(table: dict):
+    columns = ['num_texts', 'ppl_mean', 'ppl_median', 'ppl_std', 'ppl_p10', 'ppl_p90']
+    print(f"{'config':20s}" + ''.join(f"{column:>12s}" for column in columns))
+    for name, row in table.items():
+        print(f"{name:20s}" + ''.join(f"{row.get(column, float('nan')):12.3f}" for column in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Perplexity of watermarked vs unwatermarked text")
+    parser.add_argument('--model', default="skt/kogpt2-base-v2", help="Generator model, or 'tiny' for the offline test model")
+    parser.add_argument('--ref-model', default=None, help="Reference model for scoring (default: --model)")
+    parser.add_argument('--num-texts', type=int, default=32)
+    parser.add_argument('--message', default="Read Me If You Can")
+    parser.add_argument('--modes', nargs='+', default=['robustness', 'quality'])
+    parser.add_argument('--k-bits', nargs='+', type=int, default=[1, 2])
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--max-length', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=8, help="Generation batch size")
+    parser.add_argument('--window', type=int, default=512, help="Sliding window length (tokens)")
+    parser.add_argument('--stride', type=int, default=256, help="Sliding window stride (tokens)")
+    parser.add_argument('--score-batch-size', type=int, default=16)
+    parser.add_argument('--cache-dir', default='.quality_cache')
+    parser.add_argument('--output', default='quality_results.json')
+    args = parser.parse_args()
+
+    table = run_evaluation(
+        model_name=args.model, ref_model_name=args.ref_model, num_texts=args.num_texts, message=args.message,
+        modes=tuple(args.modes), k_bits_list=tuple(args.k_bits), top_k=args.top_k, max_length=args.max_length,
+        seed=args.seed, batch_size=args.batch_size, window=args.window, stride=args.stride,
+        score_batch_size=args.score_batch_size, cache_dir=args.cache_dir
+    )
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(table, f, indent=2)
+    print_table(table)
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,292 @@
+import argparse
+import json
+import math
+import os
+import random
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
 import torch
-from transformers import PreTrainedTokenizer
 
 from ..watermark.detector import JamoWatermarkDetector
+from ..watermark.jamo_utils import HANGUL_START_CODE, HANGUL_END_CODE, JONGSEONG_COUNT
 from ..watermark.payload_mgr import PayloadManager
-from ..watermark.processor import JamoWatermarkProcessor
-from ..model.load_model import load_model_and_tokenizer
-from ..model.generate import generate_watermarked_text
-
-def test_deletion_attack(
-    watermarked_text: str,
-    target_payload: str,
-    tokenizer: PreTrainedTokenizer,
-    detector: JamoWatermarkDetector
-):
-
-    print("\n" + "="*40)
-    print("[Robustness Test: Deletion Attack]")
-    print("="*40)
-
-    # 1. 공격 시뮬레이션 (단어 삭제)
-    words = watermarked_text.split(' ')
-    if len(words) <= 10:
-        print("Text is too short to perform deletion test.")
-        return
-
-    # 중간 지점 단어 하나 삭제 (예: n번째 단어)
-    target_idx = 5
-    removed_word = words[target_idx]
-    del words[target_idx]
-    attacked_text = ' '.join(words)
-    
-    print(f"Original Text Length: {len(watermarked_text)}")
-    print(f"Attacked Text Length: {len(attacked_text)}")
-    print(f"Removed Word: '{removed_word}'")
-    
-    # 2. 공격받은 텍스트 다시 토큰화
-    attacked_input_ids = tokenizer.encode(attacked_text, return_tensors='pt')
-    
-    # 3. 검증 (Verification)
-    # (공격으로 인해 비트가 밀렸을 것이나) 남은 부분들이 매칭되는지 확인
-    accuracy, log, z_score = detector.extract_payload(attacked_input_ids, target_payload) 
-    print(f"\n[Verification Result after Attack]")
-    print(f"Log: {log}")
-    print(f"Accuracy: {accuracy * 100:.1f}%")
-    print(f"Z-Score : {z_score:.2f}")
-
-    # 4. 판정
-    # Z-Score 3.0 이상이면 우연일 확률이 0.1% 미만 -> 워터마크 확정
-    # 또는 Accuracy가 랜덤(25%)보다 현저히 높은 50% 이상이면 성공으로 간주
-    threshold = 0.50
-    threshold_z = 3.0
-    
-    if accuracy >= threshold or z_score >= threshold_z:
-        print(f"Success: Watermark survived deletion attack.")
+from .corpus import DEFAULT_PROMPTS, generate_corpus, load_eval_tokenizer
+from .jsonl_cache import JsonlCache, cache_key
+
+# Robustness evaluation engine.
+#
+# 1. Generates watermarked and unwatermarked (empty payload) texts for a list of prompts, in batches.
+# 2. Applies a grid of attacks (deletion, insertion, substitution, syllable swap, truncation) at
+#    several rates to every watermarked text.
+# 3. Re-tokenizes and runs detection in a process pool.
+# 4. Writes per-(attack, rate) z-score statistics, detection rates (TPR) and ROC AUC against the
+#    unwatermarked texts, whose row gives the false positive rate (FPR) at each threshold.
+#
+# Texts are scored with a z-score that stays calibrated on long texts: greedy matches per Hangul
+# token checked ('per_token'), or the insertion/deletion-robust alignment ('aligned'). The
+# matches out of the payload steps (extract_payload) reach every step of a short payload on
+# unwatermarked text too, which would make every row look detected. Both nulls come from each
+# text's own hash frequencies (real Korean text is far from uniform over the hash values), so the
+# fixed thresholds below mean the same thing for every message.
+#
+# Generated texts and detection results are cached as JSONL in --cache-dir, so reruns only
+# compute what changed (new prompts, attacks, rates or seeds).
+#
+#   python -m src.evaluation.eval_robustness --model tiny --num-texts 50 --workers 4
+
+ATTACKS = ('deletion', 'insertion', 'substitution', 'syllable_swap', 'truncation')
+DEFAULT_RATES = (0.05, 0.1, 0.2, 0.3)
+Z_THRESHOLDS = (2.0, 3.0, 4.0)
+STATISTICS = ('per_token', 'aligned')
+
+# --- Attacks ---
+
+def _random_syllable(rng: random.Random) -> str:
+    return chr(rng.randint(HANGUL_START_CODE, HANGUL_END_CODE))
+
+def _random_word(rng: random.Random, num_syllables: int) -> str:
+    return ''.join(_random_syllable(rng) for _ in range(num_syllables))
+
+def _swap_syllable(char: str, rng: random.Random) -> str:
+    """
+    Replaces the Jongseong of a Hangul syllable (same Choseong and Jungseong, e.g. '간' -> '갈'):
+    a minimal, typo/synonym-like edit that still changes the Jamo of one channel.
+    """
+    relative_code = ord(char) - HANGUL_START_CODE
+    jongseong_index = relative_code % JONGSEONG_COUNT
+    new_jongseong = rng.choice([z for z in range(JONGSEONG_COUNT) if z != jongseong_index])
+    return chr(HANGUL_START_CODE + relative_code - jongseong_index + new_jongseong)
+
+def apply_attack(text: str, attack: str, rate: float, rng: random.Random) -> str:
+    """
+    Applies one word/syllable level attack to `text`.
+
+    Args:
+        attack (str): One of ATTACKS.
+        rate (float): Fraction of words (syllables for syllable_swap, text for truncation) affected.
+    """
+    words = text.split(' ')
+
+    if attack == 'deletion':
+        kept = [word for word in words if rng.random() >= rate]
+        return ' '.join(kept)
+
+    if attack == 'insertion':
+        attacked = []
+        for word in words:
+            attacked.append(word)
+            if rng.random() < rate:
+                attacked.append(_random_word(rng, rng.randint(1, 3)))
+        return ' '.join(attacked)
+
+    if attack == 'substitution':
+        return ' '.join(
+            _random_word(rng, max(len(word), 1)) if rng.random() < rate else word
+            for word in words
+        )
+
+    if attack == 'syllable_swap':
+        return ''.join(
+            _swap_syllable(char, rng) if HANGUL_START_CODE <= ord(char) <= HANGUL_END_CODE and rng.random() < rate else char
+            for char in text
+        )
+
+    if attack == 'truncation':
+        return ' '.join(words[:math.ceil(len(words) * (1.0 - rate))])
+
+    raise ValueError(f"Unknown attack: {attack}")
+
+# --- Detection workers ---
+
+_worker_detector = None
+_worker_tokenizer = None
+
+def _init_worker(model_name: str, message: str, mode: str, k_bits: int):
+    global _worker_detector, _worker_tokenizer
+    torch.set_num_threads(1)
+    _worker_tokenizer = load_eval_tokenizer(model_name)
+    _worker_detector = JamoWatermarkDetector(tokenizer=_worker_tokenizer, original_message=message, mode=mode, k_bits=k_bits)
+
+def _detect_task(task: tuple[str, str, str, float, int]) -> dict:
+    """
+    Attacks one text and runs detection on the re-tokenized result.
+    """
+    key, text, attack, rate, seed = task
+    if attack == 'none':
+        attacked_text = text
     else:
-        print(f"Fail: Watermark damaged too much.")
+        attacked_text = apply_attack(text, attack, rate, random.Random(f"{key}:{seed}"))
 
-def run_test():
+    attacked_input_ids = _worker_tokenizer.encode(attacked_text, return_tensors='pt')
+    accuracy, _, z_score = _worker_detector.extract_payload_per_token(attacked_input_ids)
+    aligned_accuracy, _, aligned_z_score = _worker_detector.extract_payload_aligned(attacked_input_ids)
+    return {
+        'key': key,
+        'per_token': {'accuracy': accuracy, 'z_score': z_score},
+        'aligned': {'accuracy': aligned_accuracy, 'z_score': aligned_z_score},
+    }
 
-    print("--- Setting up Robustness Test ---")
-    
-    model_name = "skt/kogpt2-base-v2"
-    model, tokenizer = load_model_and_tokenizer(model_name)
-    
-    original_message = "ABC"
-    mode = 'robustness'
-    k_bits = 2
-    
-    payload_mgr = PayloadManager()
-    payload_bits = payload_mgr.encode(original_message)
-    print(f"Payload: {payload_bits}")
-
-    print("\n--- Generating Watermarked Text ---")
-    processor = JamoWatermarkProcessor(tokenizer, mode, k_bits, top_k=20)
-    prompt = "인공지능은"
-    
-    watermarked_text, _ = generate_watermarked_text(
-        model, tokenizer, processor, prompt, payload_bits, k_bits, max_length=200
+# --- Metrics ---
+
+def roc_auc(positive_scores: list[float], negative_scores: list[float]) -> float:
+    """
+    Area under the ROC curve (probability that a positive outscores a negative, ties count half).
+    """
+    if not positive_scores or not negative_scores:
+        return float('nan')
+    scored = sorted([(s, 1) for s in positive_scores] + [(s, 0) for s in negative_scores])
+    rank_sum = 0.0
+    i = 0
+    while i < len(scored):
+        j = i
+        while j < len(scored) and scored[j][0] == scored[i][0]:
+            j += 1
+        average_rank = (i + j + 1) / 2  # 1-based ranks i+1 .. j
+        rank_sum += average_rank * sum(label for _, label in scored[i:j])
+        i = j
+    num_pos, num_neg = len(positive_scores), len(negative_scores)
+    return (rank_sum - num_pos * (num_pos + 1) / 2) / (num_pos * num_neg)
+
+def checked_roc_auc(name: str, positive_scores: list[float], negative_scores: list[float]) -> float:
+    """
+    roc_auc(), with a warning when it carries no information: a missing side, or every score tied
+    (e.g. a saturated statistic giving the same z-score to watermarked and clean texts).
+    """
+    auc = roc_auc(positive_scores, negative_scores)
+    if math.isnan(auc):
+        warnings.warn(f"{name}: AUC is undefined (no watermarked or no clean scores)")
+    elif len(set(positive_scores) | set(negative_scores)) == 1:
+        warnings.warn(f"{name}: AUC is degenerate, every text has z-score {positive_scores[0]:g}")
+    return auc
+
+def _summarize(z_scores: list[float], rate_label: str) -> dict:
+    """
+    z-score statistics of one row, and the fraction of texts at or above every threshold
+    (rate_label 'tpr' for watermarked rows, 'fpr' for the clean row).
+    """
+    summary = {
+        'num_texts': len(z_scores),
+        'z_mean': sum(z_scores) / len(z_scores) if z_scores else float('nan'),
+        'z_median': sorted(z_scores)[len(z_scores) // 2] if z_scores else float('nan'),
+    }
+    for threshold in Z_THRESHOLDS:
+        summary[f'{rate_label}@z>={threshold:g}'] = sum(z >= threshold for z in z_scores) / len(z_scores) if z_scores else float('nan')
+    return summary
+
+# --- Engine ---
+
+def run_evaluation(
+    model_name: str = "skt/kogpt2-base-v2",
+    prompts: list[str] = DEFAULT_PROMPTS,
+    num_texts: int = 32,
+    message: str = "ABC",
+    mode: str = 'robustness',
+    k_bits: int = 2,
+    top_k: int = 20,
+    max_length: int = 200,
+    attacks: tuple[str, ...] = ATTACKS,
+    rates: tuple[float, ...] = DEFAULT_RATES,
+    seed: int = 0,
+    batch_size: int = 8,
+    workers: int | None = None,
+    cache_dir: str = '.robustness_cache',
+    statistic: str = 'per_token'
+) -> dict:
+    """
+    Runs the full attack grid and returns the aggregate table (see module comment).
+
+    Args:
+        statistic (str): The z-score of the table, one of STATISTICS.
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"Unknown statistic: {statistic}")
+    payload_bits = PayloadManager().encode(message)
+    generation_cache = JsonlCache(os.path.join(cache_dir, 'generations.jsonl'))
+    detection_cache = JsonlCache(os.path.join(cache_dir, 'detections.jsonl'))
+
+    # 1. Watermarked / unwatermarked texts (cached)
+    jobs = []
+    for i in range(num_texts):
+        prompt = prompts[i % len(prompts)]
+        for kind, payload in (('watermarked', payload_bits), ('clean', '')):
+            key = cache_key('generation', model_name, prompt, payload, mode, k_bits, top_k, max_length, seed, i)
+            jobs.append((key, kind, prompt, payload))
+    texts = generate_corpus(
+        model_name, [(key, prompt, payload, mode, k_bits) for key, _, prompt, payload in jobs],
+        generation_cache, top_k=top_k, max_length=max_length, batch_size=batch_size
     )
-    print(f"Generated: {watermarked_text[:50]}...")
 
-    detector = JamoWatermarkDetector(tokenizer, mode, k_bits)
+    # 2. Attack x rate grid (+ unattacked watermarked and clean texts)
+    grid = [('none', 0.0)] + [(attack, rate) for attack in attacks for rate in rates]
+    tasks, cells = [], []
+    for job_key, kind, _, _ in jobs:
+        text = texts[job_key]
+        for attack, rate in (grid if kind == 'watermarked' else [('none', 0.0)]):
+            key = cache_key('detection-v3', job_key, attack, rate, seed, message, mode, k_bits)
+            cells.append((key, kind, attack, rate))
+            if detection_cache.get(key) is None:
+                tasks.append((key, text, attack, rate, seed))
+
+    # 3. Detection in a process pool (cached)
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_name, message, mode, k_bits)) as executor:
+            chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+            results = list(executor.map(_detect_task, tasks, chunksize=chunksize))
+        detection_cache.add_many(results)
+
+    # 4. Aggregate
+    z_by_cell = {}
+    for key, kind, attack, rate in cells:
+        z_by_cell.setdefault((kind, attack, rate), []).append(detection_cache.get(key)[statistic]['z_score'])
+    clean_z_scores = z_by_cell.get(('clean', 'none', 0.0), [])
+
+    table = {'clean': _summarize(clean_z_scores, 'fpr')}
+    for attack, rate in grid:
+        name = f'{attack}@{rate:g}'
+        z_scores = z_by_cell.get(('watermarked', attack, rate), [])
+        table[name] = {**_summarize(z_scores, 'tpr'), 'auc': checked_roc_auc(name, z_scores, clean_z_scores)}
+    return table
 
-    test_deletion_attack(watermarked_text, payload_bits, tokenizer, detector)
+def print_table(table: dict):
+    # The clean row has no AUC, and its threshold columns are false positive rates
+    print(f"{'attack':24s}" + ''.join(f"{column:>12s}" for column in ['num_texts', 'z_mean', 'z_median', 'auc'] + [f'tpr@z>={t:g}' for t in Z_THRESHOLDS]))
+    for name, row in table.items():
+        rate_label = 'fpr' if name == 'clean' else 'tpr'
+        columns = ['num_texts', 'z_mean', 'z_median', 'auc'] + [f'{rate_label}@z>={t:g}' for t in Z_THRESHOLDS]
+        label = f'{name} ({rate_label})' if name == 'clean' else name
+        print(f"{label:24s}" + ''.join(f"{row.get(column, float('nan')):12.3f}" for column in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Robustness evaluation over a grid of attacks")
+    parser.add_argument('--model', default="skt/kogpt2-base-v2", help="Model name, or 'tiny' for the offline test model")
+    parser.add_argument('--num-texts', type=int, default=32)
+    parser.add_argument('--message', default="ABC")
+    parser.add_argument('--mode', default='robustness')
+    parser.add_argument('--k-bits', type=int, default=2)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--max-length', type=int, default=200)
+    parser.add_argument('--attacks', nargs='+', default=list(ATTACKS), choices=ATTACKS)
+    parser.add_argument('--rates', nargs='+', type=float, default=list(DEFAULT_RATES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache-dir', default='.robustness_cache')
+    parser.add_argument('--statistic', default='per_token', choices=STATISTICS, help="z-score used for the table (see module comment)")
+    parser.add_argument('--output', default='robustness_results.json')
+    args = parser.parse_args()
+
+    print("--- Setting up Robustness Test ---")
+    table = run_evaluation(
+        model_name=args.model, num_texts=args.num_texts, message=args.message, mode=args.mode,
+        k_bits=args.k_bits, top_k=args.top_k, max_length=args.max_length, attacks=tuple(args.attacks),
+        rates=tuple(args.rates), seed=args.seed, batch_size=args.batch_size, workers=args.workers,
+        cache_dir=args.cache_dir, statistic=args.statistic
+    )
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(table, f, indent=2)
+    print_table(table)
 
 if __name__ == "__main__":
-    run_test()
\ No newline at end of file
+    main()
@@ -0,0 +1,36 @@
+import hashlib
+import json
+import os
+
+def cache_key(*parts) -> str:
+    """
+    Stable key for a tuple of JSON-serializable parts.
+    """
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class JsonlCache:
+    """
+    Append-only key -> record store backed by a JSONL file.
+    Used by the evaluation scripts so reruns only compute new entries.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written line from an interrupted run
+                    self.records[record['key']] = record
+
+    def get(self, key: str) -> dict | None:
+        return self.records.get(key)
+
+    def add_many(self, records: list[dict]):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                self.records[record['key']] = record
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
@@ -21,7 +21,7 @@ def main():
     print("--- 1. Watermark Generation Phase ---")
     
     payload_mgr = PayloadManager()
-    payload_bits = payload_mgr.encode(original_message)
+    payload = payload_mgr.encode_packed(original_message, k_bits=k_bits)
 
     print(f"Original Message: '{original_message}'")
 
@@ -40,7 +40,7 @@ def main():
         tokenizer=tokenizer,
         processor=jamo_processor,
         prompt=prompt,
-        payload=payload_bits,
+        payload=payload,
         k_bits=k_bits,
     )
 
@@ -57,13 +57,13 @@ def main():
     detector = JamoWatermarkDetector(tokenizer=tokenizer, original_message=original_message, mode=mode, k_bits=k_bits)
     
     # Extract the bit payload from the generated text
-    accuracy, extracted_payload, z_score = detector.extract_payload(outputs, payload_bits)
+    accuracy, extracted_payload, z_score = detector.extract_payload(outputs, payload)
     print(f"Extracted Payload (bits): '{extracted_payload}'")
     print(f"Accuracy: {accuracy * 100:.1f}%")
     print(f"Z-Score:  {z_score:.2f}")
 
-    # Decode the extracted bits into a message using the payload manager
-    recovered_message = payload_mgr.decode(extracted_payload)
+    # Decode the matched k-bit symbols into a message using the payload manager
+    recovered_message = payload_mgr.decode_symbols(payload.symbols[:detector.step_t], len(payload), k_bits=k_bits)
     print(f"Recovered Message: '{recovered_message}'")
     
     # --- 4. Verification ---
@@ -0,0 +1,315 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import torch
+import torch.nn.functional as F
+from transformers import DynamicCache, PreTrainedModel, PreTrainedTokenizer
+from ..watermark.processor import JamoWatermarkProcessor
+from ..watermark.payload_mgr import PackedPayload
+from ..watermark.scoring import frame_symbols, payload_to_symbols
+from ..watermark.metrics import record_watermark_step
+from .inference import inference_context
+
+# Continuous (iteration-level) batching for watermarked generation.
+#
+# generate_watermarked_text_batch() decodes a fixed set of prompts together: a request arriving
+# one step later waits for the whole batch. ContinuousBatcher instead keeps one running batch and
+# changes its membership at every step:
+#
+# * Pending requests are admitted whenever a row is free. Each one is prefilled on its own (so its
+#   first token is sampled from exactly the logits of generate_watermarked_text) and its KV cache
+#   is merged into the running cache. Caches of different lengths are left padded, and the padded
+#   positions are masked out; position ids are counted per row from the attention mask.
+# * Every step decodes one token for all running rows in a single forward pass. Each row keeps its
+#   own payload, step_t, generator and stopping rule (same post-sampling synchronization as the
+#   other generation loops).
+# * Finished rows leave the batch at once, and leading cache columns that are padding for every
+#   remaining row are cropped, so the cache never outgrows the longest running request.
+#
+# All rows share one JamoWatermarkProcessor (mode, k_bits, top_k, schedule): requests with another
+# configuration need their own batcher.
+
+@dataclass
+class GenerationRequest:
+    """
+    One generation request and its per-row decoding state.
+    """
+    request_id: object
+    prompt_ids: torch.LongTensor
+    symbols: list[int]
+    channels: list[int]
+    max_length: int = 300
+    repeat_payload: bool = False
+    stop_after_payload: bool = False
+    generator: torch.Generator | None = None
+    context: int | None = None  # Previous-token hash context (None: context-free policy)
+    step_t: int = 0
+    tokens_spent: int = 0
+    generated: list[int] = field(default_factory=list)
+
+    def target(self) -> tuple[int, int]:
+        """
+        (target bits, channel) of the current step, (-1, 0) once the payload is embedded.
+        """
+        if self.repeat_payload:
+            step = self.step_t % len(self.symbols)
+        elif self.step_t < len(self.symbols):
+            step = self.step_t
+        else:
+            return -1, 0
+        return self.symbols[step], self.channels[step]
+
+@dataclass
+class GenerationResult:
+    request_id: object
+    text: str
+    token_ids: torch.LongTensor  # [1, seq_len], prompt included
+    embedded_symbols: int
+
+def _cache_tensors(past_key_values) -> list[tuple[torch.Tensor, torch.Tensor]]:
+    """
+    (key, value) tensors of every layer of a KV cache (DynamicCache or legacy tuple format).
+    """
+    if hasattr(past_key_values, 'layers'):
+        return [(layer.keys, layer.values) for layer in past_key_values.layers]
+    return [(layer[0], layer[1]) for layer in past_key_values]
+
+def _left_pad(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    pad = length - tensor.size(dim)
+    if pad == 0:
+        return tensor
+    padding = [0, 0] * (tensor.dim() - 1 - dim) + [pad, 0]
+    return F.pad(tensor, padding)
+
+class ContinuousBatcher:
+    """
+    Step-wise watermarked generation with requests joining and leaving the batch between steps
+    (see module comment). Not thread-safe except for submit(), which may be called while another
+    thread runs step().
+    """
+    def __init__(
+        self,
+        model: PreTrainedModel,
+        tokenizer: PreTrainedTokenizer,
+        processor: JamoWatermarkProcessor,
+        max_batch_size: int = 8
+    ):
+        """
+        Args:
+            processor (JamoWatermarkProcessor): Shared by every row.
+            max_batch_size (int): Maximum number of rows decoded together.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        self.pending: deque[GenerationRequest] = deque()
+        self.rows: list[GenerationRequest] = []
+        self._cache: list[tuple[torch.Tensor, torch.Tensor]] = []
+        self._attention_mask: torch.LongTensor | None = None  # [rows, cache length + 1]
+        self._next_tokens: torch.LongTensor | None = None     # [rows, 1], sampled but not yet fed
+
+    @property
+    def num_active(self) -> int:
+        return len(self.rows)
+
+    def has_work(self) -> bool:
+        return bool(self.rows) or bool(self.pending)
+
+    def submit(
+        self,
+        request_id,
+        prompt: str,
+        payload: str | PackedPayload,
+        max_length: int = 300,
+        repeat_payload: bool = False,
+        stop_after_payload: bool = False,
+        generator: torch.Generator | None = None
+    ) -> GenerationRequest:
+        """
+        Queues a request; it joins the running batch at the next step() with a free row.
+
+        Args:
+            max_length (int): Maximum number of generated tokens.
+            repeat_payload (bool): Embed SYNC_MARKER + payload cyclically.
+            stop_after_payload (bool): Finish as soon as the payload is embedded.
+            generator (torch.Generator | None): Sampling generator of this request.
+        """
+        prompt_ids = self.tokenizer.encode(prompt, return_tensors='pt')[0]
+        if prompt_ids.numel() == 0:
+            raise ValueError("prompt must contain at least one token")
+        k_bits = self.processor.k_bits
+        symbols = frame_symbols(payload, k_bits) if repeat_payload else payload_to_symbols(payload, k_bits)
+        request = GenerationRequest(
+            request_id=request_id,
+            prompt_ids=prompt_ids,
+            symbols=symbols,
+            channels=self.processor.schedule.channels(symbols, self.processor.hash_policy),
+            max_length=max_length,
+            repeat_payload=repeat_payload,
+            stop_after_payload=stop_after_payload,
+            generator=generator,
+        )
+        contexts = self.processor.initial_contexts(prompt_ids[None])
+        if contexts is not None:
+            request.context = int(contexts[0])
+        self.pending.append(request)
+        return request
+
+    def _prefill(self, request: GenerationRequest) -> tuple[torch.FloatTensor, list[tuple[torch.Tensor, torch.Tensor]]]:
+        outputs = self.model(request.prompt_ids[None], use_cache=True)
+        return outputs.logits[:, -1, :].float(), _cache_tensors(outputs.past_key_values)
+
+    def _decode(self) -> torch.FloatTensor:
+        attention_mask = self._attention_mask
+        position_ids = attention_mask.sum(dim=-1, keepdim=True) - 1
+        outputs = self.model(
+            self._next_tokens,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=DynamicCache(ddp_cache_data=self._cache),
+            use_cache=True,
+        )
+        self._cache = _cache_tensors(outputs.past_key_values)
+        return outputs.logits[:, -1, :].float()
+
+    def _merge(self, new_caches: list[list[tuple[torch.Tensor, torch.Tensor]]]):
+        """
+        Appends the prefilled caches of newly admitted rows to the running cache (left padded).
+        """
+        caches = ([self._cache] if self.rows else []) + new_caches
+        masks = ([self._attention_mask] if self.rows else [])
+        masks += [torch.ones((1, cache[0][0].size(2)), dtype=torch.long) for cache in new_caches]
+        length = max(mask.size(1) for mask in masks)
+
+        self._attention_mask = torch.cat([_left_pad(mask, length, 1) for mask in masks])
+        self._cache = [
+            (
+                torch.cat([_left_pad(cache[layer][0], length, 2) for cache in caches]),
+                torch.cat([_left_pad(cache[layer][1], length, 2) for cache in caches]),
+            )
+            for layer in range(len(caches[0]))
+        ]
+
+    def _drop(self, keep: list[int]):
+        """
+        Keeps only the rows `keep` and crops cache columns that are padding for all of them.
+        """
+        index = torch.tensor(keep, dtype=torch.long)
+        self.rows = [self.rows[row] for row in keep]
+        self._attention_mask = self._attention_mask.index_select(0, index)
+        self._next_tokens = self._next_tokens.index_select(0, index)
+        self._cache = [(key.index_select(0, index), value.index_select(0, index)) for key, value in self._cache]
+
+        first_column = int(self._attention_mask.any(dim=0).int().argmax())
+        if first_column > 0:
+            self._attention_mask = self._attention_mask[:, first_column:]
+            self._cache = [(key[:, :, first_column:], value[:, :, first_column:]) for key, value in self._cache]
+
+    def _finish(self, request: GenerationRequest) -> GenerationResult:
+        token_ids = torch.cat([request.prompt_ids, torch.tensor(request.generated, dtype=torch.long)]).unsqueeze(0)
+        return GenerationResult(
+            request_id=request.request_id,
+            text=self.tokenizer.decode(token_ids[0], skip_special_tokens=True),
+            token_ids=token_ids,
+            embedded_symbols=request.step_t,
+        )
+
+    def step(self) -> list[GenerationResult]:
+        """
+        Admits pending requests, decodes one token for every running row and retires finished rows.
+
+        Returns:
+            The results of the requests that finished at this step.
+        """
+        metrics = self.processor.metrics
+        timed = metrics.enabled
+
+        with inference_context(self.model):
+            if timed:
+                start = time.perf_counter()
+            # 1) One decode forward pass for the running rows, one prefill per admitted request
+            logits = [self._decode()] if self.rows else []
+            admitted, new_caches = [], []
+            while self.pending and len(self.rows) + len(admitted) < self.max_batch_size:
+                request = self.pending.popleft()
+                request_logits, request_cache = self._prefill(request)
+                admitted.append(request)
+                logits.append(request_logits)
+                new_caches.append(request_cache)
+            if not logits:
+                return []
+            if admitted:
+                self._merge(new_caches)
+                self.rows += admitted
+            next_token_logits = torch.cat(logits)
+            if timed:
+                metrics.observe('jamo_generation_forward_seconds', time.perf_counter() - start)
+                metrics.observe('jamo_generation_batch_rows', len(self.rows))
+
+            # 2) Bias every row towards its own target, then sample with the row's generator
+            targets = [request.target() for request in self.rows]
+            target_bits = torch.tensor([bits for bits, _ in targets], dtype=torch.long)
+            channel_idx = torch.tensor([channel for _, channel in targets], dtype=torch.long)
+            contexts = None
+            if self.processor.hash_policy.uses_context:
+                contexts = torch.tensor([request.context for request in self.rows], dtype=torch.long)
+            if timed:
+                start = time.perf_counter()
+            next_token_logits = self.processor.bias_logits_batch(next_token_logits, target_bits, channel_idx, contexts)
+            if timed:
+                metrics.observe('jamo_generation_bias_seconds', time.perf_counter() - start)
+                start = time.perf_counter()
+            probs = torch.softmax(next_token_logits, dim=-1)
+            next_tokens = torch.cat([
+                torch.multinomial(probs[row:row + 1], num_samples=1, generator=request.generator)
+                for row, request in enumerate(self.rows)
+            ])
+            if timed:
+                metrics.observe('jamo_generation_sampling_seconds', time.perf_counter() - start)
+
+            # 3) Per-row synchronization and stopping
+            if timed:
+                start = time.perf_counter()
+            is_match = self.processor.check_token_match_batch(next_tokens[:, 0], target_bits, channel_idx, contexts).tolist()
+            if timed:
+                metrics.observe('jamo_generation_check_seconds', time.perf_counter() - start)
+            if contexts is not None:
+                for request, context in zip(self.rows, self.processor.next_contexts(contexts, next_tokens[:, 0]).tolist()):
+                    request.context = context
+            finished, keep = [], []
+            for row, (request, token_id) in enumerate(zip(self.rows, next_tokens[:, 0].tolist())):
+                request.generated.append(token_id)
+                if target_bits[row] >= 0:
+                    request.tokens_spent += 1
+                    if timed:
+                        record_watermark_step(metrics, int(channel_idx[row]), is_match[row], request.tokens_spent)
+                    if is_match[row]:
+                        request.step_t += 1
+                        request.tokens_spent = 0
+
+                done = token_id == self.tokenizer.eos_token_id or len(request.generated) >= request.max_length
+                if request.stop_after_payload and not request.repeat_payload:
+                    done = done or request.step_t >= len(request.symbols)
+                if done:
+                    finished.append(self._finish(request))
+                else:
+                    keep.append(row)
+
+            self._attention_mask = torch.cat(
+                [self._attention_mask, self._attention_mask.new_ones((len(self.rows), 1))], dim=-1
+            )
+            self._next_tokens = next_tokens
+            if len(keep) < len(self.rows):
+                self._drop(keep)
+        return finished
+
+    def run_until_complete(self) -> list[GenerationResult]:
+        """
+        Steps until every submitted request has finished.
+        """
+        results = []
+        while self.has_work():
+            results += self.step()
+        return results
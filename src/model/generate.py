@@ -1,60 +1,310 @@
+import time
+
 import torch
-from transformers import PreTrainedModel, PreTrainedTokenizer
-from ..watermark.processor import JamoWatermarkProcessor
+from transformers import LogitsProcessorList, PreTrainedModel, PreTrainedTokenizer
+from ..watermark.processor import JamoWatermarkProcessor, JamoWatermarkLogitsProcessor
+from ..watermark.payload_mgr import PackedPayload
+from ..watermark.scoring import frame_symbols, payload_to_symbols
+from ..watermark.metrics import record_watermark_step
+from .inference import inference_context
 
 def generate_watermarked_text(
     model: PreTrainedModel,
     tokenizer: PreTrainedTokenizer,
     processor: JamoWatermarkProcessor,
     prompt: str,
-    payload: str,
+    payload: str | PackedPayload,
     k_bits: int = 2,
-    max_length: int = 300
+    max_length: int = 300,
+    use_cache: bool = True,
+    generator: torch.Generator | None = None,
+    repeat_payload: bool = False
 ) -> tuple[str, torch.LongTensor]:
     """
     Generates watermarked text using the provided model, tokenizer, and processor.
+
+    With repeat_payload=True, SYNC_MARKER + payload is embedded cyclically for the whole generation
+    instead of once (detected with JamoLongDocumentDetector).
+
+    With use_cache=True the prompt is encoded once and every later step feeds only the newly
+    sampled token together with past_key_values (linear in output length). use_cache=False
+    re-encodes the whole sequence at every step. Both paths share the same biasing, sampling
+    and step_t synchronization, so they produce the same tokens for the same `generator`.
+
+    Per-step latency and match statistics go to processor.metrics (see watermark/metrics.py).
     """
     input_ids = tokenizer.encode(prompt, return_tensors='pt')
 
+    # Target bits and channel of every step, computed once (no per-step bit-string slicing)
+    symbols = frame_symbols(payload, k_bits) if repeat_payload else payload_to_symbols(payload, k_bits)
+    channels = processor.schedule.channels(symbols, processor.hash_policy)
+
     step_t = 0
+    tokens_spent = 0  # Tokens sampled for the current symbol
+    context = processor.initial_contexts(input_ids)  # Previous-token hash context (None: context-free policy)
+    past_key_values = None
+    model_input_ids = input_ids  # Tokens not yet seen by the model (the whole prompt at first)
+
+    metrics = processor.metrics
+    timed = metrics.enabled  # Skip the timestamps entirely with the default no-op metrics
 
-    with torch.no_grad():
+    with inference_context(model):
         for _ in range(max_length):
-            outputs = model(input_ids)
-            next_token_logits = outputs.logits[:, -1, :]
+            if timed:
+                start = time.perf_counter()
+            if use_cache:
+                outputs = model(model_input_ids, past_key_values=past_key_values, use_cache=True)
+                past_key_values = outputs.past_key_values
+            else:
+                outputs = model(input_ids)
+            next_token_logits = outputs.logits[:, -1, :].float()  # No-op for fp32; bf16 profiles are biased in fp32
+            if timed:
+                metrics.observe('jamo_generation_forward_seconds', time.perf_counter() - start)
 
             # Watermarking Logic
             # Check if there are remaining bits to embed
-            if step_t * k_bits < len(payload):
+            if step_t < len(symbols) or repeat_payload:
                 # Calculate current target bits and channel
-                target_bits = int(payload[step_t * k_bits : (step_t + 1) * k_bits], 2)
-                channel_idx = step_t % 3  # Cycle through 3 channels
+                frame_step = step_t % len(symbols)
+                target_bits = symbols[frame_step]
+                channel_idx = channels[frame_step]  # Scheduled channel (step_t % 3 by default)
 
                 # 1) Biasing logits by calling Processor
-                next_token_logits = processor.bias_logits(next_token_logits, target_bits, channel_idx)
+                if timed:
+                    start = time.perf_counter()
+                next_token_logits = processor.bias_logits(next_token_logits, target_bits, channel_idx, context)
+                if timed:
+                    metrics.observe('jamo_generation_bias_seconds', time.perf_counter() - start)
             else:
                 target_bits = None  # Watermaking done (no more bits to embed)
 
             # 2) Sample the next token
             # After softmax, sampling by multinomial
+            if timed:
+                start = time.perf_counter()
             probs = torch.softmax(next_token_logits, dim=-1)
-            next_token = torch.multinomial(probs, num_samples=1)  
+            next_token = torch.multinomial(probs, num_samples=1, generator=generator)
+            if timed:
+                metrics.observe('jamo_generation_sampling_seconds', time.perf_counter() - start)
 
             # 3) Check synchronization
             # Check if the chosen token satifies the watermark condition
             if target_bits is not None:
-                is_match = processor.check_token_match(next_token.item(), target_bits, channel_idx)
+                if timed:
+                    start = time.perf_counter()
+                is_match = processor.check_token_match(next_token.item(), target_bits, channel_idx, context)
+                tokens_spent += 1
+                if timed:
+                    metrics.observe('jamo_generation_check_seconds', time.perf_counter() - start)
+                    record_watermark_step(metrics, channel_idx, is_match, tokens_spent)
 
                 if is_match:
                     step_t += 1  # Move to the next set of bits only if matched
-                    print(f"Step {step_t-1} Success: {tokenizer.decode(next_token.item())}")
-                else:
-                    print("Skip (Mismatch)")
-                    pass
-                    
+                    tokens_spent = 0
+
+            context = processor.next_contexts(context, next_token[0])
             input_ids = torch.cat([input_ids, next_token], dim=-1)
+            model_input_ids = next_token
             if next_token.item() == tokenizer.eos_token_id:
                 break
         
     watermarked_text = tokenizer.decode(input_ids[0], skip_special_tokens=True)
-    return watermarked_text, input_ids
\ No newline at end of file
+    return watermarked_text, input_ids
+
+def _select_cache_rows(past_key_values, row_indices: torch.LongTensor):
+    """
+    Keeps only `row_indices` of a KV cache (DynamicCache or legacy tuple format).
+    """
+    if hasattr(past_key_values, 'batch_select_indices'):
+        past_key_values.batch_select_indices(row_indices)
+        return past_key_values
+    return tuple(tuple(t.index_select(0, row_indices) for t in layer) for layer in past_key_values)
+
+def generate_watermarked_text_batch(
+    model: PreTrainedModel,
+    tokenizer: PreTrainedTokenizer,
+    processor: JamoWatermarkProcessor,
+    prompts: list[str],
+    payloads: list[str | PackedPayload],
+    k_bits: int = 2,
+    max_length: int = 300,
+    stop_after_payload: bool = False,
+    generator: torch.Generator | None = None,
+    repeat_payload: bool = False
+) -> tuple[list[str], list[torch.LongTensor]]:
+    """
+    Generates watermarked text for several prompts at once, one payload per prompt.
+
+    Prompts are left-padded and decoded together with a shared KV cache. Each row keeps its own
+    step_t, which advances only when the sampled token matches that row's target bits (the same
+    post-sampling rule as generate_watermarked_text). Rows that emit EOS, or that have embedded
+    their whole payload when stop_after_payload=True, are dropped from the batch so they no
+    longer cost forward-pass compute. With repeat_payload=True every row embeds SYNC_MARKER +
+    its payload cyclically (stop_after_payload is then ignored).
+
+    Returns:
+        The decoded texts and, per prompt, a [1, seq_len] tensor of token ids without padding
+        (directly usable with JamoWatermarkDetector.extract_payload).
+    """
+    if len(prompts) != len(payloads):
+        raise ValueError("prompts and payloads must have the same length")
+
+    batch_size = len(prompts)
+
+    # Left padding keeps the last position of every row aligned for next-token prediction
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = 'left'
+    try:
+        encoded = tokenizer(prompts, return_tensors='pt', padding=True)
+    finally:
+        tokenizer.padding_side = padding_side
+    input_ids = encoded['input_ids']
+    attention_mask = encoded['attention_mask']
+    position_ids = (attention_mask.cumsum(dim=-1) - 1).clamp(min=0)
+
+    # Target symbols per row, padded with -1 (never matches) once a payload is exhausted,
+    # and the scheduled channel of every step
+    if repeat_payload:
+        symbols = [frame_symbols(payload, k_bits) for payload in payloads]
+    else:
+        symbols = [payload_to_symbols(payload, k_bits) for payload in payloads]
+    num_symbols = torch.tensor([len(s) for s in symbols], dtype=torch.long)
+    target_table = torch.full((batch_size, int(num_symbols.max()) + 1), -1, dtype=torch.long)
+    channel_table = torch.zeros_like(target_table)
+    for row, row_symbols in enumerate(symbols):
+        target_table[row, :len(row_symbols)] = torch.tensor(row_symbols, dtype=torch.long)
+        channel_table[row, :len(row_symbols)] = torch.tensor(
+            processor.schedule.channels(row_symbols, processor.hash_policy), dtype=torch.long
+        )
+
+    step_t = torch.zeros(batch_size, dtype=torch.long)
+    tokens_spent = torch.zeros(batch_size, dtype=torch.long)  # Tokens sampled for each row's current symbol
+    contexts = processor.initial_contexts(input_ids)  # Per-row hash context (None: context-free policy)
+    generated = [[] for _ in range(batch_size)]
+    active_rows = torch.arange(batch_size)  # Original row index of every row still in the batch
+    past_key_values = None
+    model_input_ids = input_ids
+
+    metrics = processor.metrics
+    timed = metrics.enabled
+
+    with inference_context(model):
+        for _ in range(max_length):
+            if timed:
+                start = time.perf_counter()
+            outputs = model(
+                model_input_ids,
+                attention_mask=attention_mask,
+                position_ids=position_ids[:, -model_input_ids.size(1):],
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            past_key_values = outputs.past_key_values
+            next_token_logits = outputs.logits[:, -1, :].float()
+            if timed:
+                metrics.observe('jamo_generation_forward_seconds', time.perf_counter() - start)
+
+            # 1) Bias each row towards its own target bits and channel
+            row_steps = step_t[active_rows]
+            if repeat_payload:
+                row_steps = row_steps % num_symbols[active_rows]
+            target_bits = target_table[active_rows, row_steps]
+            channel_idx = channel_table[active_rows, row_steps]
+            row_contexts = contexts[active_rows] if contexts is not None else None
+            if timed:
+                start = time.perf_counter()
+            next_token_logits = processor.bias_logits_batch(next_token_logits, target_bits, channel_idx, row_contexts)
+            if timed:
+                metrics.observe('jamo_generation_bias_seconds', time.perf_counter() - start)
+
+            # 2) Sample the next token of every row
+            if timed:
+                start = time.perf_counter()
+            probs = torch.softmax(next_token_logits, dim=-1)
+            next_tokens = torch.multinomial(probs, num_samples=1, generator=generator)  # [rows, 1]
+            if timed:
+                metrics.observe('jamo_generation_sampling_seconds', time.perf_counter() - start)
+
+            # 3) Per-row synchronization: advance step_t only where the sampled token matched
+            if timed:
+                start = time.perf_counter()
+            is_match = processor.check_token_match_batch(next_tokens[:, 0], target_bits, channel_idx, row_contexts)
+            if timed:
+                metrics.observe('jamo_generation_check_seconds', time.perf_counter() - start)
+            step_t[active_rows] += is_match.long()
+            if contexts is not None:
+                contexts[active_rows] = processor.next_contexts(row_contexts, next_tokens[:, 0])
+            if timed:
+                embedding = target_bits >= 0
+                tokens_spent[active_rows] += embedding.long()
+                for row in embedding.nonzero(as_tuple=True)[0].tolist():
+                    record_watermark_step(metrics, int(channel_idx[row]), bool(is_match[row]), int(tokens_spent[active_rows[row]]))
+                tokens_spent[active_rows[is_match]] = 0
+
+            for row, token_id in zip(active_rows.tolist(), next_tokens[:, 0].tolist()):
+                generated[row].append(token_id)
+
+            finished = next_tokens[:, 0] == tokenizer.eos_token_id
+            if stop_after_payload and not repeat_payload:
+                finished |= step_t[active_rows] >= num_symbols[active_rows]
+
+            attention_mask = torch.cat([attention_mask, attention_mask.new_ones((attention_mask.size(0), 1))], dim=-1)
+            position_ids = position_ids[:, -1:] + 1
+            model_input_ids = next_tokens
+
+            # Drop finished rows so they stop consuming compute
+            if finished.any():
+                keep = (~finished).nonzero(as_tuple=True)[0]
+                if keep.numel() == 0:
+                    break
+                active_rows = active_rows[keep]
+                attention_mask = attention_mask[keep]
+                position_ids = position_ids[keep]
+                model_input_ids = model_input_ids[keep]
+                past_key_values = _select_cache_rows(past_key_values, keep)
+
+    sequences = []
+    for row in range(batch_size):
+        prompt_ids = input_ids[row][encoded['attention_mask'][row].bool()]
+        sequences.append(torch.cat([prompt_ids, torch.tensor(generated[row], dtype=torch.long)]).unsqueeze(0))
+
+    watermarked_texts = [tokenizer.decode(ids[0], skip_special_tokens=True) for ids in sequences]
+    return watermarked_texts, sequences
+
+def generate_watermarked_text_hf(
+    model: PreTrainedModel,
+    tokenizer: PreTrainedTokenizer,
+    processor: JamoWatermarkProcessor,
+    prompt: str,
+    payload: str | PackedPayload,
+    max_length: int = 300,
+    repeat_payload: bool = False,
+    **generate_kwargs
+) -> tuple[str, torch.LongTensor]:
+    """
+    Generates watermarked text through model.generate() with JamoWatermarkLogitsProcessor.
+
+    Uses plain multinomial sampling (no temperature/top-k/top-p warpers) so the sampling matches
+    generate_watermarked_text. Extra keyword arguments (streamer, stopping_criteria, ...) are passed
+    on to model.generate().
+    """
+    input_ids = tokenizer.encode(prompt, return_tensors='pt')
+    watermark_processor = JamoWatermarkLogitsProcessor(processor, payload, repeat_payload=repeat_payload)
+
+    generate_kwargs.setdefault('do_sample', True)
+    generate_kwargs.setdefault('top_k', 0)
+    generate_kwargs.setdefault('top_p', 1.0)
+    generate_kwargs.setdefault('temperature', 1.0)
+    generate_kwargs.setdefault('pad_token_id', tokenizer.pad_token_id)
+
+    with inference_context(model):
+        output_ids = model.generate(
+            input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            max_new_tokens=max_length,
+            logits_processor=LogitsProcessorList([watermark_processor]),
+            **generate_kwargs
+        )
+
+    watermarked_text = tokenizer.decode(output_ids[0], skip_special_tokens=True)
+    return watermarked_text, output_ids
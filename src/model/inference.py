@@ -0,0 +1,145 @@
+import warnings
+from dataclasses import dataclass
+
+import torch
+from transformers.pytorch_utils import Conv1D
+
+# CPU inference profiles for load_model_and_tokenizer() and the generation loops.
+#
+# A profile bundles the settings that trade a little numerical fidelity for CPU throughput and
+# resident memory:
+#   dtype          cast the weights (bfloat16 halves the model size; matmuls use the CPU's bf16 path)
+#   quantize_int8  dynamic int8 quantization of the linear layers (weights stored as int8, activations
+#                  quantized on the fly). GPT-2 style Conv1D layers are first converted to nn.Linear.
+#   inference_mode run generation under torch.inference_mode() instead of torch.no_grad()
+#   compile        torch.compile the forward pass (dynamic shapes: the KV cache grows every step)
+#   num_threads / num_interop_threads   explicit intra-op / inter-op thread pools
+#
+# Logits are always cast back to float32 before biasing and sampling, so the watermark logic is the
+# same for every profile. Only the model's probabilities change; bench_inference_profiles() in
+# evaluation/benchmark.py checks that detection accuracy and z-scores stay within tolerance of fp32.
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    name: str
+    dtype: torch.dtype | None = None
+    quantize_int8: bool = False
+    inference_mode: bool = True
+    compile: bool = False
+    num_threads: int | None = None
+    num_interop_threads: int | None = None
+
+INFERENCE_PROFILES = {
+    'fp32': InferenceProfile('fp32', inference_mode=False),  # Original behaviour
+    'fp32_inference': InferenceProfile('fp32_inference'),
+    'bf16': InferenceProfile('bf16', dtype=torch.bfloat16),
+    'int8': InferenceProfile('int8', quantize_int8=True),
+    'compiled': InferenceProfile('compiled', compile=True),
+}
+
+def get_inference_profile(profile: str | InferenceProfile | None) -> InferenceProfile:
+    """
+    Resolves a profile name (INFERENCE_PROFILES) or passes an InferenceProfile through. None: 'fp32'.
+    """
+    if profile is None:
+        return INFERENCE_PROFILES['fp32']
+    if isinstance(profile, InferenceProfile):
+        return profile
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"unknown inference profile '{profile}' (expected one of {sorted(INFERENCE_PROFILES)})")
+    return INFERENCE_PROFILES[profile]
+
+def configure_threads(num_threads: int | None = None, num_interop_threads: int | None = None):
+    """
+    Sets the intra-op / inter-op thread pools. The inter-op pool can only be sized before the first
+    parallel operation of the process; later calls leave it unchanged and warn.
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads is not None and torch.get_num_interop_threads() != num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            warnings.warn("inter-op threads can only be set before any parallel work; keeping "
+                          f"{torch.get_num_interop_threads()}")
+
+def _conv1d_to_linear(module: torch.nn.Module):
+    """
+    Replaces every transformers Conv1D (weight [in, out]) with the equivalent nn.Linear (weight [out, in]).
+    """
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features, dtype=child.weight.dtype)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+def _quantize_int8(model: torch.nn.Module) -> torch.nn.Module:
+    _conv1d_to_linear(model)
+    # lm_head shares its weight with the input embedding; quantizing it would keep both copies
+    output_embeddings = model.get_output_embeddings() if hasattr(model, 'get_output_embeddings') else None
+    linear_names = {
+        name for name, module in model.named_modules()
+        if isinstance(module, torch.nn.Linear) and module is not output_embeddings
+    }
+    with warnings.catch_warnings():
+        # Eager-mode dynamic quantization is deprecated upstream but still the only CPU int8 path
+        # that needs no extra dependency
+        warnings.simplefilter('ignore')
+        from torch.ao.quantization import quantize_dynamic
+        return quantize_dynamic(model, qconfig_spec=linear_names, dtype=torch.qint8, inplace=True)
+
+def apply_inference_profile(model: torch.nn.Module, profile: str | InferenceProfile | None) -> torch.nn.Module:
+    """
+    Applies a CPU inference profile to a model (in place where possible) and returns the model.
+    The profile is stored as model.inference_profile for inference_context().
+    """
+    profile = get_inference_profile(profile)
+    configure_threads(profile.num_threads, profile.num_interop_threads)
+    model.eval()
+    if profile.dtype is not None:
+        model = model.to(profile.dtype)
+    if profile.quantize_int8:
+        model = _quantize_int8(model)
+    if profile.compile:
+        model.forward = torch.compile(model.forward, dynamic=True)
+    model.inference_profile = profile
+    return model
+
+def inference_context(model: torch.nn.Module):
+    """
+    Grad-free context of the generation loops: torch.inference_mode() if the model's profile asks
+    for it, torch.no_grad() otherwise.
+    """
+    profile = getattr(model, 'inference_profile', None)
+    if profile is not None and profile.inference_mode:
+        return torch.inference_mode()
+    return torch.no_grad()
+
+def _state_bytes(value) -> int:
+    if isinstance(value, torch.Tensor):
+        if value.is_quantized:
+            return value.int_repr().numel() * value.int_repr().element_size()
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_state_bytes(item) for item in value)
+    return 0
+
+def model_memory_bytes(model: torch.nn.Module) -> int:
+    """
+    Bytes held by the model's weights and buffers (tied weights counted once, int8 packed weights included).
+    """
+    total, seen = 0, set()
+    for value in model.state_dict(keep_vars=True).values():
+        tensors = value if isinstance(value, (tuple, list)) else (value,)
+        for tensor in tensors:
+            if isinstance(tensor, torch.Tensor):
+                key = tensor.untyped_storage().data_ptr() if not tensor.is_quantized else id(tensor)
+                if key in seen:
+                    continue
+                seen.add(key)
+            total += _state_bytes(tensor)
+    return total
@@ -1,17 +1,24 @@
+import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
+from .inference import InferenceProfile, apply_inference_profile, get_inference_profile
 
-def load_model_and_tokenizer(model_name: str = "skt/kogpt2-base-v2"):
+def load_model_and_tokenizer(model_name: str = "skt/kogpt2-base-v2", profile: str | InferenceProfile | None = None):
     """
     Loads a pre-trained model and tokenizer from Hugging Face.
 
     Args:
         model_name (str): The name of the model to load.
+        profile (str | InferenceProfile | None): CPU inference profile ('fp32', 'bf16', 'int8', ...;
+            see inference.py). None keeps the fp32 weights and default settings.
 
     Returns:
         A tuple containing the loaded model and tokenizer.
     """
-    model = AutoModelForCausalLM.from_pretrained(model_name, use_safetensors=True)
+    profile = get_inference_profile(profile)
+    # Load directly in the profile's dtype, so no fp32 copy is materialized first
+    model = AutoModelForCausalLM.from_pretrained(model_name, use_safetensors=True, dtype=profile.dtype or torch.float32)
+    model = apply_inference_profile(model, profile)
     tokenizer = AutoTokenizer.from_pretrained(model_name)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
-    return model, tokenizer
\ No newline at end of file
+    return model, tokenizer
@@ -0,0 +1,72 @@
+import math
+
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers, decoders
+from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+from ..watermark.jamo_utils import HANGUL_START_CODE, HANGUL_END_CODE
+
+# Offline tiny model for tests, benchmarks and smoke runs ('tiny' model name of the CLIs).
+#
+# Not a production loader (see load_model.py): the weights are random. They are drawn from a local
+# torch.Generator, so building the model neither reads nor reseeds the global RNG of the caller.
+
+def load_tiny_tokenizer() -> PreTrainedTokenizerFast:
+    """
+    Synthetic character-level Korean tokenizer: every Hangul syllable (가 ~ 힣), the '▁' word-boundary
+    marker, digits, Latin letters and common punctuation each map to a single token.
+    """
+    special_tokens = ["</s>", "<unk>", "<pad>"]
+    symbols = ["▁"] + list("0123456789.,?!'\"()-") + list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    syllables = [chr(code) for code in range(HANGUL_START_CODE, HANGUL_END_CODE + 1)]
+    vocab = {token: idx for idx, token in enumerate(special_tokens + symbols + syllables)}
+
+    # BPE without merges == character-level tokenization over the vocabulary above
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[], unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Metaspace()
+    backend.decoder = decoders.Metaspace()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        eos_token="</s>",
+        unk_token="<unk>",
+        pad_token="<pad>",
+    )
+
+def load_tiny_model_and_tokenizer(seed: int = 0, n_layer: int = 2, n_embd: int = 64):
+    """
+    Builds a tiny, randomly initialized GPT-2 and the synthetic Korean tokenizer, fully offline.
+    Intended for tests and benchmarks where downloading skt/kogpt2-base-v2 is not possible.
+
+    Args:
+        seed (int): Seed of the local generator drawing the weights.
+        n_layer (int): Number of transformer blocks.
+        n_embd (int): Hidden size.
+
+    Returns:
+        A tuple containing the model (in eval mode) and tokenizer.
+    """
+    tokenizer = load_tiny_tokenizer()
+    config = GPT2Config(
+        vocab_size=len(tokenizer),
+        n_positions=1024,
+        n_embd=n_embd,
+        n_layer=n_layer,
+        n_head=2,
+        bos_token_id=tokenizer.eos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    # The constructor initializes from the global RNG: run it on a forked state, then redraw every
+    # weight matrix from the local generator (GPT-2's init; biases and LayerNorms are constants)
+    with torch.random.fork_rng(devices=[]):
+        model = GPT2LMHeadModel(config)
+    generator = torch.Generator().manual_seed(seed)
+    with torch.no_grad():
+        for name, param in model.named_parameters():
+            if param.dim() < 2:
+                continue
+            std = config.initializer_range
+            if name.endswith('c_proj.weight'):
+                std /= math.sqrt(2 * n_layer)
+            param.normal_(0.0, std, generator=generator)
+    model.eval()
+    return model, tokenizer
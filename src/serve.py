@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from .model.batching import ContinuousBatcher
+from .model.inference import INFERENCE_PROFILES, apply_inference_profile
+from .model.load_model import load_model_and_tokenizer
+from .model.tiny_model import load_tiny_model_and_tokenizer
+from .watermark.detector import JamoWatermarkDetector
+from .watermark.hash_policy import HashPolicy, KeyedHashPolicy
+from .watermark.metrics import NULL_METRICS, MetricsCollector, NullMetrics
+from .watermark.payload_mgr import PayloadManager
+from .watermark.processor import JamoWatermarkProcessor
+from .watermark.schedule import EmbeddingSchedule
+
+# Local asynchronous watermarking service.
+#
+# WatermarkService accepts generation and detection requests concurrently from asyncio code:
+#
+# * Generation: requests are grouped by (mode, k_bits), each group with its own ContinuousBatcher
+#   (model/batching.py) over the shared model. A single background task steps the batchers in a
+#   dedicated thread, so a request arriving mid-generation joins the running batch at the next
+#   step instead of waiting for the previous requests to finish, and the event loop stays free.
+# * Detection: runs on a thread pool, independently of generation (detectors are cached per
+#   (message, mode, k_bits)).
+#
+# serve_http() exposes the service on localhost with a minimal JSON-over-HTTP/1.1 protocol:
+#   POST /generate  {"prompt", "message", "mode"?, "k_bits"?, "max_length"?, "seed"?, ...}
+#   POST /detect    {"message", "token_ids" | "text", "mode"?, "k_bits"?}
+#   GET  /health, GET /metrics (Prometheus text, when a MetricsCollector is attached)
+#
+#   python -m src.serve --model tiny --port 8000
+
+MAX_REQUEST_BYTES = 1 << 20
+MAX_CACHED_DETECTORS = 256
+
+class WatermarkService:
+    """
+    Concurrent generation (continuous batching) and detection over one model (see module comment).
+    """
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 8,
+        detection_workers: int = 2,
+        top_k: int | None = 20,
+        schedule: EmbeddingSchedule | None = None,
+        metrics: NullMetrics | None = None,
+        hash_key: str | None = None
+    ):
+        """
+        Args:
+            max_batch_size (int): Maximum rows per generation forward pass (per (mode, k_bits) group).
+            detection_workers (int): Threads of the detection pool.
+            top_k (int | None): Candidate tokens biased by the processors.
+            schedule (EmbeddingSchedule | None): Shared by generation and detection.
+            metrics (NullMetrics | None): Instrumentation sink of processors and detectors.
+            hash_key (str | None): Secret key of a KeyedHashPolicy (with previous-token context) shared
+                by generation and detection; None: plain modulo HashPolicy.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.top_k = top_k
+        self.schedule = schedule
+        if hash_key == '':
+            raise ValueError("hash_key must not be empty (None: plain modulo HashPolicy)")
+        self.hash_key = hash_key
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.payload_mgr = PayloadManager()
+        self._batchers: dict[tuple[str, int], ContinuousBatcher] = {}
+        self._detectors: dict[tuple[str, str, int], JamoWatermarkDetector] = {}
+        self._futures: dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self._generation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jamo-generation')
+        self._detection_executor = ThreadPoolExecutor(max_workers=detection_workers, thread_name_prefix='jamo-detection')
+        self._wakeup: asyncio.Event | None = None
+        self._loop_task: asyncio.Task | None = None
+
+    @classmethod
+    def from_pretrained(cls, model_name: str = "skt/kogpt2-base-v2", profile: str | None = None, **kwargs) -> 'WatermarkService':
+        """
+        Loads the model with load_model_and_tokenizer ('tiny': offline test model) and the given
+        CPU inference profile (see model/inference.py).
+        """
+        if model_name == 'tiny':
+            model, tokenizer = load_tiny_model_and_tokenizer()
+            model = apply_inference_profile(model, profile)
+        else:
+            model, tokenizer = load_model_and_tokenizer(model_name, profile=profile)
+        return cls(model, tokenizer, **kwargs)
+
+    async def start(self):
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._generation_loop())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        for future in self._futures.values():
+            if not future.done():
+                future.cancel()
+        self._futures.clear()
+        self._generation_executor.shutdown(wait=True)
+        self._detection_executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> 'WatermarkService':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def _hash_policy(self, mode: str, k_bits: int) -> HashPolicy:
+        if self.hash_key is None:
+            return HashPolicy(mode=mode, k_bits=k_bits)
+        return KeyedHashPolicy(mode=mode, k_bits=k_bits, key=self.hash_key)
+
+    def _batcher(self, mode: str, k_bits: int) -> ContinuousBatcher:
+        key = (mode, k_bits)
+        batcher = self._batchers.get(key)
+        if batcher is None:
+            processor = JamoWatermarkProcessor(
+                self.tokenizer, top_k=self.top_k, metrics=self.metrics, schedule=self.schedule,
+                hash_policy=self._hash_policy(mode, k_bits)
+            )
+            batcher = self._batchers[key] = ContinuousBatcher(self.model, self.tokenizer, processor, self.max_batch_size)
+        return batcher
+
+    def _detector(self, message: str, mode: str, k_bits: int) -> JamoWatermarkDetector:
+        key = (message, mode, k_bits)
+        detector = self._detectors.get(key)
+        if detector is None:
+            if len(self._detectors) >= MAX_CACHED_DETECTORS:
+                self._detectors.clear()
+            detector = self._detectors[key] = JamoWatermarkDetector(
+                self.tokenizer, message, metrics=self.metrics, schedule=self.schedule,
+                hash_policy=self._hash_policy(mode, k_bits)
+            )
+        return detector
+
+    @staticmethod
+    def _step_all(batchers: list[ContinuousBatcher]) -> list:
+        """
+        One step of every batcher with work (runs in the generation thread).
+        """
+        results = []
+        for batcher in batchers:
+            results += batcher.step()
+        return results
+
+    async def _generation_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batchers = [batcher for batcher in self._batchers.values() if batcher.has_work()]
+            if not batchers:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                results = await loop.run_in_executor(self._generation_executor, self._step_all, batchers)
+            except Exception as error:
+                # A failing step poisons the running batches: fail their requests and start over
+                for future in self._futures.values():
+                    if not future.done():
+                        future.set_exception(error)
+                self._futures.clear()
+                self._batchers.clear()
+                continue
+            for result in results:
+                future = self._futures.pop(result.request_id, None)
+                if future is not None and not future.done():
+                    future.set_result(result)
+
+    async def generate(
+        self,
+        prompt: str,
+        message: str,
+        mode: str = 'robustness',
+        k_bits: int = 2,
+        max_length: int = 300,
+        seed: int | None = None,
+        repeat_payload: bool = False,
+        stop_after_payload: bool = False
+    ) -> dict:
+        """
+        Generates watermarked text; concurrent calls share forward passes.
+
+        Args:
+            seed (int | None): Seed of this request's sampling generator (None: global RNG).
+
+        Returns:
+            dict with 'text', 'token_ids' (list[int], prompt included) and 'embedded_symbols'.
+        """
+        if self._loop_task is None:
+            await self.start()
+        generator = torch.Generator().manual_seed(seed) if seed is not None else None
+        payload = self.payload_mgr.encode_packed(message, k_bits=k_bits)
+
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[request_id] = future
+        try:
+            self._batcher(mode, k_bits).submit(
+                request_id, prompt, payload, max_length=max_length, repeat_payload=repeat_payload,
+                stop_after_payload=stop_after_payload, generator=generator
+            )
+        except Exception:
+            del self._futures[request_id]
+            raise
+        self._wakeup.set()
+
+        result = await future
+        return {
+            'text': result.text,
+            'token_ids': result.token_ids[0].tolist(),
+            'embedded_symbols': result.embedded_symbols,
+        }
+
+    async def detect(
+        self,
+        message: str,
+        token_ids: list[int] | None = None,
+        text: str | None = None,
+        mode: str = 'robustness',
+        k_bits: int = 2
+    ) -> dict:
+        """
+        Verifies `message` in token ids, or in text (tokenized with the service tokenizer).
+
+        Returns:
+            dict with 'accuracy', 'extracted_payload', 'recovered_message' and 'z_score'.
+        """
+        if token_ids is None and text is None:
+            raise ValueError("either token_ids or text is required")
+        detector = self._detector(message, mode, k_bits)
+
+        def run() -> dict:
+            ids = token_ids if token_ids is not None else self.tokenizer.encode(text)
+            input_ids = torch.tensor([ids], dtype=torch.long).reshape(1, -1)
+            accuracy, extracted_payload, z_score = detector.extract_payload(input_ids, detector.packed_payload)
+            return {
+                'accuracy': accuracy,
+                'extracted_payload': extracted_payload,
+                'recovered_message': self.payload_mgr.decode(extracted_payload),
+                'z_score': z_score,
+            }
+
+        return await asyncio.get_running_loop().run_in_executor(self._detection_executor, run)
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    request_line = (await reader.readline()).decode('latin-1').strip()
+    if not request_line:
+        raise ConnectionError("connection closed")
+    method, path, _ = request_line.split(' ', 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_REQUEST_BYTES:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, path, body
+
+def _write_response(writer: asyncio.StreamWriter, status: int, body: str, content_type: str = 'application/json'):
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+    payload = body.encode('utf-8')
+    writer.write(
+        f"HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+        f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode('latin-1') + payload
+    )
+
+async def _dispatch(service: WatermarkService, method: str, path: str, body: bytes) -> tuple[int, str, str]:
+    if method == 'GET' and path == '/health':
+        return 200, json.dumps({'status': 'ok'}), 'application/json'
+    if method == 'GET' and path == '/metrics' and isinstance(service.metrics, MetricsCollector):
+        return 200, service.metrics.to_prometheus(), 'text/plain'
+    if method == 'POST' and path in ('/generate', '/detect'):
+        params = json.loads(body or b'{}')
+        handler = service.generate if path == '/generate' else service.detect
+        return 200, json.dumps(await handler(**params), ensure_ascii=False), 'application/json'
+    return 404, json.dumps({'error': f"no route for {method} {path}"}), 'application/json'
+
+async def serve_http(service: WatermarkService, host: str = '127.0.0.1', port: int = 8000) -> asyncio.AbstractServer:
+    """
+    Starts the HTTP front end of `service` (one request per connection) and returns the server.
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await _read_request(reader)
+            status, response, content_type = await _dispatch(service, method, path, body)
+        except ConnectionError:
+            writer.close()
+            return
+        except (ValueError, TypeError) as error:
+            status, response, content_type = 400, json.dumps({'error': str(error)}), 'application/json'
+        except Exception as error:
+            status, response, content_type = 500, json.dumps({'error': str(error)}), 'application/json'
+        _write_response(writer, status, response, content_type)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    await service.start()
+    return await asyncio.start_server(handle, host, port)
+
+async def _serve_forever(args: argparse.Namespace):
+    schedule = EmbeddingSchedule(key=args.schedule_key) if args.schedule_key else None
+    service = WatermarkService.from_pretrained(
+        args.model, profile=args.profile, max_batch_size=args.max_batch_size, detection_workers=args.detection_workers,
+        top_k=args.top_k, schedule=schedule, metrics=MetricsCollector(), hash_key=args.hash_key
+    )
+    async with service:
+        server = await serve_http(service, args.host, args.port)
+        print(f"Serving on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Local Jamo watermarking service")
+    parser.add_argument('--model', default="skt/kogpt2-base-v2", help="Model name, or 'tiny' for the offline test model")
+    parser.add_argument('--profile', default='fp32', choices=sorted(INFERENCE_PROFILES), help="CPU inference profile")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--detection-workers', type=int, default=2)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--schedule-key', help="Key of the keyed channel schedule (default: round robin)")
+    parser.add_argument('--hash-key', help="Secret key of the keyed hash policy (default: plain modulo hash)")
+    args = parser.parse_args(argv)
+    if args.hash_key == '':
+        parser.error("--hash-key must not be empty")
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import pytest
+
+from src.watermark.table_cache import CACHE_DIR_ENV
+
+
+@pytest.fixture(autouse=True)
+def table_cache_dir(tmp_path, monkeypatch):
+    # Tests never persist vocabulary tables outside their temporary directory
+    cache_dir = tmp_path / 'jamo_cache'
+    monkeypatch.setenv(CACHE_DIR_ENV, str(cache_dir))
+    return cache_dir
@@ -0,0 +1,29 @@
+import json
+
+from src.evaluation import benchmark
+from src.model.tiny_model import load_tiny_model_and_tokenizer
+from src.watermark.detector import JamoWatermarkDetector
+from src.watermark.payload_mgr import PayloadManager
+from src.watermark.processor import JamoWatermarkProcessor
+
+
+def test_benchmark_entry_points_smoke():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload_bits = PayloadManager().encode(benchmark.MESSAGE)
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20)
+    detector = JamoWatermarkDetector(tokenizer, benchmark.MESSAGE, 'robustness', 2)
+
+    results = {
+        'micro': benchmark.bench_micro(num_calls=100),
+        'generation_step': benchmark.bench_generation_steps(model, tokenizer, processor, payload_bits, 2, num_steps=8),
+        'generation': benchmark.bench_generation(model, tokenizer, processor, payload_bits, 2, max_length=8),
+        'instrumentation': benchmark.bench_instrumentation(model, tokenizer, processor, payload_bits, 2, max_length=8),
+        'detection': benchmark.bench_detection(tokenizer, detector, payload_bits, num_docs=4, doc_len=50),
+    }
+    # The step timings come from the real generation loop, and the default no-op metrics are restored
+    assert {'step_ms', 'forward_ms', 'bias_logits_ms', 'sampling_ms', 'check_token_match_ms'} <= results['generation_step'].keys()
+    assert not processor.metrics.enabled
+
+    results = json.loads(json.dumps(results))
+    comparison = benchmark.compare_results(results, results)
+    assert comparison and all(ratio == 1.0 for *_, ratio in comparison if ratio == ratio)
@@ -0,0 +1,348 @@
+import random
+from pathlib import Path
+
+import pytest
+import subprocess
+import sys
+
+import torch
+
+from src.model.tiny_model import load_tiny_model_and_tokenizer
+from src.model.generate import generate_watermarked_text_batch
+from src.watermark.hash_policy import KeyedHashPolicy
+from src.watermark.detector import JamoMultiPayloadDetector, JamoStreamingDetector, JamoWatermarkDetector
+from src.watermark.long_detector import JamoLongDocumentDetector
+from src.watermark.payload_mgr import PayloadManager
+from src.watermark.processor import JamoWatermarkProcessor
+from src.watermark.schedule import EmbeddingSchedule
+from src.watermark.table_detector import JamoTableDetector
+from src.watermark.text_detector import JamoTextDetector
+
+
+def test_batch_detection_matches_single_sequence_detection():
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+
+    rng = random.Random(0)
+    sequences = [[rng.randrange(len(tokenizer)) for _ in range(rng.randint(0, 300))] for _ in range(20)]
+
+    batch_results = detector.extract_payload_batch(sequences)
+    for ids, result in zip(sequences, batch_results):
+        assert result == detector.extract_payload(torch.tensor([ids], dtype=torch.long), detector.payload)
+
+    # Both paths score the payload they are given, not the detector's own message
+    other_payload = PayloadManager().encode("Z")
+    ids = torch.tensor([sequences[0]], dtype=torch.long)
+    assert detector.extract_payload(ids, other_payload) == detector.extract_payload_batch(ids, other_payload)[0]
+    assert detector.extract_payload(ids, other_payload) != detector.extract_payload(ids)
+
+
+def test_streaming_detection_matches_full_sequence_detection():
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+    # Thresholds out of reach: never decide early, so every token is consumed
+    streaming = JamoStreamingDetector(tokenizer, "AB", 'robustness', 2, z_threshold=float('inf'), clear_threshold=float('-inf'))
+
+    rng = random.Random(1)
+    for _ in range(10):
+        ids = [rng.randrange(len(tokenizer)) for _ in range(rng.randint(0, 300))]
+        streaming.reset()
+        for start in range(0, len(ids), 7):
+            assert streaming.feed(ids[start:start + 7]) is None
+
+        expected = detector.extract_payload(torch.tensor([ids], dtype=torch.long), detector.payload)
+        assert (streaming.accuracy, streaming.extracted_payload, streaming.z_score) == expected
+
+
+def test_text_detection_matches_token_detection():
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+    text_detector = JamoTextDetector("AB", 'robustness', 2)
+
+    rng = random.Random(2)
+    for _ in range(10):
+        # Skip the special tokens so the token strings concatenate back into the text
+        ids = [rng.randrange(3, len(tokenizer)) for _ in range(rng.randint(0, 300))]
+        text = ''.join(tokenizer.convert_ids_to_tokens(ids))
+        boundaries = list(range(1, len(text) + 1))  # The synthetic tokenizer is character level
+
+        expected = detector.extract_payload(torch.tensor([ids], dtype=torch.long), detector.payload)
+        assert text_detector.extract_payload(text, boundaries=boundaries) == expected
+
+
+def test_exported_table_detection_matches_token_detection(tmp_path):
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+    detector.export_detection_table(str(tmp_path))
+    table_detector = JamoTableDetector(str(tmp_path), "AB")
+
+    rng = random.Random(3)
+    for _ in range(10):
+        ids = [rng.randrange(len(tokenizer)) for _ in range(rng.randint(0, 300))]
+        expected = detector.extract_payload(torch.tensor([ids], dtype=torch.long), detector.payload)
+        assert table_detector.extract_payload(ids) == expected
+
+
+def test_detect_entry_point_does_not_import_torch():
+    code = "import sys, src.detect; assert 'torch' not in sys.modules and 'transformers' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_multi_payload_detection_matches_per_payload_detection():
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    messages = ["A", "AB", "tenant-7", "가나"]
+    multi_detector = JamoMultiPayloadDetector(tokenizer, messages, 'robustness', 2)
+
+    rng = random.Random(4)
+    for _ in range(10):
+        input_ids = torch.tensor([[rng.randrange(len(tokenizer)) for _ in range(rng.randint(0, 60))]], dtype=torch.long)
+        ranking = multi_detector.rank_payloads(input_ids)
+
+        assert [z for _, _, z in ranking] == sorted((z for _, _, z in ranking), reverse=True)
+        for message, accuracy, z_score in ranking:
+            detector = JamoWatermarkDetector(tokenizer, message, 'robustness', 2)
+            assert accuracy == detector.extract_payload(input_ids, detector.payload)[0]
+            # z-score per Hangul token checked, as the streaming detector's running z-score
+            streaming = JamoStreamingDetector(tokenizer, message, 'robustness', 2, z_threshold=float('inf'), clear_threshold=float('-inf'))
+            streaming.feed(input_ids[0])
+            assert z_score == streaming.running_z_score
+
+
+def test_multi_payload_detection_ranks_the_embedded_tenant_first():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    # Tenant ids differ only in their last payload symbols
+    tenants = [f"tenant-{i:02d}" for i in range(4)]
+    schedule = EmbeddingSchedule(key="secret", target_match_rate=0.9)
+    multi_detector = JamoMultiPayloadDetector(tokenizer, tenants, 'robustness', 2, schedule=schedule)
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20, schedule=schedule)
+
+    for embedded in range(len(tenants)):
+        payload = PayloadManager().encode_packed(tenants[embedded], k_bits=2)
+        generator = torch.Generator().manual_seed(embedded)
+        _, sequences = generate_watermarked_text_batch(
+            model, tokenizer, processor, ["인공지능은"], [payload], k_bits=2, max_length=320, generator=generator
+        )
+        assert sequences[0].size(1) >= 300
+        ranking = multi_detector.rank_payloads(sequences[0])
+        assert ranking[0][0] == tenants[embedded]
+        assert ranking[0][2] > ranking[1][2]
+
+    # Unwatermarked text does not look watermarked for any tenant
+    rng = random.Random(7)
+    clean = torch.tensor([[rng.randrange(3, len(tokenizer)) for _ in range(300)]])
+    assert all(z_score < 4.0 for _, _, z_score in multi_detector.rank_payloads(clean))
+
+def test_multi_payload_ranking_is_not_won_by_common_hash_symbols():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    # The decoy's payload symbols are mostly hash value 0, the most frequent value in Korean text
+    candidates = ["tenant-00", "\x00" * 9]
+    schedule = EmbeddingSchedule(key="secret", target_match_rate=0.9)
+    multi_detector = JamoMultiPayloadDetector(tokenizer, candidates, 'robustness', 2, schedule=schedule)
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20, schedule=schedule)
+    payload = PayloadManager().encode_packed(candidates[0], k_bits=2)
+    _, sequences = generate_watermarked_text_batch(
+        model, tokenizer, processor, ["인공지능은"], [payload], k_bits=2, max_length=320, generator=torch.Generator().manual_seed(0)
+    )
+    excerpt = sequences[0][0, :40].tolist()
+
+    notes = Path(__file__).resolve().parents[2] / 'notes'
+    prose = tokenizer.encode((notes / 'report_draft_251124.md').read_text(encoding='utf-8'))
+    for start in (0, 400, 800):
+        clean = prose[start:start + 400]
+        assert all(z_score < 4.0 for _, _, z_score in multi_detector.rank_payloads(torch.tensor([clean])))
+        # A short watermarked excerpt followed by clean prose is still attributed to its tenant
+        assert multi_detector.rank_payloads(torch.tensor([excerpt + clean]))[0][0] == candidates[0]
+
+def _reference_lcs(channel_hashes, targets):
+    prev = [0] * (len(targets) + 1)
+    for t, token_hashes in enumerate(channel_hashes):
+        cur = [0] * (len(targets) + 1)
+        for i, target in enumerate(targets):
+            if token_hashes[i % 3] == target:
+                cur[i + 1] = prev[i] + 1
+            else:
+                cur[i + 1] = max(prev[i + 1], cur[i])
+        prev = cur
+    return prev[-1]
+
+def test_aligned_detection_matches_reference_and_greedy_lower_bound():
+    from src.watermark.scoring import aligned_matches, greedy_sync, payload_to_symbols
+
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+    text_detector = JamoTextDetector("AB", 'robustness', 2)
+    targets = payload_to_symbols(detector.packed_payload, 2)
+
+    rng = random.Random(5)
+    for _ in range(10):
+        ids = [rng.randrange(3, len(tokenizer)) for _ in range(rng.randint(0, 80))]
+        channel_hashes = detector._channel_hashes(torch.tensor(ids)).numpy()
+        aligned_cnt = aligned_matches(channel_hashes, targets, 2)
+        assert aligned_cnt == _reference_lcs(channel_hashes.tolist(), targets)
+        assert aligned_cnt >= greedy_sync(channel_hashes, targets, 2)
+
+        accuracy, cnt, z_score = detector.extract_payload_aligned(torch.tensor([ids]))
+        assert cnt == aligned_cnt
+        text = ''.join(tokenizer.convert_ids_to_tokens(ids))
+        assert text_detector.extract_payload_aligned(text, boundaries=list(range(1, len(text) + 1))) == (accuracy, cnt, z_score)
+
+
+
+def test_aligned_z_score_separates_payloads_on_long_texts():
+    from src.watermark.scoring import aligned_matches_by_prefix, payload_to_symbols
+
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    schedule = EmbeddingSchedule(key="secret", target_match_rate=0.9)
+    detector = JamoWatermarkDetector(tokenizer, "Read Me", 'robustness', 2, schedule=schedule)
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20, schedule=schedule)
+    wrong_payload = PayloadManager().encode_packed("Wrong!!", k_bits=2)
+
+    for seed in range(2):
+        _, sequences = generate_watermarked_text_batch(
+            model, tokenizer, processor, ["인공지능은"], [detector.packed_payload], k_bits=2,
+            max_length=320, generator=torch.Generator().manual_seed(seed)
+        )
+        assert sequences[0].size(1) >= 300
+        # Both payloads fit into the text, only the embedded one aligns early
+        accuracy, _, z_score = detector.extract_payload_aligned(sequences[0])
+        wrong_accuracy, _, wrong_z_score = detector.extract_payload_aligned(sequences[0], wrong_payload)
+        assert accuracy == wrong_accuracy == 1.0
+        assert z_score > 4.0 > wrong_z_score
+
+    # Unwatermarked text keeps a non-degenerate null at every length
+    targets = payload_to_symbols(detector.packed_payload, 2)
+    rng = random.Random(3)
+    for length in (300, 1000, 3000):
+        z_scores = []
+        for _ in range(4):
+            ids = torch.tensor([[rng.randrange(3, len(tokenizer)) for _ in range(length)]])
+            _, aligned_cnt, z_score = detector.extract_payload_aligned(ids)
+            channel_hashes = detector._channel_hashes(ids[0]).numpy()
+            assert aligned_matches_by_prefix(channel_hashes, targets, 2, detector.schedule.channels(targets, detector.hash_policy))[-1] == aligned_cnt
+            z_scores.append(z_score)
+        assert len(set(z_scores)) > 1
+        assert all(abs(z_score) < 4.0 for z_score in z_scores)
+
+    # Real Korean prose has skewed hash frequencies; payloads that favour the common hashes still score near zero
+    notes = Path(__file__).resolve().parents[2] / 'notes'
+    words = (notes / 'report_draft_251124.md').read_text(encoding='utf-8').split()
+    text_detector = JamoTextDetector("\x00" * 6, 'robustness', 2)
+    z_scores = [text_detector.extract_payload_aligned(' '.join(words[start:start + 300]))[2] for start in range(0, 1050, 150)]
+    assert all(z_score < 4.0 for z_score in z_scores)
+    assert abs(sum(z_scores) / len(z_scores)) < 1.0
+
+def test_per_token_z_score_is_calibrated_on_korean_prose():
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    notes = Path(__file__).resolve().parents[2] / 'notes'
+    ids = tokenizer.encode((notes / 'report_draft_251124.md').read_text(encoding='utf-8'))
+
+    # Payloads of rare and of common hash values both score near zero on clean text
+    for message in ("Read Me If You Can", "\x00" * 6):
+        detector = JamoWatermarkDetector(tokenizer, message, 'robustness', 2)
+        z_scores = [detector.extract_payload_per_token(torch.tensor([ids[start:start + 400]]))[2] for start in range(0, 4000, 200)]
+        assert all(z_score < 4.0 for z_score in z_scores)
+        assert abs(sum(z_scores) / len(z_scores)) < 1.0
+
+def test_long_document_detection_finds_repeating_payload_excerpt():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload = PayloadManager().encode_packed("AB", k_bits=2)
+    schedule = EmbeddingSchedule(key="secret", target_match_rate=0.9)
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20, schedule=schedule)
+    generator = torch.Generator().manual_seed(0)
+    _, sequences = generate_watermarked_text_batch(
+        model, tokenizer, processor, ["인공지능은"], [payload],
+        k_bits=2, max_length=400, generator=generator, repeat_payload=True
+    )
+    watermarked = sequences[0][0].tolist()
+
+    # A watermarked excerpt (not starting at a payload boundary) inside clean text
+    rng = random.Random(6)
+    clean = [rng.randrange(3, len(tokenizer)) for _ in range(600)]
+    document = clean[:300] + watermarked[150:400] + clean[300:]
+
+    hashes = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2).detection_hashes().numpy()
+    detector = JamoLongDocumentDetector("AB", 'robustness', 2, schedule=schedule, chunk_tokens=128)
+
+    result = detector.detect_token_ids(document, hashes, piece_size=100)
+    assert result['z_score'] >= 4.0
+    assert any(start < 550 and end > 300 for start, end in result['locations'])
+    assert detector.detect_token_ids(clean, hashes)['locations'] == []
+
+    # Chunks synchronized in worker processes give the same result
+    assert detector.detect_token_ids(document, hashes, workers=2, piece_size=100) == result
+
+
+def test_long_document_scores_stay_calibrated_on_korean_prose():
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    notes = Path(__file__).resolve().parents[2] / 'notes'
+    text = (notes / 'report_draft_251124.md').read_text(encoding='utf-8')
+    text += (notes / 'note_251123.md').read_text(encoding='utf-8')
+
+    # Real jamo hashes are far from uniform; clean prose must still score near zero
+    for message in ("ABC", "Read Me If You Can", "\x00" * 3):
+        result = JamoLongDocumentDetector(message, 'robustness', 2, chunk_tokens=256).detect_text(text)
+        assert abs(result['z_score']) < 3.0
+        assert result['locations'] == []
+
+    hashes = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2).detection_hashes().numpy()
+    prose = tokenizer.encode(text)
+    result = JamoLongDocumentDetector("AB", 'robustness', 2, chunk_tokens=256).detect_token_ids(prose, hashes)
+    assert abs(result['z_score']) < 3.0
+    assert all(abs(chunk['z_score']) < 4.0 for chunk in result['chunks'])
+
+
+
+def test_keyed_context_policy_is_detected_consistently_and_only_with_the_key(tmp_path):
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    hash_policy = KeyedHashPolicy('robustness', 2, key="secret")
+    schedule = EmbeddingSchedule(key="secret", target_match_rate=0.9)
+    payload = PayloadManager().encode_packed("AB", k_bits=2)
+    processor = JamoWatermarkProcessor(tokenizer, top_k=20, schedule=schedule, hash_policy=hash_policy)
+    generator = torch.Generator().manual_seed(0)
+    _, sequences = generate_watermarked_text_batch(
+        model, tokenizer, processor, ["인공지능은"], [payload],
+        k_bits=2, max_length=300, generator=generator, repeat_payload=True
+    )
+    ids = sequences[0][0].tolist()
+
+    # Every detection path applies the same previous-token context
+    detector = JamoWatermarkDetector(tokenizer, "AB", schedule=schedule, hash_policy=hash_policy)
+    expected = detector.extract_payload(torch.tensor([ids]), detector.payload)
+    assert detector.extract_payload_batch([ids, ids[:50]])[0] == expected
+
+    streaming = JamoStreamingDetector(
+        tokenizer, "AB", z_threshold=float('inf'), clear_threshold=float('-inf'), schedule=schedule, hash_policy=hash_policy
+    )
+    for start in range(0, len(ids), 7):
+        streaming.feed(ids[start:start + 7])
+    assert (streaming.accuracy, streaming.extracted_payload, streaming.z_score) == expected
+
+    text = ''.join(tokenizer.convert_ids_to_tokens(ids[1:]))
+    text_detector = JamoTextDetector("AB", schedule=schedule, hash_policy=hash_policy)
+    assert text_detector.extract_payload(text, boundaries=list(range(1, len(text) + 1))) == expected
+    # Words of the boundary heuristic are not the generation tokens: the context would be wrong
+    with pytest.raises(ValueError):
+        text_detector.extract_payload(text)
+    with pytest.raises(ValueError):
+        JamoLongDocumentDetector("AB", schedule=schedule, hash_policy=hash_policy).detect_text(text)
+
+    detector.export_detection_table(str(tmp_path))
+    table_detector = JamoTableDetector(str(tmp_path), "AB", schedule=schedule, hash_policy=hash_policy)
+    assert table_detector.extract_payload(ids) == expected
+    with pytest.raises(ValueError):
+        JamoTableDetector(str(tmp_path), "AB", schedule=schedule)
+
+    # The repeating payload stands out only with the right key; the context carries over between pieces
+    hashes, syllables = table_detector.hashes, table_detector.syllables
+    long_detector = JamoLongDocumentDetector("AB", schedule=schedule, hash_policy=hash_policy)
+    result = long_detector.detect_token_ids(ids, hashes, syllables=syllables)
+    assert result['z_score'] >= 4.0
+    assert long_detector.detect_token_ids(ids, hashes, piece_size=13, syllables=syllables) == result
+
+    for other_policy in (None, KeyedHashPolicy('robustness', 2, key="other")):
+        other = JamoWatermarkDetector(tokenizer, "AB", schedule=schedule, hash_policy=other_policy)
+        other_detector = JamoLongDocumentDetector("AB", schedule=schedule, hash_policy=other_policy)
+        other_result = other_detector.detect_token_ids(
+            ids, other.detection_hashes().numpy(), syllables=other.vocab_table.syllables.numpy()
+        )
+        assert other_result['z_score'] < 4.0
@@ -0,0 +1,97 @@
+import math
+import random
+
+import pytest
+import torch
+
+from src.evaluation.corpus import generate_corpus
+from src.evaluation.eval_quality import _window_jobs, score_texts
+from src.evaluation.eval_robustness import ATTACKS, apply_attack, checked_roc_auc, roc_auc
+from src.evaluation.jsonl_cache import JsonlCache, cache_key
+from src.model.tiny_model import load_tiny_model_and_tokenizer
+from src.watermark.jamo_utils import HANGUL_START_CODE, JONGSEONG_COUNT
+
+
+def test_window_jobs_score_every_continuation_token_once():
+    token_ids = list(range(100))
+    for window, stride in ((100, 100), (32, 16), (32, 32), (10, 3)):
+        for skip in (0, 1, 40, 100):
+            windows = _window_jobs(token_ids, window, stride, skip)
+            assert sum(num_targets for _, num_targets in windows) == len(token_ids) - skip
+            assert all(0 < num_targets <= len(ids) <= window for ids, num_targets in windows)
+
+    with pytest.raises(ValueError):
+        _window_jobs(token_ids, window=16, stride=32)
+    with pytest.raises(ValueError):
+        _window_jobs(token_ids, window=16, stride=0)
+
+
+def test_perplexity_scores_only_the_continuation():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    prompt, text = "인공지능은", "인공지능은 세상을 바꾼다"
+    token_ids = tokenizer.encode(text)
+    num_prompt = len(tokenizer.encode(prompt))
+
+    with torch.no_grad():
+        log_probs = torch.log_softmax(model(torch.tensor([token_ids])).logits[0, :-1], dim=-1)
+    reference = -sum(float(log_probs[i - 1, token_ids[i]]) for i in range(num_prompt, len(token_ids)))
+
+    window = len(token_ids)
+    ((nll, num_tokens),) = score_texts(model, tokenizer, [text], window=window, stride=window, prompts=[prompt])
+    assert num_tokens == len(token_ids) - num_prompt
+    assert nll == pytest.approx(reference, rel=1e-4)
+
+    # Sliding windows still score each continuation token exactly once
+    ((_, num_tokens),) = score_texts(model, tokenizer, [text], window=8, stride=4, prompts=[prompt])
+    assert num_tokens == len(token_ids) - num_prompt
+
+
+def test_attacks_edit_the_expected_share_of_the_text():
+    text = ' '.join(["인공지능은 세상을 바꾼다"] * 50)
+    words = text.split(' ')
+    for attack in ATTACKS:
+        assert apply_attack(text, attack, 0.0, random.Random(0)) == text
+        # Same seed, same attacked text
+        assert apply_attack(text, attack, 0.3, random.Random(1)) == apply_attack(text, attack, 0.3, random.Random(1))
+
+    assert len(apply_attack(text, 'deletion', 1.0, random.Random(0))) == 0
+    assert len(apply_attack(text, 'insertion', 1.0, random.Random(0)).split(' ')) == 2 * len(words)
+    substituted = apply_attack(text, 'substitution', 1.0, random.Random(0)).split(' ')
+    assert [len(word) for word in substituted] == [len(word) for word in words] and substituted != words
+    assert apply_attack(text, 'truncation', 0.5, random.Random(0)).split(' ') == words[:len(words) // 2]
+
+    # A syllable swap changes only the Jongseong of Hangul syllables
+    swapped = apply_attack(text, 'syllable_swap', 1.0, random.Random(0))
+    assert len(swapped) == len(text)
+    for char, swapped_char in zip(text, swapped):
+        if char == ' ':
+            assert swapped_char == ' '
+        else:
+            code, swapped_code = ord(char) - HANGUL_START_CODE, ord(swapped_char) - HANGUL_START_CODE
+            assert code // JONGSEONG_COUNT == swapped_code // JONGSEONG_COUNT and code != swapped_code
+
+    with pytest.raises(ValueError):
+        apply_attack(text, 'paraphrase', 0.1, random.Random(0))
+
+
+def test_roc_auc_and_degenerate_warning():
+    assert roc_auc([3.0, 4.0], [0.0, 1.0]) == 1.0
+    assert roc_auc([0.0, 1.0], [3.0, 4.0]) == 0.0
+    assert roc_auc([1.0, 2.0], [1.0, 0.0]) == pytest.approx(0.875)
+    assert math.isnan(roc_auc([1.0], []))
+
+    with pytest.warns(UserWarning, match="degenerate"):
+        assert checked_roc_auc("none@0", [6.0, 6.0], [6.0, 6.0]) == 0.5
+    with pytest.warns(UserWarning, match="undefined"):
+        checked_roc_auc("none@0", [1.0], [])
+
+
+def test_corpus_texts_do_not_depend_on_the_batch(tmp_path):
+    prompts = ["인공지능은", "오늘 아침 뉴스에 따르면", "우주 탐사의 미래는"]
+    jobs = [(cache_key('test', i), prompt, payload, 'robustness', 2) for i, prompt in enumerate(prompts) for payload in ('', '0110')]
+
+    together = generate_corpus('tiny', jobs, JsonlCache(str(tmp_path / 'together.jsonl')), max_length=20, batch_size=4)
+    # Half of the jobs already cached: the rest are generated in a different batch
+    partial = JsonlCache(str(tmp_path / 'partial.jsonl'))
+    generate_corpus('tiny', jobs[::2], partial, max_length=20, batch_size=4)
+    assert generate_corpus('tiny', jobs, partial, max_length=20, batch_size=1) == together
@@ -0,0 +1,224 @@
+import asyncio
+import json
+
+import torch
+
+from src.evaluation.benchmark import bench_inference_profiles
+from src.model.batching import ContinuousBatcher
+from src.model.generate import generate_watermarked_text, generate_watermarked_text_batch, generate_watermarked_text_hf
+from src.model.tiny_model import load_tiny_model_and_tokenizer
+from src.watermark.detector import JamoWatermarkDetector
+from src.watermark.metrics import MetricsCollector
+from src.watermark.payload_mgr import PayloadManager
+from src.watermark.processor import JamoWatermarkLogitsProcessor, JamoWatermarkProcessor
+from src.watermark.schedule import EmbeddingSchedule
+from src.watermark.text_detector import JamoTextDetector
+from src.serve import WatermarkService, serve_http
+
+
+def _generate(model, tokenizer, payload_bits, use_cache, seed=1234):
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20)
+    generator = torch.Generator().manual_seed(seed)
+    return generate_watermarked_text(
+        model, tokenizer, processor, "인공지능은", payload_bits,
+        k_bits=2, max_length=60, use_cache=use_cache, generator=generator
+    )
+
+
+def test_cached_and_uncached_generation_match():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload_bits = PayloadManager().encode("AB")
+
+    cached_text, cached_ids = _generate(model, tokenizer, payload_bits, use_cache=True)
+    uncached_text, uncached_ids = _generate(model, tokenizer, payload_bits, use_cache=False)
+
+    assert torch.equal(cached_ids, uncached_ids)
+    assert cached_text == uncached_text
+
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+    assert detector.extract_payload(cached_ids, payload_bits) == detector.extract_payload(uncached_ids, payload_bits)
+
+
+def test_batched_generation_tracks_step_t_per_row():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload_mgr = PayloadManager()
+    messages = ["A", "BC", "가"]
+    prompts = ["인공지능은", "안녕", "세상은 넓다"]
+    payloads = [payload_mgr.encode(message) for message in messages]
+
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=None)
+    generator = torch.Generator().manual_seed(0)
+    texts, sequences = generate_watermarked_text_batch(
+        model, tokenizer, processor, prompts, payloads,
+        k_bits=2, max_length=120, stop_after_payload=True, generator=generator
+    )
+
+    assert len(texts) == len(sequences) == len(prompts)
+    for message, prompt, payload_bits, text, ids in zip(messages, prompts, payloads, texts, sequences):
+        assert text.startswith(prompt)
+        detector = JamoWatermarkDetector(tokenizer, message, 'robustness', 2)
+        accuracy, extracted_payload, _ = detector.extract_payload(ids, payload_bits)
+        assert accuracy == 1.0
+        assert extracted_payload == payload_bits
+
+
+def test_hf_generate_keeps_post_sampling_sync():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload_bits = PayloadManager().encode("AB")
+
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=None)
+    torch.manual_seed(0)
+    _, output_ids = generate_watermarked_text_hf(model, tokenizer, processor, "인공지능은", payload_bits, max_length=80)
+
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+    accuracy, extracted_payload, z_score = detector.extract_payload(output_ids, payload_bits)
+    assert accuracy == 1.0
+    assert extracted_payload == payload_bits
+    assert z_score > 4.0
+
+
+def test_hf_logits_processor_restarts_on_every_generate_call():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=None)
+    payload_bits = PayloadManager().encode("Read Me")
+
+    def generate(logits_processor, prompt, seed):
+        input_ids = tokenizer.encode(prompt, return_tensors='pt') if isinstance(prompt, str) else prompt
+        torch.manual_seed(seed)
+        with torch.no_grad():
+            output_ids = model.generate(
+                input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=10, do_sample=True,
+                top_k=0, logits_processor=[logits_processor], pad_token_id=tokenizer.pad_token_id
+            )
+        return logits_processor.step_t.clone(), output_ids
+
+    # The second prompt is longer than the first output: the state must not carry over
+    reused = JamoWatermarkLogitsProcessor(processor, payload_bits)
+    step_t, output_ids = generate(reused, "인공", 0)
+    assert step_t.item() > 0
+    long_prompt = "인공지능은 " * 10
+    assert torch.equal(generate(reused, long_prompt, 1)[0], generate(JamoWatermarkLogitsProcessor(processor, payload_bits), long_prompt, 1)[0])
+
+    # A prompt exactly one token longer than the previous input is a new call too, unless it extends that input
+    _, output_ids = generate(reused, "인공", 2)
+    next_prompt = output_ids.flip(1)
+    assert torch.equal(generate(reused, next_prompt, 3)[0], generate(JamoWatermarkLogitsProcessor(processor, payload_bits), next_prompt, 3)[0])
+
+    # The previous output fed back as is needs an explicit reset()
+    _, output_ids = generate(reused, "인공", 4)
+    reused.reset()
+    assert torch.equal(generate(reused, output_ids, 5)[0], generate(JamoWatermarkLogitsProcessor(processor, payload_bits), output_ids, 5)[0])
+
+
+def test_instrumented_generation_matches_and_counts_steps():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload_bits = PayloadManager().encode("AB")
+    _, plain_ids = _generate(model, tokenizer, payload_bits, use_cache=True)
+
+    metrics = MetricsCollector()
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20, metrics=metrics)
+    generator = torch.Generator().manual_seed(1234)
+    _, output_ids = generate_watermarked_text(
+        model, tokenizer, processor, "인공지능은", payload_bits, k_bits=2, max_length=60, generator=generator
+    )
+    assert torch.equal(output_ids, plain_ids)
+
+    # Every matched step is one embedded symbol, and every sampled token is one forward pass
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'robustness', 2)
+    _, extracted_payload, _ = detector.extract_payload(output_ids, payload_bits)
+    matches = sum(value for key, value in metrics.counters['jamo_watermark_steps_total'].items() if ('result', 'match') in key)
+    assert matches == len(extracted_payload) // 2
+    num_new_tokens = output_ids.size(1) - len(tokenizer.encode("인공지능은"))
+    assert metrics.histogram('jamo_generation_forward_seconds').count == num_new_tokens
+
+    exposition = metrics.to_prometheus()
+    assert '# TYPE jamo_watermark_steps_total counter' in exposition
+    assert f'jamo_generation_forward_seconds_bucket{{le="+Inf"}} {num_new_tokens}' in exposition
+
+
+def test_keyed_adaptive_schedule_is_reproduced_by_detectors():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload = PayloadManager().encode_packed("AB", k_bits=2)
+    schedule = EmbeddingSchedule(key="secret", target_match_rate=0.9)
+
+    # 'quality' mode: Choseong always hashes to 0, so the keyed schedule must route around it
+    processor = JamoWatermarkProcessor(tokenizer, 'quality', 2, top_k=20, schedule=schedule)
+    generator = torch.Generator().manual_seed(0)
+    _, sequences = generate_watermarked_text_batch(
+        model, tokenizer, processor, ["인공지능은"], [payload],
+        k_bits=2, max_length=100, stop_after_payload=True, generator=generator
+    )
+    output_ids = sequences[0]
+
+    detector = JamoWatermarkDetector(tokenizer, "AB", 'quality', 2, schedule=schedule)
+    accuracy, extracted_payload, _ = detector.extract_payload(output_ids, payload)
+    assert accuracy == 1.0 and extracted_payload == payload.bits
+
+    # Same result through the tokenizer-free text detector (character-level test tokenizer)
+    text = ''.join(tokenizer.convert_ids_to_tokens(output_ids[0].tolist()))
+    text_detector = JamoTextDetector("AB", 'quality', 2, schedule=schedule)
+    assert text_detector.extract_payload(text, boundaries=list(range(1, len(text) + 1)))[0] == 1.0
+
+    wrong_key = JamoWatermarkDetector(tokenizer, "AB", 'quality', 2, schedule=EmbeddingSchedule(key="other"))
+    assert wrong_key.extract_payload(output_ids, payload)[0] < 1.0
+
+
+
+def test_continuous_batching_service_serves_concurrent_requests():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    payload_bits = PayloadManager().encode("AB")
+
+    # A request decoded alone in the batcher is exactly the single-prompt generation
+    _, reference_ids = _generate(model, tokenizer, payload_bits, use_cache=True, seed=7)
+    processor = JamoWatermarkProcessor(tokenizer, 'robustness', 2, top_k=20)
+    batcher = ContinuousBatcher(model, tokenizer, processor)
+    batcher.submit(0, "인공지능은", payload_bits, max_length=60, generator=torch.Generator().manual_seed(7))
+    assert torch.equal(batcher.run_until_complete()[0].token_ids, reference_ids)
+
+    metrics = MetricsCollector()
+    messages = ["A", "BC", "가", "XY", "Z"]
+
+    async def scenario():
+        async with WatermarkService(model, tokenizer, max_batch_size=4, metrics=metrics) as service:
+            generations = await asyncio.gather(*(
+                service.generate("안녕", message, max_length=150, seed=i, stop_after_payload=True)
+                for i, message in enumerate(messages)
+            ))
+            detections = await asyncio.gather(*(
+                service.detect(message, token_ids=generation['token_ids'])
+                for message, generation in zip(messages, generations)
+            ))
+
+            server = await serve_http(service, port=0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            body = json.dumps({'message': "BC", 'token_ids': generations[1]['token_ids']}).encode()
+            writer.write(b"POST /detect HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return detections, response
+
+    detections, response = asyncio.run(scenario())
+    for message, detection in zip(messages, detections):
+        assert detection['accuracy'] == 1.0
+        assert detection['recovered_message'] == message
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert json.loads(response.split(b"\r\n\r\n", 1)[1])['recovered_message'] == "BC"
+
+    # Requests shared forward passes (up to max_batch_size rows)
+    batch_rows = metrics.histogram('jamo_generation_batch_rows')
+    assert batch_rows.sum / batch_rows.count > 1.0
+
+
+def test_cpu_inference_profiles_keep_detection_within_tolerance_of_fp32():
+    model, tokenizer = load_tiny_model_and_tokenizer()
+    results = bench_inference_profiles(model, tokenizer, k_bits=2, top_k=20, profiles=('fp32', 'fp32_inference', 'bf16', 'int8'))
+
+    assert results['fp32']['accuracy'] == 1.0
+    assert results['fp32_inference']['max_logprob_diff'] == 0.0
+    for name in ('bf16', 'int8'):
+        assert results[name]['within_tolerance']
+        assert results[name]['model_bytes'] < results['fp32']['model_bytes']
+        assert results[name]['max_logprob_diff'] < 0.5
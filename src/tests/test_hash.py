@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+import torch
+from tokenizers import Tokenizer, models
+from transformers import PreTrainedTokenizerFast
+
+from src.model.tiny_model import load_tiny_model_and_tokenizer
+from src.watermark.hash_policy import HashPolicy, KeyedHashPolicy
+from src.watermark.jamo_utils import get_last_syllable_jamo
+from src.watermark.table_cache import CACHE_DIR_ENV, CACHE_VERSION, ENTRY_PREFIX, clear_table_cache, default_cache_dir
+from src.watermark.vocab_table import JamoVocabTable
+
+
+def test_vocab_table_matches_hash_policy():
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    policies = [HashPolicy(mode=mode, k_bits=2) for mode in ('robustness', 'quality')]
+    policies += [KeyedHashPolicy(mode=mode, k_bits=2, key="secret") for mode in ('robustness', 'quality')]
+    for hash_policy in policies:
+        table = JamoVocabTable(tokenizer, hash_policy)
+
+        for token_id, token_str in enumerate(tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))):
+            jamo_indices = get_last_syllable_jamo(token_str)
+            assert bool(table.hangul_mask[token_id]) == (jamo_indices is not None)
+            if jamo_indices is not None:
+                assert tuple(table.hashes[token_id].tolist()) == hash_policy.calculate_channel_hashes(*jamo_indices)
+
+
+def test_keyed_hash_policy_requires_a_key():
+    for key in ("", b""):
+        with pytest.raises(ValueError):
+            KeyedHashPolicy(mode='robustness', k_bits=2, key=key)
+    with pytest.raises(TypeError):
+        KeyedHashPolicy(mode='robustness', k_bits=2)
+
+
+def test_vocab_table_uses_last_syllable_of_multi_syllable_and_mixed_tokens():
+    # Word-level vocabulary with multi-syllable, mixed-script and non-Hangul tokens
+    tokens = ["</s>", "안녕하세요", "워터마크", "▁학교", "가a", "a힣.", "BPE.", "123", "ㄱㄴ", "깪"]
+    backend = Tokenizer(models.WordLevel(vocab={token: i for i, token in enumerate(tokens)}, unk_token="</s>"))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, eos_token="</s>")
+
+    for mode in ('robustness', 'quality'):
+        hash_policy = HashPolicy(mode=mode, k_bits=3)
+        table = JamoVocabTable(tokenizer, hash_policy)
+        for token_id, token_str in enumerate(tokens):
+            jamo_indices = get_last_syllable_jamo(token_str)
+            assert bool(table.hangul_mask[token_id]) == (jamo_indices is not None)
+            if jamo_indices is not None:
+                assert tuple(table.jamo[token_id].tolist()) == jamo_indices
+                assert tuple(table.hashes[token_id].tolist()) == hash_policy.calculate_channel_hashes(*jamo_indices)
+
+    # '요' (11, 12, 0) for '안녕하세요', Hangul compatibility Jamo ('ㄱㄴ') are not syllables
+    assert tuple(table.jamo[1].tolist()) == (11, 12, 0)
+    assert not table.hangul_mask[tokens.index("ㄱㄴ")]
+    assert not table.is_match(tokens.index("BPE."), 0, 1)
+
+def test_vocab_table_disk_cache_round_trip_and_invalidation(tmp_path):
+    _, tokenizer = load_tiny_model_and_tokenizer()
+    hash_policy = HashPolicy(mode='robustness', k_bits=2)
+    cache_dir = tmp_path / 'tables'
+    # Entry left behind by an older (unprefixed) cache version, next to files that are not entries
+    stale_entry = cache_dir / f"{'0' * 32}-robustness-k2-v1"
+    stale_entry.mkdir(parents=True)
+    (stale_entry / 'meta.json').write_text('{}')
+    user_files = [f"{'f' * 32}-notes-v1", 'results-v2']
+    for name in user_files:
+        (cache_dir / name).mkdir()
+
+    def entries():
+        return sorted(name for name in os.listdir(cache_dir) if name not in user_files)
+
+    built = JamoVocabTable(tokenizer, hash_policy, cache_dir=str(cache_dir))
+    (entry,) = entries()
+    assert entry.startswith(ENTRY_PREFIX) and entry.endswith(f'-v{CACHE_VERSION}')
+    loaded = JamoVocabTable(tokenizer, hash_policy, cache_dir=str(cache_dir))
+    assert torch.equal(built.hashes, loaded.hashes)
+    assert torch.equal(built.hangul_mask, loaded.hangul_mask)
+
+    # An entry with mismatching metadata is rebuilt instead of being trusted
+    meta_path = cache_dir / entry / 'meta.json'
+    meta = json.loads(meta_path.read_text())
+    meta['version'] = -1
+    meta_path.write_text(json.dumps(meta))
+    rebuilt = JamoVocabTable(tokenizer, hash_policy, cache_dir=str(cache_dir))
+    assert torch.equal(built.hashes, rebuilt.hashes)
+    assert json.loads(meta_path.read_text())['version'] != -1
+
+    # Keyed hashes are recomputed in memory: the cache only holds the Jamo decomposition
+    keyed_policy = KeyedHashPolicy(mode='robustness', k_bits=2, key="secret")
+    keyed = JamoVocabTable(tokenizer, keyed_policy, cache_dir=str(cache_dir))
+    assert entries() == [entry]
+    assert sorted(os.listdir(cache_dir / entry)) == ['hangul_mask.npy', 'jamo.npy', 'meta.json', 'syllables.npy']
+    assert torch.equal(keyed.hashes, JamoVocabTable(tokenizer, keyed_policy).hashes)
+
+    # Clearing removes the tables only, never the directory or anything else in it
+    clear_table_cache(str(cache_dir))
+    assert sorted(os.listdir(cache_dir)) == sorted(user_files)
+
+
+def test_vocab_table_disk_cache_is_opt_in(monkeypatch):
+    monkeypatch.delenv(CACHE_DIR_ENV)
+    assert default_cache_dir() is None
+    monkeypatch.setenv(CACHE_DIR_ENV, '')
+    assert default_cache_dir() is None
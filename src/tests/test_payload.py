@@ -0,0 +1,31 @@
+import pytest
+
+from src.watermark.payload_mgr import PackedPayload, PayloadManager
+from src.watermark.scoring import payload_to_symbols, symbols_to_bits
+
+
+@pytest.mark.parametrize("k_bits", [1, 2, 3, 5, 8])
+def test_packed_symbols_match_the_bit_string_path(k_bits):
+    payload_mgr = PayloadManager()
+    for message in ("A", "AB", "Read Me If You Can", "워터마크 abc"):
+        payload_bits = payload_mgr.encode(message)
+        packed = payload_mgr.encode_packed(message, k_bits=k_bits)
+
+        assert packed.bits == payload_bits
+        assert packed.symbols.tolist() == payload_to_symbols(payload_bits, k_bits)
+        assert symbols_to_bits(packed.symbols, k_bits, len(packed)) == payload_bits
+
+        # Every prefix of matched symbols decodes like the bit string of the same steps
+        for num_steps in range(packed.num_symbols + 1):
+            symbols = packed.symbols[:num_steps]
+            expected = payload_mgr.decode(payload_bits[:num_steps * k_bits])
+            assert payload_mgr.decode_symbols(symbols, len(packed), k_bits=k_bits) == expected
+            assert payload_mgr.decode(symbols_to_bits(symbols, k_bits, len(packed))) == expected
+        assert payload_mgr.decode_symbols(packed.symbols, len(packed), k_bits=k_bits) == message
+        assert payload_mgr.decode(packed) == message
+
+
+def test_from_symbols_rejects_symbols_past_the_payload():
+    packed = PayloadManager().encode_packed("A", k_bits=3)
+    with pytest.raises(ValueError):
+        PackedPayload.from_symbols(list(packed.symbols) + [0], len(packed), k_bits=3)
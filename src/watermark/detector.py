@@ -1,108 +1,439 @@
+import time
+
+import numpy as np
 import torch
-import math
 from transformers import PreTrainedTokenizer
-from .jamo_utils import get_last_syllable_jamo
-from .hash_policy import HashPolicy
+from .hash_policy import NO_CONTEXT, HashPolicy
+from .vocab_table import get_vocab_table
+from .payload_mgr import PayloadManager, PackedPayload
+from .scoring import calibrated_z_score, code_match_rates, compute_detection_scores, compute_alignment_scores, greedy_sync_many, hash_code_counts, hash_match_rates, payload_to_symbols, symbols_to_bits
+from .table_store import save_detection_table
+from .metrics import NULL_METRICS, NullMetrics
+from .schedule import DEFAULT_SCHEDULE, EmbeddingSchedule
 
 class JamoWatermarkDetector:
     """
     Detects and extracts a watermark from text generated by JamoWatermarkProcessor.
     """
-    def __init__(self, tokenizer: PreTrainedTokenizer, original_message: str, mode: str = 'robustness', k_bits: int = 2):
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        original_message: str,
+        mode: str = 'robustness',
+        k_bits: int = 2,
+        metrics: NullMetrics | None = None,
+        schedule: EmbeddingSchedule | None = None,
+        hash_policy: HashPolicy | None = None
+    ):
+        # The hash policy used at generation (e.g. KeyedHashPolicy) overrides mode and k_bits
+        if hash_policy is not None:
+            mode, k_bits = hash_policy.mode, hash_policy.k_bits
         self.tokenizer = tokenizer
         self.mode = mode
         self.k_bits = k_bits
         #self.step_t = 0
         # The detector must know the payload to check if the extracted bits match the target.
-        byte_data = original_message.encode('utf-8')
-        self.payload = ''.join(format(byte, '08b') for byte in byte_data)
-        self.hash_policy = HashPolicy(mode=self.mode, k_bits=self.k_bits)
+        # Target symbols are precomputed once in the packed payload.
+        self.packed_payload = PayloadManager().encode_packed(original_message, k_bits=self.k_bits)
+        self.payload = self.packed_payload.bits
+        self.hash_policy = hash_policy if hash_policy is not None else HashPolicy(mode=self.mode, k_bits=self.k_bits)
+        # Per-token channel hashes for the whole vocabulary, and the special-token mask
+        # (tokenizer.all_special_ids rebuilds a list on every access)
+        self.vocab_table = get_vocab_table(self.tokenizer, self.hash_policy)
+        self._special_mask = torch.zeros(self.vocab_table.vocab_size, dtype=torch.bool)
+        special_ids = [i for i in self.tokenizer.all_special_ids if 0 <= i < self.vocab_table.vocab_size]
+        self._special_mask[special_ids] = True
+        # Instrumentation sink (see metrics.py); no-op by default
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        # Channel schedule; must be the one used by the processor (see schedule.py)
+        self.schedule = schedule if schedule is not None else DEFAULT_SCHEDULE
 
-    def _extract_bits_from_token(self, token_str: str) -> int | None:
+    def detection_hashes(self) -> torch.Tensor:
         """
-        Extracts the embedded bits from a single token based on the current step.
+        [vocab_size, 3] channel hashes with -1 rows for tokens that never match (non-Hangul, special).
+        With a context-dependent policy, these are the hashes before the context mask.
         """
-        # 1. Decompose the last syllable of the token into Jamo indices
-        jamo_indices = get_last_syllable_jamo(token_str)
-        
-        # If the token has no Hangul syllable, it couldn't have been watermarked.
-        if jamo_indices is None:
-            return None
+        hashes = self.vocab_table.hashes.clone()
+        hashes[~self.vocab_table.hangul_mask | self._special_mask] = -1
+        return hashes
 
-        # 2. Select the channel (Choseong, Jungseong, Jongseong) based on the current step
-        # This must follow the same round-robin logic as the processor.
-        channel_idx = self.step_t % 3
+    def export_detection_table(self, path: str):
+        """
+        Writes the vocabulary hash table and special-token set of this detector's tokenizer
+        for JamoTableDetector (torch/transformers-free detection, see table_store.py).
+        """
+        special_ids = self._special_mask.nonzero(as_tuple=True)[0].tolist()
+        save_detection_table(
+            path, self.detection_hashes().numpy(), self.mode, self.k_bits, special_ids,
+            syllables=self.vocab_table.syllables.numpy(), policy_id=self.hash_policy.policy_id,
+        )
 
-        # 3. Calculate the hashes for all three channels
-        token_hashes = self.hash_policy.calculate_channel_hashes(*jamo_indices)
+    def _valid_tokens(self, token_ids: torch.LongTensor) -> torch.BoolTensor:
+        """
+        Mask of the tokens that can carry a watermark (in-vocabulary Hangul tokens that are not special).
+        """
+        table = self.vocab_table
+        in_vocab = (token_ids >= 0) & (token_ids < table.vocab_size)
+        safe_ids = torch.where(in_vocab, token_ids, torch.zeros_like(token_ids))
+        return in_vocab & table.hangul_mask[safe_ids] & ~self._special_mask[safe_ids]
 
-        # 4. The extracted bits are the hash value of the selected channel
-        extracted_bits = token_hashes[channel_idx]
-        
-        return extracted_bits
+    def _channel_hashes(self, token_ids: torch.LongTensor, context: int = NO_CONTEXT) -> torch.Tensor:
+        """
+        [num_hangul_tokens, 3] channel hashes of a 1-D sequence of token ids, skipping special,
+        non-Hangul and out-of-vocabulary tokens. `context` is the syllable of the Hangul token
+        before the sequence (context-dependent policies only).
+        """
+        token_ids = torch.as_tensor(token_ids, dtype=torch.long).reshape(1, -1).cpu()
+        valid = self._valid_tokens(token_ids)
+        return self.vocab_table.contextual_hashes(token_ids, valid, context)[valid]
 
-    def extract_payload(self, input_ids: torch.LongTensor, target_payload: str) -> tuple[float, str]:
+    def extract_payload_aligned(self, input_ids: torch.LongTensor, target_payload: str | PackedPayload | None = None) -> tuple[float, int, float]:
         """
-        Extracts the full watermark payload from a sequence of token IDs.
+        Alignment-based detection, robust to inserted and deleted tokens (see scoring.aligned_matches).
+
+        Returns:
+            accuracy (aligned steps / payload steps), number of aligned steps, and the z-score of
+            the alignment against its distribution on unwatermarked text (scoring.compute_alignment_scores).
         """
-        extracted_payload = ""
+        if target_payload is None:
+            target_payload = self.packed_payload
+        targets = payload_to_symbols(target_payload, self.k_bits)
 
-        self.step_t = 0 # Reset step counter for each new text
-        detected_cnt = 0
-        total_steps = 0
+        channels = self.schedule.channels(targets, self.hash_policy)
+
+        channel_hashes = self._channel_hashes(input_ids[0] if input_ids.dim() > 1 else input_ids).numpy()
+        return compute_alignment_scores(channel_hashes, targets, self.k_bits, channels)
+
+    def extract_payload_per_token(self, input_ids: torch.LongTensor, target_payload: str | PackedPayload | None = None) -> tuple[float, int, float]:
+        """
+        Greedy detection scored per Hangul token checked (as JamoStreamingDetector.running_z_score).
+
+        extract_payload() scores the matches out of the payload steps, which saturates once the text
+        is a few times longer than the payload; this z-score stays calibrated on unwatermarked text.
+        Each checked token's chance of matching its step is the frequency of that step's (channel,
+        target) hash in the text itself (scoring.calibrated_z_score), not 1 / 2**k_bits.
+
+        Returns:
+            accuracy (matched steps / payload steps), number of Hangul tokens checked, and the z-score.
+        """
+        if target_payload is None:
+            target_payload = self.packed_payload
+        targets = payload_to_symbols(target_payload, self.k_bits)
+        channels = self.schedule.channels(targets, self.hash_policy)
+
+        channel_hashes = self._channel_hashes(input_ids[0] if input_ids.dim() > 1 else input_ids).numpy()
+        detected, checked, code_trials = greedy_sync_many(channel_hashes, [targets], self.k_bits, [channels])
+        detected_cnt, num_checked = int(detected[0]), int(checked[0])
+
+        accuracy, _ = compute_detection_scores(detected_cnt, len(target_payload) // self.k_bits, self.k_bits)
+        z_score = calibrated_z_score(detected_cnt, code_trials[0], hash_match_rates(channel_hashes, self.k_bits))
+        return accuracy, num_checked, z_score
+
+    def extract_payload(self, input_ids: torch.LongTensor, target_payload: str | PackedPayload | None = None) -> tuple[float, str, float]:
+        """
+        Extracts the full watermark payload from a sequence of token IDs.
+
+        Args:
+            target_payload: Bit-string or packed payload to look for (default: `original_message`).
+        """
+        if self.metrics.enabled:
+            start = time.perf_counter()
+        if target_payload is None:
+            target_payload = self.packed_payload
 
         # Decode the entire sequence once, then split into tokens (re-tokenization; note_251107)
-        token_ids = input_ids[0].tolist()
+        token_ids = input_ids[0].reshape(1, -1)
 
-        for token_id in token_ids:
+        # Get the target bits that should have been embedded at each step
+        targets = payload_to_symbols(target_payload, self.k_bits)
 
-            if self.step_t * self.k_bits >= len(target_payload):
-                break
+        detected_cnt = int(self._greedy_sync(token_ids, [targets])[0])
+        self.step_t = detected_cnt
 
-            # Skip special tokens like BOS/EOS
-            if token_id in self.tokenizer.all_special_ids:
-                continue
-            
-            # Use convert_ids_to_tokens to get the raw token string,
-            # which prevents re-tokenization issues (e.g., ' 인' -> '인').
-            # This ensures consistency with the generation process.
-            token_str = self.tokenizer.convert_ids_to_tokens(token_id)
-            extracted_bits = self._extract_bits_from_token(token_str)
-
-            # This is the core synchronization logic for the detector.
-            if extracted_bits is not None: # If the token contains a Hangul syllable
-                # Get the target bits that should have been embedded at this step
-                target_bits = int(self.payload[self.step_t * self.k_bits : (self.step_t + 1) * self.k_bits], 2)
-
-                # Check if the extracted bits match the target bits
-                if extracted_bits == target_bits:
-                    # This token was successfully watermarked. Append the bits and advance the step.
-                    binary_representation = format(extracted_bits, f'0{self.k_bits}b')
-                    extracted_payload += binary_representation
-                    self.step_t += 1
-                    detected_cnt += 1
-                else:
-                    # If it does not match, step_t remains the same,
-                    # and we will check the next token against the same target_bits.
-                    total_steps += 1
-                    pass
+        # Every matched step contributes its target bits to the extracted payload
+        extracted_payload = symbols_to_bits(targets[:detected_cnt], self.k_bits, len(target_payload))
         total_steps = len(target_payload) // self.k_bits
-        
-        if total_steps > 0:
-            accuracy = detected_cnt / total_steps
-            
-            # Z-Score Calculation
-            p0 = 1.0 / (2 ** self.k_bits)
-            n = total_steps
-            expected_matches = n * p0
-            std_dev = math.sqrt(n * p0 * (1 - p0))
-            
-            if std_dev > 0:
-                z_score = (detected_cnt - expected_matches) / std_dev
-            else:
-                z_score = 0.0
-        else:
-            accuracy = 0.0
-            z_score = 0.0
-        
-        return accuracy, extracted_payload, z_score
\ No newline at end of file
+
+        accuracy, z_score = compute_detection_scores(detected_cnt, total_steps, self.k_bits)
+        if self.metrics.enabled:
+            self._record_detection(time.perf_counter() - start, 1, token_ids.numel())
+        return accuracy, extracted_payload, z_score
+
+    def _record_detection(self, elapsed: float, num_documents: int, num_tokens: int):
+        self.metrics.observe('jamo_detection_seconds', elapsed)
+        self.metrics.inc('jamo_detection_documents_total', num_documents)
+        self.metrics.inc('jamo_detection_tokens_total', num_tokens)
+
+    def extract_payload_batch(
+        self,
+        input_ids: torch.LongTensor | list[list[int]],
+        target_payloads: str | PackedPayload | list[str | PackedPayload] | None = None
+    ) -> list[tuple[float, str, float]]:
+        """
+        Runs extract_payload() over many sequences at once.
+
+        Args:
+            input_ids: A [batch, seq_len] tensor (padding with pad/special ids or -1 is ignored)
+                or a list of token id sequences of arbitrary lengths.
+            target_payloads: Bit-string payload shared by every row, one payload per row,
+                or None to use the payload of `original_message`.
+
+        Returns:
+            One (accuracy, extracted_payload, z_score) tuple per row.
+        """
+        if self.metrics.enabled:
+            start = time.perf_counter()
+
+        if not isinstance(input_ids, torch.Tensor):
+            max_len = max((len(ids) for ids in input_ids), default=0)
+            padded = torch.full((len(input_ids), max_len), -1, dtype=torch.long)
+            for row, ids in enumerate(input_ids):
+                padded[row, :len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+            input_ids = padded
+        batch_size = input_ids.size(0)
+
+        if target_payloads is None:
+            target_payloads = self.packed_payload
+        if isinstance(target_payloads, (str, PackedPayload)):
+            target_payloads = [target_payloads] * batch_size
+        if len(target_payloads) != batch_size:
+            raise ValueError(f"Expected {batch_size} payloads, got {len(target_payloads)}")
+
+        targets = [payload_to_symbols(payload, self.k_bits) for payload in target_payloads]
+        detected = self._greedy_sync(input_ids, targets).tolist()
+
+        results = []
+        for row_targets, payload, detected_cnt in zip(targets, target_payloads, detected):
+            extracted_payload = symbols_to_bits(row_targets[:detected_cnt], self.k_bits, len(payload))
+            accuracy, z_score = compute_detection_scores(detected_cnt, len(payload) // self.k_bits, self.k_bits)
+            results.append((accuracy, extracted_payload, z_score))
+
+        if self.metrics.enabled:
+            self._record_detection(time.perf_counter() - start, batch_size, int((input_ids >= 0).sum()))
+        return results
+
+    def _greedy_sync(self, token_ids: torch.LongTensor, targets: list[list[int]]) -> torch.LongTensor:
+        """
+        Vectorized "advance only on match" synchronization over a [batch, seq_len] tensor of token ids.
+
+        Step s of a row is found at the first token after the previous match whose hash on the
+        step's scheduled channel equals targets[s]. Instead of visiting every token, a next-occurrence table
+        next_pos[row, (channel, value), i] (the first position >= i carrying that channel value) is
+        built with one reverse cummin, so each step becomes a single gather over the batch.
+
+        Returns:
+            [batch] number of matched steps (detected_cnt) per row.
+        """
+        batch_size, seq_len = token_ids.shape
+        num_values = 2 ** self.k_bits
+        num_codes = 3 * num_values
+        max_steps = max((len(row_targets) for row_targets in targets), default=0)
+        if batch_size == 0 or seq_len == 0 or max_steps == 0:
+            return torch.zeros(batch_size, dtype=torch.long)
+
+        # Per-token hashes from the precomputed vocabulary table; special tokens and padding never match
+        token_ids = token_ids.cpu()
+        valid = self._valid_tokens(token_ids)
+        codes = self.vocab_table.contextual_hashes(token_ids, valid) + torch.arange(3) * num_values   # [batch, seq_len, 3]
+
+        # next_pos[b, code, i]: first position >= i where code occurs (seq_len if none)
+        occurs = torch.zeros((batch_size, num_codes, seq_len), dtype=torch.bool)
+        occurs.scatter_(1, codes.transpose(1, 2), valid.unsqueeze(1).expand(-1, 3, -1))
+        positions = torch.arange(seq_len, dtype=torch.int32).expand(batch_size, num_codes, seq_len)
+        occurrence_pos = torch.where(occurs, positions, torch.full_like(positions, seq_len))
+        next_pos = occurrence_pos.flip(-1).cummin(dim=-1).values.flip(-1)
+        next_pos = torch.cat([next_pos, torch.full((batch_size, num_codes, 1), seq_len, dtype=torch.int32)], dim=-1)
+
+        target_table = torch.full((batch_size, max_steps), -1, dtype=torch.long)
+        channel_table = torch.zeros((batch_size, max_steps), dtype=torch.long)
+        for row, row_targets in enumerate(targets):
+            target_table[row, :len(row_targets)] = torch.tensor(row_targets, dtype=torch.long)
+            channel_table[row, :len(row_targets)] = torch.tensor(self.schedule.channels(row_targets, self.hash_policy), dtype=torch.long)
+
+        rows = torch.arange(batch_size)
+        search_from = torch.zeros(batch_size, dtype=torch.long)
+        detected_cnt = torch.zeros(batch_size, dtype=torch.long)
+        for step in range(max_steps):
+            step_targets = target_table[:, step]
+            code = channel_table[:, step] * num_values + step_targets.clamp(min=0)
+            found = next_pos[rows, code, search_from].long()
+
+            matched = (step_targets >= 0) & (found < seq_len)
+            if not matched.any():
+                break
+            detected_cnt += matched.long()
+            # A row that misses a step can never advance again (the step does not change)
+            search_from = torch.where(matched, found + 1, torch.full_like(found, seq_len))
+
+        return detected_cnt
+
+
+
+class JamoStreamingDetector(JamoWatermarkDetector):
+    """
+    Incremental JamoWatermarkDetector for token streams.
+
+    feed() applies the same "advance only on match" rule as extract_payload() to each new chunk
+    of token ids, keeping only counters (O(1) memory, earlier tokens are never re-scanned).
+    Once enough Hangul tokens have been checked, the running z-score can settle the decision
+    early in either direction.
+    """
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        original_message: str,
+        mode: str = 'robustness',
+        k_bits: int = 2,
+        z_threshold: float = 4.0,
+        clear_threshold: float = 0.0,
+        min_trials: int = 24,
+        schedule: EmbeddingSchedule | None = None,
+        hash_policy: HashPolicy | None = None
+    ):
+        """
+        Args:
+            z_threshold (float): Flag the stream as watermarked once the running z-score reaches this value.
+            clear_threshold (float): Clear the stream once the running z-score drops to this value or below.
+            min_trials (int): Number of checked Hangul tokens required before an early decision.
+        """
+        super().__init__(tokenizer, original_message, mode=mode, k_bits=k_bits, schedule=schedule, hash_policy=hash_policy)
+        self.z_threshold = z_threshold
+        self.clear_threshold = clear_threshold
+        self.min_trials = min_trials
+        self._targets = self.packed_payload.symbols.tolist()
+        self._channels = self.schedule.channels(self._targets, self.hash_policy)
+        self._codes = [channel * 2 ** self.k_bits + target for channel, target in zip(self._channels, self._targets)]
+        self.reset()
+
+    def reset(self):
+        """
+        Starts a new stream.
+        """
+        self.step_t = 0          # Number of matched steps (== detected count)
+        self.trials = 0          # Hangul tokens checked against a target so far
+        self.num_tokens = 0      # Tokens fed so far
+        self.decision = None     # None, 'watermarked' or 'clean'
+        self._context = NO_CONTEXT  # Syllable of the last Hangul token fed (context-dependent policies)
+        self._code_counts = np.zeros(3 * 2 ** self.k_bits, dtype=np.int64)  # Hangul tokens fed per (channel, value)
+        self._code_trials = np.zeros(3 * 2 ** self.k_bits, dtype=np.int64)  # Checked tokens per step (channel, target)
+        self._match_rates = code_match_rates(self._code_counts)
+
+    @property
+    def accuracy(self) -> float:
+        return compute_detection_scores(self.step_t, len(self.payload) // self.k_bits, self.k_bits)[0]
+
+    @property
+    def z_score(self) -> float:
+        """
+        z-score over the whole payload, identical to extract_payload() on the tokens fed so far.
+        """
+        return compute_detection_scores(self.step_t, len(self.payload) // self.k_bits, self.k_bits)[1]
+
+    @property
+    def running_z_score(self) -> float:
+        """
+        z-score of the matches among the Hangul tokens checked so far, against the hash frequencies
+        of the Hangul tokens fed so far (as extract_payload_per_token() on the same tokens).
+        """
+        return calibrated_z_score(self.step_t, self._code_trials, self._match_rates)
+
+    @property
+    def extracted_payload(self) -> str:
+        return symbols_to_bits(self._targets[:self.step_t], self.k_bits, len(self.payload))
+
+    def feed(self, token_ids: torch.LongTensor | list[int]) -> str | None:
+        """
+        Consumes the next chunk of token ids.
+
+        Returns:
+            The decision so far: 'watermarked', 'clean', or None while undecided.
+            Once a decision is made, further tokens are ignored until reset().
+        """
+        if self.decision is not None:
+            return self.decision
+
+        token_ids = torch.as_tensor(token_ids, dtype=torch.long).reshape(-1).cpu()
+        self.num_tokens += token_ids.numel()
+
+        # Hash lookups for the whole chunk at once; only plain ints enter the loop below
+        chunk_hashes = self._channel_hashes(token_ids, self._context)
+        self._code_counts += hash_code_counts(chunk_hashes.numpy(), self.k_bits)
+        self._match_rates = code_match_rates(self._code_counts)
+        chunk_hashes = chunk_hashes.tolist()
+        valid_ids = token_ids[self._valid_tokens(token_ids)]
+        if valid_ids.numel():
+            self._context = int(self.vocab_table.syllables[valid_ids[-1]])
+
+        num_steps = len(self._targets)
+        for token_hashes in chunk_hashes:
+            if self.step_t >= num_steps:
+                break
+
+            self.trials += 1
+            self._code_trials[self._codes[self.step_t]] += 1
+            if token_hashes[self._channels[self.step_t]] == self._targets[self.step_t]:
+                self.step_t += 1
+
+            if self.trials >= self.min_trials:
+                running_z = self.running_z_score
+                if running_z >= self.z_threshold:
+                    self.decision = 'watermarked'
+                elif running_z <= self.clear_threshold:
+                    self.decision = 'clean'
+                if self.decision is not None:
+                    break
+
+        return self.decision
+
+
+class JamoMultiPayloadDetector(JamoWatermarkDetector):
+    """
+    Attributes a text to one of many candidate messages (e.g. one per tenant) in a single pass.
+
+    The text is decomposed once; the greedy synchronization of every candidate payload then runs
+    together over the shared next-occurrence table (scoring.greedy_sync_many), so the cost grows
+    with text length plus the number of candidates rather than their product.
+
+    Greedy synchronization finds every step of any payload in a long enough text, so candidates
+    are ranked by the z-score of their matches per Hangul token checked (as
+    JamoStreamingDetector.running_z_score), not per payload step. Each candidate is scored against
+    the text's frequencies of its own (channel, target) hashes, so a payload of common hash
+    values does not outrank the embedded one just by matching more often.
+    """
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        candidate_messages: list[str],
+        mode: str = 'robustness',
+        k_bits: int = 2,
+        schedule: EmbeddingSchedule | None = None,
+        hash_policy: HashPolicy | None = None
+    ):
+        super().__init__(tokenizer, original_message='', mode=mode, k_bits=k_bits, schedule=schedule, hash_policy=hash_policy)
+        self.candidate_messages = list(candidate_messages)
+        payload_mgr = PayloadManager()
+        self.candidate_payloads = [payload_mgr.encode_packed(message, k_bits=self.k_bits) for message in self.candidate_messages]
+        self._candidate_targets = [payload.symbols.tolist() for payload in self.candidate_payloads]
+        self._candidate_channels = [self.schedule.channels(targets, self.hash_policy) for targets in self._candidate_targets]
+
+    def rank_payloads(self, input_ids: torch.LongTensor) -> list[tuple[str, float, float]]:
+        """
+        Scores every candidate message against one sequence of token ids.
+
+        Returns:
+            (message, accuracy, z_score) per candidate, sorted by decreasing z-score. The z-score
+            compares the matched steps with the chance matches of the Hangul tokens checked.
+        """
+        channel_hashes = self._channel_hashes(input_ids).numpy()
+
+        detected, _, code_trials = greedy_sync_many(channel_hashes, self._candidate_targets, self.k_bits, self._candidate_channels)
+        z_scores = calibrated_z_score(detected, code_trials, hash_match_rates(channel_hashes, self.k_bits))
+
+        ranking = []
+        for message, payload, detected_cnt, z_score in zip(
+            self.candidate_messages, self.candidate_payloads, detected.tolist(), z_scores.tolist()
+        ):
+            accuracy, _ = compute_detection_scores(detected_cnt, len(payload) // self.k_bits, self.k_bits)
+            ranking.append((message, accuracy, z_score))
+        ranking.sort(key=lambda item: item[2], reverse=True)
+        return ranking
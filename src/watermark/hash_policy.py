@@ -1,7 +1,55 @@
+import hashlib
+import numpy as np
+
+# Jamo hash policies.
+#
+# A policy maps the Jamo indices (x, y, z) of a syllable to one k_bits hash per channel. It is
+# compiled once into per-channel lookup lists (channel_maps), from which syllable_table.py builds the
+# dense [11172, 3] syllable table and vocab_table.py the [vocab_size, 3] token table; generation and
+# detection only ever do table lookups, so a keyed policy costs the same as the plain modulo.
+#
+# * HashPolicy: the original modulo hash (x % 2**k_bits, ...; Choseong is 0 in 'quality' mode).
+# * KeyedHashPolicy: per-channel mappings drawn by a PRF (keyed BLAKE2b) of the secret key, plus an
+#   optional context mask: the hash of a token is XORed with a keyed mask of the previous Hangul
+#   token's last syllable (context_masks, indexed by syllable, NO_CONTEXT for the first token).
+#   Without the key, the hash of a token is unpredictable even knowing all the Jamo.
+#
+# Keyed mappings are balanced the same way as the modulo (each value is taken by every 2**k_bits-th
+# Jamo in a keyed order), so every channel reaches exactly the values it reaches under the modulo
+# policy and the embedding schedule (schedule.channel_carry_table) is unchanged. Channels that cannot
+# reach every value (or are constant) get no context mask, for the same reason.
+#
+# Tables are cached per policy_id, which identifies the policy without revealing the key.
+#
+# The context is the previous *token*: text-only detection with the word-boundary heuristic cannot
+# reproduce it, so context-dependent policies need token ids or explicit token boundaries there.
+
+CHOSEONG_COUNT = 19
+JUNGSEONG_COUNT = 21
+JONGSEONG_COUNT = 28
+JAMO_COUNTS = (CHOSEONG_COUNT, JUNGSEONG_COUNT, JONGSEONG_COUNT)
+
+# Context index of a token with no Hangul token before it (row 11172 of context_masks)
+NO_CONTEXT = 11172
+
+def prf_key(key: str | bytes) -> bytes:
+    """
+    Fixed-size PRF key, so keys of any length can be used with keyed BLAKE2b.
+    """
+    key = key.encode('utf-8') if isinstance(key, str) else key
+    return hashlib.blake2b(key, digest_size=32).digest()
+
+def keyed_prf(key: bytes, message: bytes) -> int:
+    """
+    64-bit keyed BLAKE2b PRF of `message` under a prf_key(), shared by the keyed hash policy and the
+    keyed embedding schedule.
+    """
+    return int.from_bytes(hashlib.blake2b(message, key=key, digest_size=8).digest(), 'little')
+
 class HashPolicy:
     """
     Defines the policy for calculating Jamo-based hashes.
-    This can be swapper out for different hashing strategies.
+    This can be swapper out for different hashing strategies (override _channel_map()).
     """
     def __init__(self, mode: str = 'robustness', k_bits: int = 2):
         """
@@ -11,15 +59,112 @@ class HashPolicy:
         """
         self.mode = mode
         self.k_bits = k_bits
+        self.mod_val = 2 ** k_bits
+        # Compiled per-channel lookups: channel_maps[channel][jamo index] -> hash
+        self.channel_maps = tuple(self._channel_map(channel, count) for channel, count in enumerate(JAMO_COUNTS))
+
+    @property
+    def policy_id(self) -> str:
+        """
+        Identity of the policy, used in table cache keys.
+        """
+        return f"{self.mode}-k{self.k_bits}"
+
+    @property
+    def uses_context(self) -> bool:
+        return False
+
+    @property
+    def context_masks(self) -> np.ndarray | None:
+        """
+        [11173, 3] XOR mask per previous syllable (row NO_CONTEXT: no previous Hangul token), or None.
+        """
+        return None
+
+    def _channel_map(self, channel: int, count: int) -> list[int]:
+        if channel == 0 and self.mode == 'quality':
+            return [0] * count  # to give more weight to vowels and final consonants
+        return [index % self.mod_val for index in range(count)]
 
     def calculate_channel_hashes(self, x: int, y: int, z: int) -> tuple[int, int, int]:
         """
         Calculates separate hash values for each Jamo channel.
         """
-        mod_val = 2**self.k_bits
-        
-        choseong_hash = 0 if self.mode == 'quality' else x % mod_val  # to give more weight to vowels and final consonants
-        jungseong_hash = y % mod_val
-        jongseong_hash = z % mod_val
+        choseong_map, jungseong_map, jongseong_map = self.channel_maps
+        return (choseong_map[x], jungseong_map[y], jongseong_map[z])
+
+class KeyedHashPolicy(HashPolicy):
+    """
+    Secret-keyed HashPolicy with an optional previous-token context (see module comment).
+    """
+    def __init__(self, mode: str = 'robustness', k_bits: int = 2, *, key: str | bytes, use_context: bool = True):
+        """
+        Args:
+            key (str | bytes): Secret key; generation and detection must use the same one. An empty
+                key is rejected: anyone could rebuild its "secret" mappings.
+            use_context (bool): XOR every hash with a keyed mask of the previous Hangul token's
+                syllable. Text-only detection then needs token boundaries (see module comment).
+        """
+        if not key:
+            raise ValueError("KeyedHashPolicy needs a non-empty key")
+        self._prf_key = prf_key(key)
+        self.use_context = use_context
+        self._context_masks = None
+        self._fingerprint = keyed_prf(self._prf_key, b'policy-id').to_bytes(8, 'little').hex()
+        super().__init__(mode=mode, k_bits=k_bits)
+
+    def _prf(self, *parts: int) -> int:
+        return keyed_prf(self._prf_key, b''.join(part.to_bytes(4, 'little') for part in parts))
 
-        return (choseong_hash, jungseong_hash, jongseong_hash)
\ No newline at end of file
+    @property
+    def policy_id(self) -> str:
+        return f"{self.mode}-k{self.k_bits}-keyed{'-ctx' if self.use_context else ''}-{self._fingerprint}"
+
+    @property
+    def uses_context(self) -> bool:
+        return self.use_context
+
+    def _channel_map(self, channel: int, count: int) -> list[int]:
+        if channel == 0 and self.mode == 'quality':
+            return [0] * count
+        # Keyed order of the Jamo; the r-th Jamo in that order gets r % mod_val (balanced like the modulo)
+        order = sorted(range(count), key=lambda index: self._prf(0, channel, index))
+        mapping = [0] * count
+        for rank, index in enumerate(order):
+            mapping[index] = rank % self.mod_val
+        return mapping
+
+    @property
+    def context_masks(self) -> np.ndarray | None:
+        if not self.use_context:
+            return None
+        if self._context_masks is None:
+            masks = np.zeros((NO_CONTEXT + 1, 3), dtype=np.int64)
+            for channel, count in enumerate(JAMO_COUNTS):
+                if len(set(self.channel_maps[channel])) < self.mod_val:
+                    continue  # Constant or partial channel: keep its reachable values unchanged
+                masks[:NO_CONTEXT, channel] = [self._prf(1, channel, syllable) % self.mod_val for syllable in range(NO_CONTEXT)]
+            self._context_masks = masks
+        return self._context_masks
+
+def apply_context(channel_hashes: np.ndarray, syllables: np.ndarray, context_masks: np.ndarray | None, context: int = NO_CONTEXT) -> tuple[np.ndarray, int]:
+    """
+    Context-dependent hashes of consecutive Hangul tokens.
+
+    Args:
+        channel_hashes: [n, 3] table hashes of the tokens.
+        syllables: [n] last syllable index of every token.
+        context_masks: HashPolicy.context_masks (None: hashes are returned unchanged).
+        context (int): Syllable of the Hangul token before the first one (NO_CONTEXT if none).
+
+    Returns:
+        The [n, 3] hashes and the context of the token following the last one.
+    """
+    if len(syllables):
+        next_context = int(syllables[-1])
+    else:
+        next_context = context
+    if context_masks is None or len(syllables) == 0:
+        return channel_hashes, next_context
+    previous = np.concatenate([[context], np.asarray(syllables[:-1], dtype=np.int64)])
+    return channel_hashes ^ context_masks[previous].astype(channel_hashes.dtype), next_context
@@ -0,0 +1,249 @@
+import io
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, TextIO
+
+import numpy as np
+from .hash_policy import NO_CONTEXT, HashPolicy, apply_context
+from .payload_mgr import PayloadManager, PackedPayload
+from .schedule import DEFAULT_SCHEDULE, EmbeddingSchedule
+from .scoring import cyclic_null_moments, cyclic_sync, frame_symbols
+from .text_detector import JamoTextDetector
+
+# Long-document detection of repeating payloads (generation with repeat_payload=True).
+#
+# The document is consumed as a stream and cut into chunks of `chunk_tokens` Hangul tokens; only the
+# current chunk (plus one small summary per chunk) is held in memory, so multi-megabyte inputs
+# (or memory-mapped token id arrays) are scored in bounded memory.
+#
+# Each chunk starts at an unknown position of the repeating frame (SYNC_MARKER + payload), so
+# scoring.cyclic_sync() synchronizes every phase of the frame at once and keeps the best one, each
+# phase scored against the chunk's own hash frequencies (human Korean text is far from uniform over
+# the hash values). The chunk z-score calibrates that best-phase z-score against its null moments,
+# and the global z-score combines the chunks: sum of chunk z-scores / sqrt(number of chunks).
+# Unwatermarked chunks contribute zero-mean noise, so a watermarked excerpt inside a longer human
+# text still stands out, and chunks whose z-score reaches z_threshold are reported as locations.
+#
+# Chunks are independent, so with workers > 0 they are synchronized in a process pool (with a
+# bounded number of chunks in flight).
+
+DEFAULT_CHUNK_TOKENS = 512
+DEFAULT_PIECE_SIZE = 1 << 16
+
+def _chunk_task(task: tuple[np.ndarray, list[int], int, list[int]]) -> tuple[int, int, float]:
+    channel_hashes, frame, k_bits, channels = task
+    return cyclic_sync(channel_hashes, frame, k_bits, channels)
+
+def iter_text_pieces(stream: TextIO, piece_size: int = DEFAULT_PIECE_SIZE) -> Iterator[tuple[str, int]]:
+    """
+    Reads a text stream in pieces of about `piece_size` characters, cut after whitespace so no
+    word is split across pieces (text without whitespace is cut every 4 * piece_size characters).
+
+    Yields:
+        (piece, character offset of the piece in the stream)
+    """
+    offset = 0
+    pending = ''
+    while True:
+        block = stream.read(piece_size)
+        if not block:
+            break
+        pending += block
+        cut = max(pending.rfind(' '), pending.rfind('\n'))
+        if cut < 0:
+            if len(pending) < 4 * piece_size:
+                continue
+            cut = len(pending) - 1
+        yield pending[:cut + 1], offset
+        offset += cut + 1
+        pending = pending[cut + 1:]
+    if pending:
+        yield pending, offset
+
+class JamoLongDocumentDetector:
+    """
+    Chunked, bounded-memory detection of a repeating payload in arbitrarily long documents
+    (see module comment). Needs neither torch nor transformers.
+    """
+    def __init__(
+        self,
+        original_message: str,
+        mode: str = 'robustness',
+        k_bits: int = 2,
+        schedule: EmbeddingSchedule | None = None,
+        chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+        z_threshold: float = 4.0,
+        hash_policy: HashPolicy | None = None
+    ):
+        """
+        Args:
+            original_message (str): The repeated message.
+            schedule (EmbeddingSchedule | None): Schedule used at generation (default: round robin).
+            chunk_tokens (int): Hangul tokens per chunk.
+            z_threshold (float): Chunk z-score from which a chunk is reported as a location.
+            hash_policy (HashPolicy | None): Policy used at generation; overrides mode and k_bits.
+        """
+        if hash_policy is not None:
+            mode, k_bits = hash_policy.mode, hash_policy.k_bits
+        self.mode = mode
+        self.k_bits = k_bits
+        self.chunk_tokens = chunk_tokens
+        self.z_threshold = z_threshold
+        self.packed_payload: PackedPayload = PayloadManager().encode_packed(original_message, k_bits=self.k_bits)
+        self.hash_policy = hash_policy if hash_policy is not None else HashPolicy(mode=self.mode, k_bits=self.k_bits)
+        self.schedule = schedule if schedule is not None else DEFAULT_SCHEDULE
+        self.frame = frame_symbols(self.packed_payload, self.k_bits)
+        self.frame_channels = self.schedule.channels(self.frame, self.hash_policy)
+
+    def _chunks(self, pieces: Iterable[tuple[np.ndarray, np.ndarray]]) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Regroups (channel hashes, offsets) pieces of any size into chunks of chunk_tokens Hangul tokens.
+        """
+        buffered_hashes, buffered_offsets, num_buffered = [], [], 0
+        for hashes, offsets in pieces:
+            buffered_hashes.append(hashes)
+            buffered_offsets.append(offsets)
+            num_buffered += len(hashes)
+            if num_buffered < self.chunk_tokens:
+                continue
+            hashes, offsets = np.concatenate(buffered_hashes), np.concatenate(buffered_offsets)
+            num_full = len(hashes) // self.chunk_tokens * self.chunk_tokens
+            for start in range(0, num_full, self.chunk_tokens):
+                yield hashes[start:start + self.chunk_tokens], offsets[start:start + self.chunk_tokens]
+            buffered_hashes, buffered_offsets = [hashes[num_full:]], [offsets[num_full:]]
+            num_buffered = len(hashes) - num_full
+        if num_buffered:
+            yield np.concatenate(buffered_hashes), np.concatenate(buffered_offsets)
+
+    def _synchronized_chunks(self, chunks: Iterator[tuple[np.ndarray, np.ndarray]], workers: int):
+        """
+        Yields (chunk hashes, chunk offsets, (phase, matches)) in document order.
+        """
+        if workers <= 0:
+            for hashes, offsets in chunks:
+                yield hashes, offsets, cyclic_sync(hashes, self.frame, self.k_bits, self.frame_channels)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            for hashes, offsets in chunks:
+                task = (hashes, self.frame, self.k_bits, self.frame_channels)
+                in_flight.append((hashes, offsets, executor.submit(_chunk_task, task)))
+                if len(in_flight) >= 4 * workers:
+                    hashes, offsets, future = in_flight.popleft()
+                    yield hashes, offsets, future.result()
+            while in_flight:
+                hashes, offsets, future = in_flight.popleft()
+                yield hashes, offsets, future.result()
+
+    def detect_hashes(self, pieces: Iterable[tuple[np.ndarray, np.ndarray]], workers: int = 0) -> dict:
+        """
+        Scores a stream of Hangul-token channel hashes.
+
+        Args:
+            pieces: (channel hashes [n, 3], offsets [n]) of consecutive Hangul tokens; offsets are the
+                positions reported back (token index, character offset, ...).
+            workers (int): Worker processes (0: synchronize in this process).
+
+        Returns:
+            dict with the global 'z_score', 'num_chunks', 'hangul_tokens', one summary per chunk
+            ('start', 'end', 'hangul_tokens', 'phase', 'matches', 'z_score') and 'locations',
+            the merged [start, end) offset ranges of the chunks with z_score >= z_threshold.
+        """
+        chunks, locations = [], []
+        total_z = 0.0
+        previous_flagged = False
+        for hashes, offsets, (phase, matches, phase_z) in self._synchronized_chunks(self._chunks(pieces), workers):
+            mean, std_dev = cyclic_null_moments(len(hashes), self.frame, self.k_bits, self.frame_channels)
+            z_score = (phase_z - mean) / std_dev if std_dev > 0 else 0.0
+            total_z += z_score
+
+            start, end = int(offsets[0]), int(offsets[-1]) + 1
+            chunks.append({
+                'start': start, 'end': end, 'hangul_tokens': len(hashes),
+                'phase': phase, 'matches': matches, 'z_score': z_score,
+            })
+            # Consecutive flagged chunks are merged into one location
+            flagged = z_score >= self.z_threshold
+            if flagged and previous_flagged:
+                locations[-1][1] = end
+            elif flagged:
+                locations.append([start, end])
+            previous_flagged = flagged
+
+        return {
+            'z_score': total_z / math.sqrt(len(chunks)) if chunks else 0.0,
+            'num_chunks': len(chunks),
+            'hangul_tokens': sum(chunk['hangul_tokens'] for chunk in chunks),
+            'chunks': chunks,
+            'locations': locations,
+        }
+
+    def detect_token_ids(
+        self,
+        token_ids,
+        hashes: np.ndarray,
+        workers: int = 0,
+        piece_size: int = DEFAULT_PIECE_SIZE,
+        syllables: np.ndarray | None = None
+    ) -> dict:
+        """
+        Scores a long sequence of token ids. Offsets in the result are token indices.
+
+        Args:
+            token_ids: 1-D array-like of token ids (e.g. np.load(..., mmap_mode='r')), read in pieces,
+                or an iterable of consecutive 1-D pieces.
+            hashes (np.ndarray): [vocab_size, 3] detection hashes with -1 rows for tokens that never
+                match (JamoTableDetector.hashes, JamoWatermarkDetector.detection_hashes()).
+            syllables (np.ndarray | None): [vocab_size] last syllable index per token (JamoTableDetector.syllables),
+                required by context-dependent hash policies.
+        """
+        hashes = np.asarray(hashes)
+        context_masks = self.hash_policy.context_masks
+        if context_masks is not None and syllables is None:
+            raise ValueError("syllables are required by a context-dependent hash policy")
+        if isinstance(token_ids, (np.ndarray, list, tuple)):
+            id_pieces = (token_ids[start:start + piece_size] for start in range(0, len(token_ids), piece_size))
+        else:
+            id_pieces = token_ids
+
+        def pieces():
+            offset, context = 0, NO_CONTEXT
+            for piece in id_pieces:
+                piece = np.asarray(piece, dtype=np.int64).reshape(-1)
+                positions = np.flatnonzero((piece >= 0) & (piece < len(hashes)))
+                piece_hashes = hashes[piece[positions]]
+                keep = piece_hashes[:, 0] >= 0
+                piece_hashes, positions = piece_hashes[keep], positions[keep]
+                if context_masks is not None:
+                    # The context carries over from the last Hangul token of the previous piece
+                    piece_hashes, context = apply_context(piece_hashes, syllables[piece[positions]], context_masks, context)
+                yield piece_hashes, positions + offset
+                offset += len(piece)
+
+        return self.detect_hashes(pieces(), workers=workers)
+
+    def detect_text(self, text: str | TextIO, workers: int = 0, piece_size: int = DEFAULT_PIECE_SIZE) -> dict:
+        """
+        Scores raw text (a string, or a text stream read in pieces) with the word-boundary heuristic
+        of JamoTextDetector. Offsets in the result are character offsets.
+
+        Not available with a context-dependent hash policy (the heuristic's words are not the
+        generation tokens): use detect_token_ids().
+        """
+        if self.hash_policy.uses_context:
+            raise ValueError("a context-dependent hash policy needs token ids: use detect_token_ids()")
+        text_detector = JamoTextDetector('', hash_policy=self.hash_policy)
+        text_pieces = iter_text_pieces(io.StringIO(text) if isinstance(text, str) else text, piece_size)
+
+        def pieces():
+            context = NO_CONTEXT
+            for piece, offset in text_pieces:
+                syllables, positions = text_detector.token_syllables_with_offsets(piece)
+                piece_hashes, context = apply_context(
+                    text_detector.syllable_hashes[syllables], syllables, self.hash_policy.context_masks, context
+                )
+                yield piece_hashes, positions + offset
+
+        return self.detect_hashes(pieces(), workers=workers)
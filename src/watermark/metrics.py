@@ -0,0 +1,199 @@
+import json
+import math
+from bisect import bisect_left
+
+# Instrumentation for the generation and detection loops.
+#
+# Hot loops receive a metrics object and only call inc()/observe() on it. The default, NULL_METRICS,
+# has enabled=False: callers check that flag before taking timestamps or computing anything, so an
+# uninstrumented run pays a single attribute lookup per step. MetricsCollector aggregates counters
+# and histograms in memory and exports them as JSON or Prometheus text format. Custom sinks
+# (callbacks, StatsD, ...) subclass NullMetrics, set enabled=True and override inc()/observe().
+#
+# Metrics recorded by this package:
+#   jamo_generation_forward_seconds        histogram  model forward pass per decoding step
+#   jamo_generation_bias_seconds           histogram  bias_logits / bias_logits_batch per step
+#   jamo_generation_sampling_seconds       histogram  softmax + multinomial per step
+#   jamo_generation_check_seconds          histogram  check_token_match / check_token_match_batch per step
+#   jamo_generation_batch_rows             histogram  running rows per step (ContinuousBatcher)
+#   jamo_watermark_steps_total             counter    {channel, result=match|mismatch} per watermark step
+#   jamo_watermark_tokens_per_symbol       histogram  {channel} tokens spent until a symbol was embedded
+#   jamo_topk_non_hangul_fraction          histogram  share of the biasing candidates without Hangul
+#   jamo_detection_seconds                 histogram  extract_payload / extract_payload_batch calls
+#   jamo_detection_documents_total         counter    documents scored
+#   jamo_detection_tokens_total            counter    tokens scored
+
+CHANNEL_NAMES = ('choseong', 'jungseong', 'jongseong')
+
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+FRACTION_BUCKETS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100)
+
+def default_buckets(name: str) -> tuple[float, ...]:
+    """
+    Bucket upper bounds for a histogram, chosen from its name suffix.
+    """
+    if name.endswith('_seconds'):
+        return LATENCY_BUCKETS
+    if name.endswith('_fraction'):
+        return FRACTION_BUCKETS
+    return COUNT_BUCKETS
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus semantics: a value v falls in the first bucket with v <= le).
+    """
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # Last slot: +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> list[tuple[float, int]]:
+        """
+        (upper bound, number of observations <= upper bound) pairs, ending with (inf, count).
+        """
+        result, total = [], 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), self.bucket_counts):
+            total += bucket_count
+            result.append((bound, total))
+        return result
+
+class NullMetrics:
+    """
+    No-op metrics sink, the default of every instrumented component.
+    """
+    enabled = False
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        pass
+
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+def _label_key(labels: dict) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(label_key: tuple[tuple[str, str], ...]) -> str:
+    if not label_key:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in label_key)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(label_key, escaped)) + '}'
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class MetricsCollector(NullMetrics):
+    """
+    In-memory counters and histograms, keyed by metric name and label set.
+    """
+    enabled = True
+
+    def __init__(self, buckets: dict[str, tuple[float, ...]] | None = None):
+        """
+        Args:
+            buckets (dict | None): Histogram bucket bounds per metric name, overriding default_buckets().
+        """
+        self.buckets = dict(buckets or {})
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        series = self.counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = _label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.buckets.get(name) or default_buckets(name))
+        histogram.observe(value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self.counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        return self.histograms.get(name, {}).get(_label_key(labels))
+
+    def channel_match_rates(self) -> dict[str, float]:
+        """
+        Fraction of watermark steps whose sampled token matched the target, per channel.
+        """
+        rates = {}
+        for channel in CHANNEL_NAMES:
+            matches = self.counter_value('jamo_watermark_steps_total', channel=channel, result='match')
+            mismatches = self.counter_value('jamo_watermark_steps_total', channel=channel, result='mismatch')
+            if matches + mismatches:
+                rates[channel] = matches / (matches + mismatches)
+        return rates
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def to_dict(self) -> dict:
+        counters = {
+            name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+            for name, series in self.counters.items()
+        }
+        histograms = {
+            name: [
+                {
+                    'labels': dict(key),
+                    'buckets': [['+Inf' if bound == math.inf else bound, total] for bound, total in histogram.cumulative_counts()],
+                    'sum': histogram.sum,
+                    'count': histogram.count,
+                }
+                for key, histogram in series.items()
+            ]
+            for name, series in self.histograms.items()
+        }
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self, **json_kwargs) -> str:
+        return json.dumps(self.to_dict(), **json_kwargs)
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        for name in sorted(self.counters):
+            lines.append(f'# TYPE {name} counter')
+            for key, value in sorted(self.counters[name].items()):
+                lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+
+        for name in sorted(self.histograms):
+            lines.append(f'# TYPE {name} histogram')
+            for key, histogram in sorted(self.histograms[name].items()):
+                for bound, total in histogram.cumulative_counts():
+                    bucket_key = key + (('le', _format_value(bound)),)
+                    lines.append(f'{name}_bucket{_format_labels(bucket_key)} {total}')
+                lines.append(f'{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}')
+                lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+def record_watermark_step(metrics: NullMetrics, channel_idx: int, matched: bool, tokens_spent: int):
+    """
+    Records the outcome of one watermark step.
+
+    Args:
+        channel_idx (int): Channel of the step's target.
+        matched (bool): Whether the sampled token carried the target bits.
+        tokens_spent (int): Tokens sampled for the current symbol so far, including this one.
+    """
+    channel = CHANNEL_NAMES[channel_idx]
+    metrics.inc('jamo_watermark_steps_total', channel=channel, result='match' if matched else 'mismatch')
+    if matched:
+        metrics.observe('jamo_watermark_tokens_per_symbol', tokens_spent, channel=channel)
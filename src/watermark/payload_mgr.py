@@ -1,3 +1,74 @@
+import numpy as np
+
+class PackedPayload:
+    """
+    Bit-packed watermark payload.
+
+    Holds the payload bytes as a NumPy uint8 array together with every k-bit target symbol, computed
+    once, so the generation and detection loops index arrays instead of slicing bit strings and calling
+    int(..., 2) at every step (the channel of each step comes from the EmbeddingSchedule).
+    len() is the number of payload bits, as for the bit-string payload.
+    """
+    def __init__(self, data: bytes, k_bits: int = 2):
+        self.data = np.frombuffer(bytes(data), dtype=np.uint8)
+        self.k_bits = k_bits
+        self.num_bits = 8 * len(self.data)
+
+        # k-bit symbols, MSB first; a trailing partial symbol keeps only its remaining bits
+        # (same value as int(bits[i : i + k_bits], 2) on the bit string)
+        bits = np.unpackbits(self.data).astype(np.int64)
+        num_full = self.num_bits // k_bits
+        weights = 1 << np.arange(k_bits - 1, -1, -1, dtype=np.int64)
+        symbols = bits[:num_full * k_bits].reshape(num_full, k_bits) @ weights
+        remainder = bits[num_full * k_bits:]
+        if len(remainder):
+            tail = remainder @ (1 << np.arange(len(remainder) - 1, -1, -1, dtype=np.int64))
+            symbols = np.append(symbols, tail)
+
+        self.symbols = symbols.astype(np.int64)  # [num_symbols] target bits per step
+
+    @classmethod
+    def from_symbols(cls, symbols, num_bits: int, k_bits: int = 2) -> 'PackedPayload':
+        """
+        Packs (a prefix of) the k-bit symbols of a num_bits payload back into bytes.
+
+        The last symbol of the payload only carries its remaining num_bits % k_bits bits, as in
+        __init__. Bits past the given symbols are zero, and only complete bytes are kept.
+        """
+        symbols = np.asarray(symbols, dtype=np.int64)
+        widths = np.minimum(k_bits, num_bits - k_bits * np.arange(len(symbols), dtype=np.int64))
+        if len(widths) and widths[-1] <= 0:
+            raise ValueError(f"{len(symbols)} symbols of {k_bits} bits exceed the {num_bits}-bit payload")
+        # bit j (MSB first) of each symbol, masked to the symbol's width
+        shifts = widths[:, None] - 1 - np.arange(k_bits, dtype=np.int64)
+        bits = (symbols[:, None] >> np.maximum(shifts, 0)) & 1
+        bits = bits[shifts >= 0].astype(np.uint8)
+        num_bytes = len(bits) // 8
+        return cls(np.packbits(bits[:num_bytes * 8]).tobytes(), k_bits=k_bits)
+
+    @classmethod
+    def from_bits(cls, payload_bits: str, k_bits: int = 2) -> 'PackedPayload':
+        """
+        Packs the complete bytes of a '0'/'1' string.
+        """
+        num_bytes = len(payload_bits) // 8
+        return cls(bytes(int(payload_bits[i*8:i*8+8], 2) for i in range(num_bytes)), k_bits=k_bits)
+
+    def __len__(self) -> int:
+        return self.num_bits
+
+    @property
+    def num_symbols(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def bits(self) -> str:
+        """
+        The payload as a '0'/'1' string (PayloadManager.encode format).
+        """
+        return ''.join(format(byte, '08b') for byte in self.data.tobytes())
+
+
 class PayloadManager:
     """
     Manages the watermark payload, including message-to-bit conversion.
@@ -23,16 +94,36 @@ class PayloadManager:
         payload_bits = ''.join(format(byte, '08b') for byte in byte_data)
         return payload_bits
 
-    def decode(self, payload_bits: str) -> str | None:
+    def encode_packed(self, message: str | bytes, k_bits: int = 2) -> PackedPayload:
+        """
+        Encodes a message into a PackedPayload with precomputed k-bit symbols.
+
+        Args:
+            message (str | bytes): The message, or raw bytes (e.g. signature + ID + timestamp).
+            k_bits (int): The number of bits embedded per step.
         """
-        Decodes a (potentially corrupted) bit string to the original message.
+        byte_data = message.encode('utf-8') if isinstance(message, str) else message
+        return PackedPayload(byte_data, k_bits=k_bits)
+
+    def decode(self, payload_bits: str | PackedPayload) -> str | None:
+        """
+        Decodes a (potentially corrupted) bit string or packed payload to the original message.
+        Only complete bytes are used; decoding errors are ignored.
+        """
+        if not isinstance(payload_bits, PackedPayload):
+            try:
+                payload_bits = PackedPayload.from_bits(payload_bits)
+            except ValueError:
+                return None
+        return payload_bits.data.tobytes().decode('utf-8', errors='ignore')
+
+    def decode_symbols(self, symbols, num_bits: int, k_bits: int = 2) -> str | None:
+        """
+        Decodes extracted k-bit symbols (a prefix of the payload's symbols) back to a message.
+
+        Args:
+            symbols: The extracted symbols, e.g. the matched target symbols of a detector.
+            num_bits (int): Length of the embedded payload in bits (sizes its partial last symbol).
+            k_bits (int): The number of bits embedded per step.
         """
-        # Convert the bit string to a byte array
-        try:
-            # Ensure we only process full bytes (8 bits)
-            num_bytes = len(payload_bits) // 8
-            byte_data = bytearray(int(payload_bits[i*8:i*8+8], 2) for i in range(num_bytes))
-            # Decode the byte array to a string, ignoring any decoding errors
-            return byte_data.decode('utf-8', errors='ignore')
-        except Exception:
-            return None
\ No newline at end of file
+        return self.decode(PackedPayload.from_symbols(symbols, num_bits, k_bits=k_bits))
@@ -1,52 +1,270 @@
 import torch
-from .jamo_utils import get_last_syllable_jamo
+from transformers import LogitsProcessor
 from .hash_policy import HashPolicy
+from .vocab_table import get_vocab_table
+from .payload_mgr import PackedPayload
+from .scoring import frame_symbols, payload_to_symbols
+from .metrics import NULL_METRICS, NullMetrics, record_watermark_step
+from .schedule import DEFAULT_SCHEDULE, EmbeddingSchedule
 
 class JamoWatermarkProcessor:
     """
     A watermark injector using the 3 channels of Korean Jamo (Choseong, Jungseong, Jongseong).
-    Inherits from LogitsProcessor to intervene in the generate() pipeline in real-time.
+    Used by the generation loops directly, and by model.generate() through JamoWatermarkLogitsProcessor.
     """
-    def __init__(self, tokenizer, mode: str = 'robustness', k_bits: int = 2, top_k: int = 30):
+    def __init__(
+        self,
+        tokenizer,
+        mode: str = 'robustness',
+        k_bits: int = 2,
+        top_k: int | None = 30,
+        metrics: NullMetrics | None = None,
+        schedule: EmbeddingSchedule | None = None,
+        hash_policy: HashPolicy | None = None
+    ):
+        # An explicit hash policy (e.g. KeyedHashPolicy) overrides mode and k_bits
+        if hash_policy is not None:
+            mode, k_bits = hash_policy.mode, hash_policy.k_bits
         self.tokenizer = tokenizer    # Tokenizer for decoding
         self.mode = mode              # 'robustness' or 'quality'
         self.k_bits = k_bits          # Number of bits to insert at once
-        self.top_k = top_k            # Number of candidate tokens to consider
-        self.hash_policy = HashPolicy(mode=self.mode, k_bits=self.k_bits)
-        
-    def bias_logits(self, logits: torch.FloatTensor, target_bits: int, channel_idx: int) -> torch.FloatTensor:
-
-        top_k_indices = logits.topk(self.top_k).indices[0]
-        bias_value = 5.0
-
-        for token_idx in top_k_indices:
-            token_str = self.tokenizer.convert_ids_to_tokens(token_idx.item())
-            jamo_indices = get_last_syllable_jamo(token_str)
-
-            # Skip tokens that do not contain a Hangul syllable
-            if jamo_indices is None:
-                continue
-            
-            # Calculate hashes for the token
-            token_hashes = self.hash_policy.calculate_channel_hashes(*jamo_indices)
-            
-            # Apply bias only if the hash of the selected channel matches the target bits
-            if token_hashes[channel_idx] == target_bits:
-                logits[0, token_idx] += bias_value
+        self.top_k = top_k            # Number of candidate tokens to consider (None: whole vocabulary)
+        # Channel schedule and bias policy; detectors must use the same schedule (see schedule.py)
+        self.schedule = schedule if schedule is not None else DEFAULT_SCHEDULE
+        self.bias_value = self.schedule.bias  # Logit bias added to candidates that carry the target bits
+        self.hash_policy = hash_policy if hash_policy is not None else HashPolicy(mode=self.mode, k_bits=self.k_bits)
+        # Per-token channel hashes, computed once for the whole vocabulary
+        self.vocab_table = get_vocab_table(self.tokenizer, self.hash_policy)
+        # Instrumentation sink shared with the generation loops (see metrics.py); no-op by default
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+
+    def _observe_candidates(self, candidate_ids: torch.LongTensor):
+        """
+        Records the fraction of non-Hangul tokens among each row of top-k candidates.
+        """
+        table = self.vocab_table
+        in_vocab = candidate_ids < table.vocab_size
+        is_hangul = in_vocab & table.hangul_mask[candidate_ids.clamp(max=table.vocab_size - 1)]
+        for fraction in (1.0 - is_hangul.float().mean(dim=-1)).reshape(-1).tolist():
+            self.metrics.observe('jamo_topk_non_hangul_fraction', fraction)
+
+    def _adaptive_bias(self, logits: torch.FloatTensor, candidate_ids: torch.LongTensor, matches: torch.BoolTensor) -> torch.FloatTensor:
+        """
+        [batch] bias that lifts the probability of sampling a matching candidate to
+        schedule.target_match_rate: logit(target_match_rate) - logit(matched mass), clipped.
+        """
+        probs = torch.softmax(logits.float(), dim=-1)
+        matched_mass = (probs.gather(1, candidate_ids) * matches.to(probs.device)).sum(dim=-1)
+        matched_mass = matched_mass.clamp(1e-12, 1.0 - 1e-6)
+        bias = self.schedule.target_logit - torch.log(matched_mass / (1.0 - matched_mass))
+        return bias.clamp(self.schedule.min_bias, self.schedule.max_bias)
+
+    def initial_contexts(self, input_ids: torch.LongTensor) -> torch.LongTensor | None:
+        """
+        [batch] hash contexts after each row of `input_ids` (the prompts), or None when the hash
+        policy does not depend on the previous token.
+        """
+        if not self.hash_policy.uses_context:
+            return None
+        return self.vocab_table.contexts_after(input_ids.cpu())
+
+    def next_contexts(self, contexts: torch.LongTensor | None, token_ids: torch.LongTensor) -> torch.LongTensor | None:
+        """
+        Contexts after the sampled tokens ([batch] token ids).
+        """
+        if contexts is None:
+            return None
+        return self.vocab_table.next_contexts(contexts, token_ids.reshape(-1).cpu())
+
+    def _table_bits(self, target_bits, channel_idx, contexts):
+        """
+        Table hash that carries `target_bits` after `contexts` (unchanged without context).
+        """
+        if contexts is None:
+            return target_bits
+        if isinstance(target_bits, int):
+            return target_bits ^ int(self.vocab_table.context_masks[int(contexts), channel_idx])
+        return self.vocab_table.table_targets(target_bits.cpu(), channel_idx.cpu(), contexts)
+
+    def bias_logits(self, logits: torch.FloatTensor, target_bits: int, channel_idx: int, context: torch.LongTensor | None = None) -> torch.FloatTensor:
+
+        # Candidate tokens: the top-k logits, or every token when top_k is None
+        if self.top_k is None:
+            candidate_ids = torch.arange(logits.size(-1), device=logits.device)
+        else:
+            candidate_ids = logits.topk(self.top_k).indices[0]
+
+        # Apply bias only to Hangul candidates whose selected-channel hash matches the target bits
+        candidate_ids = candidate_ids.cpu()
+        if self.metrics.enabled and self.top_k is not None:
+            self._observe_candidates(candidate_ids)
+        matches = self.vocab_table.match_mask(candidate_ids, self._table_bits(target_bits, channel_idx, context), channel_idx)
+        matched_ids = candidate_ids[matches]
+        if self.schedule.adaptive_bias:
+            bias = self._adaptive_bias(logits, candidate_ids[None].to(logits.device), matches[None])[0].to(logits.dtype)
+        else:
+            bias = self.bias_value
+        logits[0, matched_ids.to(logits.device)] += bias
         
         return logits
     
-    def check_token_match(self, token_id: int, target_bits: int, channel_idx: int) -> bool:
+    def check_token_match(self, token_id: int, target_bits: int, channel_idx: int, context: torch.LongTensor | None = None) -> bool:
 
-        token_str = self.tokenizer.convert_ids_to_tokens(token_id)
-        jamo_indices = get_last_syllable_jamo(token_str)
+        return self.vocab_table.is_match(token_id, self._table_bits(target_bits, channel_idx, context), channel_idx)
 
-        if jamo_indices is None:
-            return False
+    def bias_logits_batch(
+        self,
+        logits: torch.FloatTensor,
+        target_bits: torch.LongTensor,
+        channel_idx: torch.LongTensor,
+        contexts: torch.LongTensor | None = None
+    ) -> torch.FloatTensor:
+        """
+        Batched version of bias_logits().
 
-        token_hashes = self.hash_policy.calculate_channel_hashes(*jamo_indices)
+        Args:
+            logits: [batch, vocab] next-token logits.
+            target_bits: [batch] target bits per row (-1 for rows with nothing left to embed).
+            channel_idx: [batch] channel per row.
+            contexts: [batch] hash contexts (initial_contexts / next_contexts), None without context.
+        """
+        if self.top_k is None:
+            candidate_ids = torch.arange(logits.size(-1), device=logits.device).expand(logits.size(0), -1)
+        else:
+            candidate_ids = logits.topk(self.top_k, dim=-1).indices   # [batch, top_k]
 
-        if token_hashes[channel_idx] == target_bits:
-            return True
-        
-        return False
\ No newline at end of file
+        if self.metrics.enabled and self.top_k is not None:
+            self._observe_candidates(candidate_ids.cpu()[target_bits.cpu() >= 0])
+        table_bits = self._table_bits(target_bits.cpu(), channel_idx.cpu(), contexts)
+        matches = self.vocab_table.match_mask(candidate_ids.cpu(), table_bits[:, None], channel_idx.cpu()[:, None])
+        if self.schedule.adaptive_bias:
+            bias_value = self._adaptive_bias(logits, candidate_ids, matches)[:, None].to(logits.dtype)
+        else:
+            bias_value = self.bias_value
+        bias = matches.to(device=logits.device, dtype=logits.dtype) * bias_value
+        logits.scatter_add_(1, candidate_ids, bias)
+
+        return logits
+
+    def check_token_match_batch(
+        self,
+        token_ids: torch.LongTensor,
+        target_bits: torch.LongTensor,
+        channel_idx: torch.LongTensor,
+        contexts: torch.LongTensor | None = None
+    ) -> torch.BoolTensor:
+        """
+        Batched version of check_token_match(). All arguments are [batch] tensors.
+        """
+        table_bits = self._table_bits(target_bits.cpu(), channel_idx.cpu(), contexts)
+        return self.vocab_table.match_mask(token_ids.cpu(), table_bits, channel_idx.cpu())
+
+
+class JamoWatermarkLogitsProcessor(LogitsProcessor):
+    """
+    Stateful transformers LogitsProcessor wrapper around JamoWatermarkProcessor, usable with model.generate().
+
+    The old LogitsProcessor subclass advanced step_t before sampling (note_251123). This one never
+    advances it inside the biasing step: on every call it first looks at the last token of each row
+    of `input_ids`, i.e. the token sampled from the previous call's distribution, and advances
+    step_t only if that token matched the previous target (the same rule as check_token_match).
+    The resulting sequences are therefore verified by JamoWatermarkDetector exactly like the ones
+    produced by the manual generation loop.
+    """
+    def __init__(
+        self,
+        processor: JamoWatermarkProcessor,
+        payloads: str | PackedPayload | list[str | PackedPayload],
+        repeat_payload: bool = False
+    ):
+        """
+        Args:
+            processor (JamoWatermarkProcessor): Provides the vocabulary table, top_k and bias.
+            payloads: One payload (bit string or PackedPayload) shared by every row, or one per row.
+            repeat_payload (bool): Embed SYNC_MARKER + payload cyclically instead of once.
+        """
+        self.processor = processor
+        self.k_bits = processor.k_bits
+        self.payloads = payloads
+        self.repeat_payload = repeat_payload
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the per-row synchronization state.
+
+        __call__() also starts over by itself unless its input is exactly the previous input plus one
+        token, which catches a new generate() call in all but one case: a prompt equal to the previous
+        input plus one token (e.g. the previous output fed back) continues the old synchronization.
+        Call reset() before reusing the processor for such a prompt.
+        """
+        self.step_t = None          # [batch] number of embedded symbols per row
+        self._targets = None        # [batch, max_symbols + 1] target bits per step (-1: done)
+        self._channels = None       # [batch, max_symbols + 1] scheduled channel per step
+        self._num_symbols = None    # [batch] symbols per row (frame length with repeat_payload)
+        self._last_target = None    # [batch] target bits used at the previous call (-1: none)
+        self._last_channel = None   # [batch] channel used at the previous call
+        self._tokens_spent = None   # [batch] tokens sampled for the current symbol (metrics only)
+        self._contexts = None       # [batch] hash contexts of the next token (None: context-free policy)
+        self._last_input_ids = None  # [batch, seq_len] input of the previous call
+
+    def _start(self, input_ids: torch.LongTensor):
+        batch_size = input_ids.size(0)
+        payloads = [self.payloads] * batch_size if isinstance(self.payloads, (str, PackedPayload)) else list(self.payloads)
+        if len(payloads) != batch_size:
+            raise ValueError(f"Expected {batch_size} payloads, got {len(payloads)}")
+
+        to_symbols = frame_symbols if self.repeat_payload else payload_to_symbols
+        symbols = [to_symbols(payload, self.k_bits) for payload in payloads]
+        self._num_symbols = torch.tensor([len(row_symbols) for row_symbols in symbols], dtype=torch.long)
+        max_symbols = max(len(row_symbols) for row_symbols in symbols)
+        self._targets = torch.full((batch_size, max_symbols + 1), -1, dtype=torch.long)
+        self._channels = torch.zeros((batch_size, max_symbols + 1), dtype=torch.long)
+        for row, row_symbols in enumerate(symbols):
+            self._targets[row, :len(row_symbols)] = torch.tensor(row_symbols, dtype=torch.long)
+            channels = self.processor.schedule.channels(row_symbols, self.processor.hash_policy)
+            self._channels[row, :len(row_symbols)] = torch.tensor(channels, dtype=torch.long)
+
+        self.step_t = torch.zeros(batch_size, dtype=torch.long)
+        self._last_target = torch.full((batch_size,), -1, dtype=torch.long)
+        self._last_channel = torch.zeros(batch_size, dtype=torch.long)
+        self._tokens_spent = torch.zeros(batch_size, dtype=torch.long)
+        self._contexts = self.processor.initial_contexts(input_ids)
+
+    def _record_steps(self, is_match: torch.BoolTensor):
+        embedding = self._last_target >= 0
+        self._tokens_spent += embedding.long()
+        rows = embedding.nonzero(as_tuple=True)[0].tolist()
+        for row in rows:
+            record_watermark_step(self.processor.metrics, int(self._last_channel[row]), bool(is_match[row]), int(self._tokens_spent[row]))
+        self._tokens_spent[is_match] = 0
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        # Anything but the previous input plus one token means generate() was called again: start over
+        last_input_ids = self._last_input_ids
+        if last_input_ids is None or input_ids.shape != (last_input_ids.size(0), last_input_ids.size(1) + 1) \
+                or not torch.equal(input_ids[:, :-1], last_input_ids):
+            self._start(input_ids)
+        else:
+            # Post-sampling synchronization for the token chosen at the previous step
+            last_tokens = input_ids[:, -1].cpu()
+            is_match = self.processor.check_token_match_batch(last_tokens, self._last_target, self._last_channel, self._contexts)
+            self.step_t += is_match.long()
+            self._contexts = self.processor.next_contexts(self._contexts, last_tokens)
+            if self.processor.metrics.enabled:
+                self._record_steps(is_match)
+        self._last_input_ids = input_ids
+
+        rows = torch.arange(self.step_t.size(0))
+        if self.repeat_payload:
+            steps = self.step_t % self._num_symbols
+        else:
+            steps = self.step_t.clamp(max=self._targets.size(1) - 1)
+        target_bits = self._targets[rows, steps]
+        channel_idx = self._channels[rows, steps]
+
+        scores = self.processor.bias_logits_batch(scores, target_bits, channel_idx, self._contexts)
+
+        self._last_target = target_bits
+        self._last_channel = channel_idx
+        return scores
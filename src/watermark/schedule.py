@@ -0,0 +1,112 @@
+import math
+import numpy as np
+from .hash_policy import HashPolicy, keyed_prf, prf_key
+from .syllable_table import get_syllable_hash_table
+
+# Embedding schedule shared by the processor and every detector.
+#
+# The schedule decides which Jamo channel carries each payload step and how strongly the processor
+# biases the candidates that carry the target bits.
+#
+# * Channels: without a key, step s uses channel s % 3 (the original round robin). With a key, the
+#   channel of step s is drawn by a keyed hash of (key, s) among the channels that can carry the
+#   step's target symbol under the hash policy. Channels that can never carry it are skipped, so no
+#   step waits for an impossible token, and so are channels whose hash is constant (Choseong in
+#   'quality' mode is always 0): every token would match there, which carries no evidence.
+#   The schedule depends only on the key, the hash policy and the target symbols, all of which the
+#   detector knows, so it is reproduced exactly at detection time.
+# * Bias: without target_match_rate the constant `bias` is added (the original behaviour). With it,
+#   the bias is the smallest one that lifts the probability of sampling a matching token to
+#   target_match_rate, given the matching probability mass m before biasing:
+#       bias = logit(target_match_rate) - logit(m), clipped to [min_bias, max_bias].
+#   Steps the model already favours get little or no bias; steps it does not get more, which cuts
+#   the number of mismatched (wasted) forward passes per embedded symbol.
+
+_CARRY_TABLE_CACHE: dict[str, np.ndarray] = {}
+
+def channel_carry_table(hash_policy: HashPolicy) -> np.ndarray:
+    """
+    [3, 2**k_bits] bool table: True if some Hangul syllable hashes to that value on that channel.
+    Constant channels (a single reachable value) are all False.
+    """
+    key = hash_policy.policy_id
+    table = _CARRY_TABLE_CACHE.get(key)
+    if table is None:
+        hashes = get_syllable_hash_table(hash_policy)
+        table = np.zeros((3, 2 ** hash_policy.k_bits), dtype=bool)
+        for channel in range(3):
+            values = np.unique(hashes[:, channel])
+            if len(values) > 1:
+                table[channel, values] = True
+        _CARRY_TABLE_CACHE[key] = table
+    return table
+
+class EmbeddingSchedule:
+    """
+    Channel schedule and bias policy of the watermark (see module comment).
+    """
+    def __init__(
+        self,
+        key: str | bytes | None = None,
+        bias: float = 5.0,
+        target_match_rate: float | None = None,
+        min_bias: float = 0.0,
+        max_bias: float = 10.0
+    ):
+        """
+        Args:
+            key (str | bytes | None): Secret key of the channel schedule. None: round robin (step % 3).
+            bias (float): Constant logit bias, used when target_match_rate is None.
+            target_match_rate (float | None): Desired probability of sampling a matching token per step.
+            min_bias (float): Lower bound of the adaptive bias.
+            max_bias (float): Upper bound of the adaptive bias.
+        """
+        if target_match_rate is not None and not 0.0 < target_match_rate < 1.0:
+            raise ValueError("target_match_rate must be in (0, 1)")
+        self.key = key.encode('utf-8') if isinstance(key, str) else key
+        self._prf_key = prf_key(self.key) if self.key is not None else None
+        self.bias = bias
+        self.target_match_rate = target_match_rate
+        self.min_bias = min_bias
+        self.max_bias = max_bias
+        self._channel_cache: dict[tuple, list[int]] = {}
+
+    @property
+    def adaptive_bias(self) -> bool:
+        return self.target_match_rate is not None
+
+    @property
+    def target_logit(self) -> float:
+        """
+        logit(target_match_rate), the log-odds a matching token should reach after biasing.
+        """
+        return math.log(self.target_match_rate / (1.0 - self.target_match_rate))
+
+    def _step_draw(self, step: int) -> int:
+        return keyed_prf(self._prf_key, step.to_bytes(8, 'little'))
+
+    def channels(self, targets: list[int], hash_policy: HashPolicy) -> list[int]:
+        """
+        Channel of every payload step.
+
+        Args:
+            targets (list[int]): Target symbol per step.
+            hash_policy (HashPolicy): Hash policy of the processor/detector.
+        """
+        if self.key is None:
+            return [step % 3 for step in range(len(targets))]
+
+        cache_key = (hash_policy.policy_id, tuple(targets))
+        channels = self._channel_cache.get(cache_key)
+        if channels is None:
+            carry = channel_carry_table(hash_policy)
+            channels = []
+            for step, target_bits in enumerate(targets):
+                usable = np.flatnonzero(carry[:, target_bits]).tolist() or [0, 1, 2]
+                channels.append(usable[self._step_draw(step) % len(usable)])
+            if len(self._channel_cache) >= 1024:
+                self._channel_cache.clear()
+            self._channel_cache[cache_key] = channels
+        return channels
+
+DEFAULT_SCHEDULE = EmbeddingSchedule()
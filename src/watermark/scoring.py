@@ -0,0 +1,461 @@
+import math
+import numpy as np
+from .payload_mgr import PackedPayload
+
+# Torch-free scoring helpers shared by every detector (token-based, text-based and streaming).
+
+# Sync marker that opens every repetition of a repeating payload (see frame_symbols)
+SYNC_MARKER = b'\xa5\x3c'
+
+def payload_to_symbols(payload: str | PackedPayload, k_bits: int) -> list[int]:
+    """
+    Splits a payload (bit string or PackedPayload) into the k-bit target symbols embedded at each step.
+    """
+    if isinstance(payload, PackedPayload):
+        if payload.k_bits == k_bits:
+            return payload.symbols.tolist()
+        payload = payload.bits
+    return [int(payload[i : i + k_bits], 2) for i in range(0, len(payload), k_bits)]
+
+def frame_symbols(payload: str | PackedPayload, k_bits: int) -> list[int]:
+    """
+    Symbols of one repetition of a repeating payload: SYNC_MARKER followed by the payload.
+    """
+    return payload_to_symbols(PackedPayload(SYNC_MARKER, k_bits), k_bits) + payload_to_symbols(payload, k_bits)
+
+def symbols_to_bits(symbols: list[int], k_bits: int, num_bits: int | None = None) -> str:
+    """
+    Formats extracted symbols as a bit string (k bits per symbol).
+
+    Args:
+        num_bits (int | None): Length of the payload in bits; its partial last symbol is formatted
+            with only its remaining num_bits % k_bits bits (PackedPayload.symbols convention).
+    """
+    if num_bits is None:
+        return ''.join(format(bits, f'0{k_bits}b') for bits in symbols)
+    return ''.join(format(bits, f'0{min(k_bits, num_bits - step * k_bits)}b') for step, bits in enumerate(symbols))
+
+def step_channels(channels: list[int] | None, num_steps: int) -> list[int]:
+    """
+    Channel of every step: `channels` (see schedule.EmbeddingSchedule) or the round robin step % 3.
+    """
+    if channels is None:
+        return [step % 3 for step in range(num_steps)]
+    return list(channels)
+
+def next_occurrence_table(channel_hashes: np.ndarray, k_bits: int) -> np.ndarray:
+    """
+    next_pos[code, i]: first position >= i whose hash on channel code // 2**k_bits equals
+    code % 2**k_bits (num_tokens if there is none). Built with one reverse running minimum.
+
+    Args:
+        channel_hashes (np.ndarray): [num_tokens, 3] channel hashes of the Hangul tokens only.
+
+    Returns:
+        np.ndarray: [3 * 2**k_bits, num_tokens + 1] table.
+    """
+    num_tokens = len(channel_hashes)
+    num_values = 2 ** k_bits
+    positions = np.arange(num_tokens, dtype=np.int64)
+
+    next_pos = np.full((3 * num_values, num_tokens + 1), num_tokens, dtype=np.int64)
+    codes = np.asarray(channel_hashes, dtype=np.int64).reshape(num_tokens, 3)
+    for channel in range(3):
+        occurrence_pos = np.full((num_values, num_tokens), num_tokens, dtype=np.int64)
+        occurrence_pos[codes[:, channel], positions] = positions
+        next_pos[channel * num_values : (channel + 1) * num_values, :num_tokens] = \
+            np.minimum.accumulate(occurrence_pos[:, ::-1], axis=1)[:, ::-1]
+    return next_pos
+
+def hash_code_counts(channel_hashes: np.ndarray, k_bits: int) -> np.ndarray:
+    """
+    Number of Hangul tokens carrying every (channel, value) code, indexed like next_occurrence_table codes.
+    """
+    num_values = 2 ** k_bits
+    codes = np.asarray(channel_hashes, dtype=np.int64).reshape(-1, 3) + np.arange(3) * num_values
+    return np.bincount(codes.reshape(-1), minlength=3 * num_values)
+
+def code_match_rates(code_counts: np.ndarray) -> np.ndarray:
+    """
+    Chance match rate of every (channel, value) code: the fraction of Hangul tokens whose hash on
+    channel code // 2**k_bits is code % 2**k_bits (add-one smoothed).
+
+    Real Korean text is far from uniform over the hash values (most syllables have no Jongseong),
+    so the null of every z-score is taken from the text's own hash frequencies, not 1 / 2**k_bits.
+
+    Args:
+        code_counts (np.ndarray): [3 * 2**k_bits] hash_code_counts() of the text.
+    """
+    num_values = len(code_counts) // 3
+    num_tokens = code_counts[:num_values].sum()
+    return (code_counts + 1.0) / (num_tokens + num_values)
+
+def hash_match_rates(channel_hashes: np.ndarray, k_bits: int) -> np.ndarray:
+    """
+    code_match_rates() of a text's channel hashes.
+
+    Returns:
+        np.ndarray: [3 * 2**k_bits] rates, indexed like next_occurrence_table codes.
+    """
+    return code_match_rates(hash_code_counts(channel_hashes, k_bits))
+
+def calibrated_z_score(detected_cnt, code_trials: np.ndarray, match_rates: np.ndarray):
+    """
+    z-score of greedy matches against the text's chance match rates.
+
+    Under the null every checked token matches its step's (channel, target) code with that code's
+    rate, so the matches minus the summed rates of the checked tokens is a martingale with
+    variance sum(rate * (1 - rate)).
+
+    Args:
+        detected_cnt: Matched steps (int, or [N] array).
+        code_trials (np.ndarray): Checked tokens per code ([3 * 2**k_bits], or [N, 3 * 2**k_bits]).
+        match_rates (np.ndarray): hash_match_rates() of the text.
+    """
+    # Row sums rather than a matrix product, so one row scores exactly like the same trials alone
+    expected = (code_trials * match_rates).sum(axis=-1)
+    variance = (code_trials * (match_rates * (1.0 - match_rates))).sum(axis=-1)
+    safe_variance = np.where(variance > 0, variance, 1.0)
+    z_score = np.where(variance > 0, (detected_cnt - expected) / np.sqrt(safe_variance), 0.0)
+    return float(z_score) if np.ndim(z_score) == 0 else z_score
+
+def greedy_sync(channel_hashes: np.ndarray, targets: list[int], k_bits: int, channels: list[int] | None = None) -> int:
+    """
+    "Advance only on match" synchronization over a sequence of Hangul tokens.
+
+    Step s is found at the first token after the previous match whose hash on channel
+    channels[s] equals targets[s]. With the next-occurrence table, the loop below runs once per
+    payload step, not once per token.
+
+    Args:
+        channel_hashes (np.ndarray): [num_tokens, 3] channel hashes of the Hangul tokens only.
+        targets (list[int]): Target symbol per step.
+        k_bits (int): Bits per symbol.
+        channels (list[int] | None): Channel per step (default: step % 3).
+
+    Returns:
+        int: Number of matched steps (detected count).
+    """
+    num_tokens = len(channel_hashes)
+    if num_tokens == 0 or not targets:
+        return 0
+
+    num_values = 2 ** k_bits
+    next_pos = next_occurrence_table(channel_hashes, k_bits)
+
+    detected_cnt = 0
+    search_from = 0
+    for channel, target_bits in zip(step_channels(channels, len(targets)), targets):
+        found = next_pos[channel * num_values + target_bits, search_from]
+        if found >= num_tokens:
+            break
+        detected_cnt += 1
+        search_from = found + 1
+
+    return detected_cnt
+
+def greedy_sync_many(
+    channel_hashes: np.ndarray,
+    targets_list: list[list[int]],
+    k_bits: int,
+    channels_list: list[list[int]] | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    greedy_sync() for N candidate payloads at once over the same tokens.
+
+    The next-occurrence table is built once; the N state machines (search position and
+    matched-step count per payload) then advance together, one vectorized gather per step.
+    Cost grows with num_tokens + N * steps instead of num_tokens * N.
+
+    Returns:
+        [N] number of matched steps per payload, [N] number of Hangul tokens each payload checked
+        (up to its last step's match, or every token if it missed a step), and [N, 3 * 2**k_bits]
+        of those tokens per (channel, target) code of the step they were checked against
+        (for calibrated_z_score).
+    """
+    num_payloads = len(targets_list)
+    num_tokens = len(channel_hashes)
+    max_steps = max((len(targets) for targets in targets_list), default=0)
+    num_values = 2 ** k_bits
+    detected_cnt = np.zeros(num_payloads, dtype=np.int64)
+    code_trials = np.zeros((num_payloads, 3 * num_values), dtype=np.int64)
+    if num_tokens == 0 or max_steps == 0:
+        return detected_cnt, np.full(num_payloads, num_tokens, dtype=np.int64), code_trials
+
+    next_pos = next_occurrence_table(channel_hashes, k_bits)
+
+    target_table = np.full((num_payloads, max_steps), -1, dtype=np.int64)
+    channel_table = np.zeros((num_payloads, max_steps), dtype=np.int64)
+    for row, targets in enumerate(targets_list):
+        target_table[row, :len(targets)] = targets
+        channel_table[row, :len(targets)] = step_channels(channels_list[row] if channels_list else None, len(targets))
+
+    rows = np.arange(num_payloads)
+    search_from = np.zeros(num_payloads, dtype=np.int64)
+    for step in range(max_steps):
+        step_targets = target_table[:, step]
+        active = step_targets >= 0
+        step_codes = channel_table[:, step] * num_values + np.maximum(step_targets, 0)
+        found = next_pos[step_codes, search_from]
+        matched = active & (found < num_tokens)
+        detected_cnt += matched
+        # A payload that misses a step can never advance again (it has checked every token);
+        # a payload without further steps stops checking tokens
+        next_search = np.where(matched, found + 1, np.where(active, num_tokens, search_from))
+        code_trials[rows, step_codes] += next_search - search_from
+        search_from = next_search
+        if not matched.any():
+            break
+
+    return detected_cnt, search_from, code_trials
+
+def aligned_matches(channel_hashes: np.ndarray, targets: list[int], k_bits: int, channels: list[int] | None = None) -> int:
+    """
+    Size of the best monotone alignment between the token stream and the target steps.
+
+    Unlike greedy_sync(), which stops for good at the first step it cannot find, this is the
+    longest common subsequence where token i and step s match if token i's hash on channel
+    channels[s] (default s % 3) equals targets[s]: deleted or inserted tokens only cost the steps they carried.
+
+    Args:
+        channel_hashes (np.ndarray): [num_tokens, 3] channel hashes of the Hangul tokens only.
+        targets (list[int]): Target symbol per step.
+        k_bits (int): Bits per symbol.
+
+    Returns:
+        int: Number of aligned (matched) steps.
+    """
+    prefix_matches = aligned_matches_by_prefix(channel_hashes, targets, k_bits, channels)
+    return int(prefix_matches[-1]) if len(prefix_matches) else 0
+
+def aligned_matches_by_prefix(channel_hashes: np.ndarray, targets: list[int], k_bits: int, channels: list[int] | None = None) -> np.ndarray:
+    """
+    aligned_matches() of every prefix of the token stream: entry i aligns tokens [0, i].
+
+    Computed in one pass with the bit-parallel LCS recurrence (Allison-Dix / Hyyro) on Python ints
+    holding one bit per step, i.e. O(num_tokens * num_steps / word size).
+
+    Returns:
+        np.ndarray: [num_tokens] number of aligned steps after each token.
+    """
+    num_tokens = len(channel_hashes)
+    if num_tokens == 0 or len(targets) == 0:
+        return np.zeros(num_tokens, dtype=np.int64)
+    step_matches = _step_matches(channel_hashes, targets, k_bits, channels)
+    return _aligned_matches_by_lane(step_matches, np.arange(num_tokens)[None, :])[0]
+
+def _step_matches(channel_hashes: np.ndarray, targets: list[int], k_bits: int, channels: list[int] | None) -> np.ndarray:
+    """
+    [num_tokens, num_steps] bool: token i matches step s if its hash on channel channels[s] equals targets[s].
+    """
+    channel_hashes = np.asarray(channel_hashes, dtype=np.int64).reshape(-1, 3)
+    step_channel = np.array(step_channels(channels, len(targets)), dtype=np.int64)
+    return channel_hashes[:, step_channel] == np.asarray(targets, dtype=np.int64)
+
+def _aligned_matches_by_lane(step_matches: np.ndarray, orders: np.ndarray, block_tokens: int = 1024) -> np.ndarray:
+    """
+    aligned_matches_by_prefix() of the tokens taken in several orders at once.
+
+    Every order is a lane of num_steps bits plus a zero guard bit in one Python int, so the LCS
+    recurrence runs once for all lanes: the guard bit absorbs the carry out of a lane, and since
+    the step mask is a subset of the state the subtraction never borrows across lanes.
+
+    Args:
+        step_matches (np.ndarray): [num_tokens, num_steps] match of every token and step (_step_matches).
+        orders (np.ndarray): [num_lanes, num_tokens] token order of every lane.
+
+    Returns:
+        np.ndarray: [num_lanes, num_tokens] number of aligned steps after each token.
+    """
+    num_lanes, num_tokens = orders.shape
+    num_steps = step_matches.shape[1]
+    lane_bits = num_steps + 1
+    lane_full = np.ones(lane_bits, dtype=bool)
+    lane_full[-1] = False
+    full = int.from_bytes(np.packbits(np.tile(lane_full, num_lanes), bitorder='little').tobytes(), 'little')
+
+    guarded = np.zeros((num_tokens, lane_bits), dtype=bool)
+    guarded[:, :num_steps] = step_matches
+    unmatched = np.empty((num_lanes, num_tokens), dtype=np.int64)
+    v = full
+    for block_start in range(0, num_tokens, block_tokens):
+        # Step masks of this block's tokens, lane by lane, packed into one int per position
+        block_orders = orders[:, block_start:block_start + block_tokens]
+        block_len = block_orders.shape[1]
+        lane_masks = guarded[block_orders.T].reshape(block_len, -1)
+        packed = np.packbits(lane_masks, axis=1, bitorder='little')
+        states = []
+        for row in packed:
+            u = v & int.from_bytes(row.tobytes(), 'little')
+            v = ((v + u) | (v - u)) & full
+            states.append(v.to_bytes(packed.shape[1], 'little'))
+
+        state_bits = np.unpackbits(
+            np.frombuffer(b''.join(states), dtype=np.uint8).reshape(block_len, -1), axis=1, bitorder='little'
+        )[:, :num_lanes * lane_bits].reshape(block_len, num_lanes, lane_bits)
+        unmatched[:, block_start:block_start + block_len] = state_bits.sum(axis=2, dtype=np.int64).T
+
+    return num_steps - unmatched
+
+def _best_prefix_z(prefix_matches: np.ndarray, prefix_mean: np.ndarray, prefix_std: np.ndarray) -> np.ndarray:
+    """
+    Largest z-score of the aligned count of any prefix against the null moments at that length
+    (prefixes whose null count has no spread, e.g. saturated ones, are skipped), per row.
+    """
+    scored = prefix_std > 0
+    if not scored.any():
+        return np.zeros(len(prefix_matches))
+    z_scores = (prefix_matches[:, scored] - prefix_mean[scored]) / prefix_std[scored]
+    return z_scores.max(axis=1)
+
+def compute_alignment_scores(
+    channel_hashes: np.ndarray,
+    targets: list[int],
+    k_bits: int,
+    channels: list[int] | None = None,
+    num_permutations: int = 256
+) -> tuple[float, int, float]:
+    """
+    Accuracy (aligned steps / total steps), aligned steps and z-score of a token stream.
+
+    The whole payload fits by chance into any text a few times longer than it, so the aligned
+    count of the whole text says nothing once it saturates. The z-score instead scores the
+    prefix where the alignment is least likely by chance, and calibrates that maximum over
+    prefixes, as cyclic_null_moments calibrates the maximum over phases.
+
+    Chance here is the same text in shuffled order: shuffling keeps the text's own hash
+    frequencies, which are far from uniform on real Korean text, and breaks only the order the
+    watermark embeds. The shuffles run as extra lanes of the same bit-parallel pass, seeded by
+    the text length so every detector of the same hashes gets the same score.
+
+    Args:
+        num_permutations (int): Number of shuffles estimating the null.
+    """
+    if not targets:
+        return 0.0, 0, 0.0
+    num_tokens = len(channel_hashes)
+    if num_tokens == 0:
+        return 0.0, 0, 0.0
+
+    rng = np.random.default_rng(num_tokens)
+    orders = np.stack([np.arange(num_tokens)] + [rng.permutation(num_tokens) for _ in range(num_permutations)])
+    lanes = _aligned_matches_by_lane(_step_matches(channel_hashes, targets, k_bits, channels), orders)
+    prefix_matches, null_matches = lanes[0], lanes[1:]
+    aligned_cnt = int(prefix_matches[-1])
+    accuracy = aligned_cnt / len(targets)
+
+    prefix_mean, prefix_std = null_matches.mean(axis=0), null_matches.std(axis=0)
+    best = _best_prefix_z(lanes, prefix_mean, prefix_std)
+    best_mean, best_std = best[1:].mean(), best[1:].std()
+    z_score = float((best[0] - best_mean) / best_std) if best_std > 0 else 0.0
+    return accuracy, aligned_cnt, z_score
+
+# Null moments are cached per (length bucket, frame, channels, k_bits); the oldest entries are
+# dropped past this many, so detecting many lengths or payloads does not grow the cache for good
+MAX_NULL_CACHE_ENTRIES = 256
+
+def _cache_moments(cache: dict, key: tuple, moments: tuple):
+    while len(cache) >= MAX_NULL_CACHE_ENTRIES:
+        del cache[next(iter(cache))]
+    cache[key] = moments
+
+def _length_bucket(num_tokens: int) -> int:
+    """
+    Rounds a token count to about 32 buckets per doubling, so null moments can be reused.
+    """
+    step = 1 << max(0, num_tokens.bit_length() - 5)
+    return max(1, (num_tokens + step // 2) // step * step)
+
+def cyclic_sync(channel_hashes: np.ndarray, frame: list[int], k_bits: int, channels: list[int]) -> tuple[int, int, float]:
+    """
+    greedy_sync() against a payload frame that repeats without end, for every starting phase at once.
+
+    A chunk cut from a long document starts at an unknown position of the frame, so every rotation
+    of the frame is synchronized over the chunk in parallel (one vectorized gather per step, as in
+    greedy_sync_many). Each Hangul token is one trial for every phase, scored against the chunk's
+    own hash frequencies (calibrated_z_score); the phase with the highest z-score is kept.
+
+    Args:
+        channel_hashes (np.ndarray): [num_tokens, 3] channel hashes of the Hangul tokens only.
+        frame (list[int]): Target symbol per frame step (see frame_symbols).
+        k_bits (int): Bits per symbol.
+        channels (list[int]): Channel per frame step.
+
+    Returns:
+        (phase, matches, z_score): the frame step the best phase starts at, its number of matched
+        steps and its z-score.
+    """
+    num_tokens = len(channel_hashes)
+    frame_len = len(frame)
+    if num_tokens == 0 or frame_len == 0:
+        return 0, 0, 0.0
+
+    num_values = 2 ** k_bits
+    next_pos = next_occurrence_table(channel_hashes, k_bits)
+    match_rates = hash_match_rates(channel_hashes, k_bits)
+    frame_codes = np.asarray(channels, dtype=np.int64) * num_values + np.asarray(frame, dtype=np.int64)
+
+    phases = np.arange(frame_len)
+    search_from = np.zeros(frame_len, dtype=np.int64)
+    matches = np.zeros(frame_len, dtype=np.int64)
+    code_trials = np.zeros((frame_len, 3 * num_values), dtype=np.int64)
+    for step in range(num_tokens):
+        step_codes = frame_codes[(phases + step) % frame_len]
+        found = next_pos[step_codes, search_from]
+        matched = found < num_tokens
+        matches += matched
+        next_search = np.where(matched, found + 1, num_tokens)
+        np.add.at(code_trials, (phases, step_codes), next_search - search_from)
+        search_from = next_search
+        if not matched.any():
+            break
+
+    z_scores = calibrated_z_score(matches, code_trials, match_rates)
+    best_phase = int(z_scores.argmax())
+    return best_phase, int(matches[best_phase]), float(z_scores[best_phase])
+
+_CYCLIC_NULL_CACHE: dict[tuple, tuple[float, float]] = {}
+
+def cyclic_null_moments(num_tokens: int, frame: list[int], k_bits: int, channels: list[int], num_samples: int = 200) -> tuple[float, float]:
+    """
+    Mean and standard deviation of the best-phase z-score of cyclic_sync() on unwatermarked text,
+    so trying every phase does not inflate the chunk z-score. Every phase's z-score is already
+    standardized against the chunk's own hash frequencies, so the maximum over phases hardly
+    depends on them and is estimated once by Monte Carlo over uniformly random channel hashes.
+    """
+    bucket = _length_bucket(num_tokens)
+    key = (bucket, tuple(frame), tuple(channels), k_bits, num_samples)
+    moments = _CYCLIC_NULL_CACHE.get(key)
+    if moments is None:
+        rng = np.random.default_rng(bucket)
+        samples = [
+            cyclic_sync(rng.integers(0, 2 ** k_bits, size=(bucket, 3)), frame, k_bits, channels)[2]
+            for _ in range(num_samples)
+        ]
+        moments = (float(np.mean(samples)), float(np.std(samples)))
+        _cache_moments(_CYCLIC_NULL_CACHE, key, moments)
+    return moments
+
+def compute_detection_scores(detected_cnt: int, total_steps: int, k_bits: int) -> tuple[float, float]:
+    """
+    Accuracy and z-score of `detected_cnt` matches out of `total_steps` embedding steps,
+    against the chance match rate of 1 / 2**k_bits.
+    """
+    if total_steps > 0:
+        accuracy = detected_cnt / total_steps
+        
+        # Z-Score Calculation
+        p0 = 1.0 / (2 ** k_bits)
+        n = total_steps
+        expected_matches = n * p0
+        std_dev = math.sqrt(n * p0 * (1 - p0))
+        
+        if std_dev > 0:
+            z_score = (detected_cnt - expected_matches) / std_dev
+        else:
+            z_score = 0.0
+    else:
+        accuracy = 0.0
+        z_score = 0.0
+
+    return accuracy, z_score
@@ -0,0 +1,39 @@
+import numpy as np
+from .jamo_utils import HANGUL_START_CODE, HANGUL_END_CODE, JUNGSEONG_X_JONGSEONG_COUNT, JONGSEONG_COUNT
+from .hash_policy import HashPolicy
+
+# Number of precomposed Hangul syllables '가'(AC00) ~ '힣'(D7A3)
+SYLLABLE_COUNT = HANGUL_END_CODE - HANGUL_START_CODE + 1
+
+def _build_syllable_jamo() -> np.ndarray:
+    """
+    (x, y, z) Jamo indices of every Hangul syllable, same arithmetic as get_last_syllable_jamo().
+    """
+    relative_code = np.arange(SYLLABLE_COUNT, dtype=np.int64)
+    remaining_code = relative_code % JUNGSEONG_X_JONGSEONG_COUNT
+    return np.stack([
+        relative_code // JUNGSEONG_X_JONGSEONG_COUNT,   # Choseong index (x)
+        remaining_code // JONGSEONG_COUNT,               # Jungseong index (y)
+        remaining_code % JONGSEONG_COUNT,                # Jongseong index (z)
+    ], axis=1).astype(np.uint8)
+
+# [11172, 3] syllable -> (x, y, z) lookup table
+SYLLABLE_JAMO = _build_syllable_jamo()
+
+_HASH_TABLE_CACHE: dict[str, np.ndarray] = {}
+
+def get_syllable_hash_table(hash_policy: HashPolicy) -> np.ndarray:
+    """
+    Returns the (cached) [11172, 3] table of channel hashes for every Hangul syllable,
+    i.e. hash_policy.calculate_channel_hashes() applied to SYLLABLE_JAMO.
+    """
+    key = hash_policy.policy_id
+    table = _HASH_TABLE_CACHE.get(key)
+    if table is None:
+        # Compiled per-channel maps indexed by the Jamo columns (one gather per channel)
+        table = np.stack([
+            np.asarray(channel_map, dtype=np.int64)[SYLLABLE_JAMO[:, channel]]
+            for channel, channel_map in enumerate(hash_policy.channel_maps)
+        ], axis=1)
+        _HASH_TABLE_CACHE[key] = table
+    return table
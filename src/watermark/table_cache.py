@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+
+# Persistent on-disk cache of per-tokenizer Jamo tables.
+#
+# The cache is opt-in: tables are only persisted when get_vocab_table() gets an explicit cache_dir or
+# $JAMO_WATERMARK_CACHE_DIR is set; otherwise they live in memory only.
+# Each entry is a directory named 'jamo-table-' + the tokenizer fingerprint (hash of the vocabulary),
+# a table id and the cache format version, holding one .npy file per array plus meta.json. The cache
+# directory may be shared with other files: pruning and clearing only ever touch such entries.
+# Only the policy-independent Jamo decomposition of the vocabulary is persisted (vocab_table.py);
+# channel hashes are recomputed in memory, so the hashes of a keyed policy never reach the disk.
+# Arrays are opened with mmap_mode='c' (copy-on-write): every process maps the same page-cache pages.
+# Entries are written to a temporary directory and renamed into place, so concurrent workers never
+# read a partial entry. Entries whose metadata does not match are rebuilt, and entries of older cache
+# versions are deleted whenever a new entry is written.
+
+CACHE_VERSION = 4
+CACHE_DIR_ENV = 'JAMO_WATERMARK_CACHE_DIR'
+ENTRY_PREFIX = 'jamo-table-'
+_TMP_PREFIX = '.jamo-table-tmp-'
+_ENTRY_NAME = re.compile(r'^jamo-table-[0-9a-f]{32}-.+-v(\d+)$')
+_LEGACY_ENTRY_NAME = re.compile(r'^[0-9a-f]{32}-.+-v(\d+)$')   # Cache versions before ENTRY_PREFIX
+
+def default_cache_dir() -> str | None:
+    """
+    Cache directory from $JAMO_WATERMARK_CACHE_DIR, None (no disk cache) if it is unset or empty.
+    """
+    return os.environ.get(CACHE_DIR_ENV) or None
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """
+    SHA-256 of the tokenizer vocabulary (token string <-> id pairs, including added tokens).
+    """
+    digest = hashlib.sha256()
+    for token_str, token_id in sorted(tokenizer.get_vocab().items(), key=lambda item: item[1]):
+        digest.update(f"{token_id}\t{token_str}\n".encode('utf-8', errors='surrogatepass'))
+    digest.update(f"len={len(tokenizer)}".encode('utf-8'))
+    return digest.hexdigest()
+
+def _entry_path(cache_dir: str, fingerprint: str, table_id: str) -> str:
+    return os.path.join(cache_dir, f"{ENTRY_PREFIX}{fingerprint[:32]}-{table_id}-v{CACHE_VERSION}")
+
+def _entry_version(cache_dir: str, name: str) -> int | None:
+    """
+    Cache version of the entry `name` in `cache_dir`, None if it is not a cache entry.
+    """
+    match = _ENTRY_NAME.match(name)
+    if match is None:
+        # Unprefixed entries of older versions are only recognized along with their metadata
+        match = _LEGACY_ENTRY_NAME.match(name)
+        if match is None or not os.path.isfile(os.path.join(cache_dir, name, 'meta.json')):
+            return None
+    return int(match.group(1))
+
+def load_cached_arrays(cache_dir: str, fingerprint: str, table_id: str) -> dict[str, np.ndarray] | None:
+    """
+    Returns the cached arrays of an entry, or None if it is missing, outdated or unreadable.
+    """
+    path = _entry_path(cache_dir, fingerprint, table_id)
+    try:
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION or meta.get('fingerprint') != fingerprint \
+                or meta.get('table_id') != table_id:
+            return None
+        return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='c') for name in meta['arrays']}
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_cached_arrays(cache_dir: str, fingerprint: str, table_id: str, arrays: dict[str, np.ndarray]):
+    """
+    Atomically writes (or replaces) an entry. Failures (e.g. read-only cache directory) are ignored.
+    """
+    path = _entry_path(cache_dir, fingerprint, table_id)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix=_TMP_PREFIX)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+        meta = {'version': CACHE_VERSION, 'fingerprint': fingerprint, 'table_id': table_id, 'arrays': sorted(arrays)}
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        # Invalidate an outdated entry, then publish the new one
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process published the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        _prune_outdated_entries(cache_dir)
+    except OSError:
+        pass
+
+def _prune_outdated_entries(cache_dir: str):
+    """
+    Deletes the entries written by other cache versions (older ones may hold keyed hashes).
+    """
+    for name in os.listdir(cache_dir):
+        version = _entry_version(cache_dir, name)
+        if version is not None and version != CACHE_VERSION:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+def clear_table_cache(cache_dir: str | None = None):
+    """
+    Removes every cached table (and unfinished entry) from `cache_dir` (default: default_cache_dir()).
+    Other files and the directory itself are left in place.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.startswith(_TMP_PREFIX) or _entry_version(cache_dir, name) is not None:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
@@ -0,0 +1,81 @@
+import numpy as np
+from .table_store import load_detection_table, load_table_syllables
+from .hash_policy import HashPolicy, apply_context
+from .payload_mgr import PayloadManager, PackedPayload
+from .schedule import DEFAULT_SCHEDULE, EmbeddingSchedule
+from .scoring import compute_detection_scores, compute_alignment_scores, greedy_sync, payload_to_symbols, symbols_to_bits
+
+class JamoTableDetector:
+    """
+    Detection-only JamoWatermarkDetector that needs neither torch nor transformers.
+
+    Works on plain token id arrays with a detection table exported by
+    JamoWatermarkDetector.export_detection_table() (see table_store.py).
+    """
+    def __init__(
+        self,
+        table_path: str,
+        original_message: str,
+        schedule: EmbeddingSchedule | None = None,
+        hash_policy: HashPolicy | None = None
+    ):
+        """
+        Args:
+            hash_policy (HashPolicy | None): Policy the table was exported with; required for keyed
+                tables (the table only stores the policy_id, not the key).
+        """
+        self.hashes, meta = load_detection_table(table_path)
+        self.mode = meta['mode']
+        self.k_bits = meta['k_bits']
+        self.vocab_size = meta['vocab_size']
+        self.packed_payload = PayloadManager().encode_packed(original_message, k_bits=self.k_bits)
+        self.payload = self.packed_payload.bits
+        if hash_policy is None:
+            hash_policy = HashPolicy(mode=self.mode, k_bits=self.k_bits)
+        if hash_policy.policy_id != meta['policy_id']:
+            raise ValueError(f"Detection table was exported for hash policy '{meta['policy_id']}', got '{hash_policy.policy_id}'")
+        self.hash_policy = hash_policy
+        self.context_masks = hash_policy.context_masks
+        self.syllables = load_table_syllables(table_path) if self.context_masks is not None else None
+        if self.context_masks is not None and self.syllables is None:
+            raise ValueError("Detection table has no syllables.npy, required by a context-dependent hash policy")
+        self.schedule = schedule if schedule is not None else DEFAULT_SCHEDULE
+
+    def _channel_hashes(self, token_ids) -> np.ndarray:
+        """
+        [num_hangul_tokens, 3] channel hashes of a sequence of token ids.
+        """
+        token_ids = np.asarray(token_ids, dtype=np.int64).reshape(-1)
+        token_ids = token_ids[(token_ids >= 0) & (token_ids < self.vocab_size)]
+        token_hashes = self.hashes[token_ids]
+        keep = token_hashes[:, 0] >= 0  # Drop non-Hangul and special tokens
+        if self.context_masks is None:
+            return token_hashes[keep]
+        return apply_context(token_hashes[keep], self.syllables[token_ids[keep]], self.context_masks)[0]
+
+    def extract_payload(self, token_ids, target_payload: str | PackedPayload | None = None) -> tuple[float, str, float]:
+        """
+        Same result as JamoWatermarkDetector.extract_payload() for a single sequence of token ids.
+        """
+        if target_payload is None:
+            target_payload = self.packed_payload
+
+        targets = payload_to_symbols(target_payload, self.k_bits)
+        channels = self.schedule.channels(targets, self.hash_policy)
+        detected_cnt = greedy_sync(self._channel_hashes(token_ids), targets, self.k_bits, channels)
+
+        extracted_payload = symbols_to_bits(targets[:detected_cnt], self.k_bits, len(target_payload))
+        accuracy, z_score = compute_detection_scores(detected_cnt, len(target_payload) // self.k_bits, self.k_bits)
+        return accuracy, extracted_payload, z_score
+
+    def extract_payload_aligned(self, token_ids, target_payload: str | PackedPayload | None = None) -> tuple[float, int, float]:
+        """
+        Same result as JamoWatermarkDetector.extract_payload_aligned() for a single sequence of token ids.
+        """
+        if target_payload is None:
+            target_payload = self.packed_payload
+
+        targets = payload_to_symbols(target_payload, self.k_bits)
+        channels = self.schedule.channels(targets, self.hash_policy)
+        channel_hashes = self._channel_hashes(token_ids)
+        return compute_alignment_scores(channel_hashes, targets, self.k_bits, channels)
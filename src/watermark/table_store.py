@@ -0,0 +1,75 @@
+import json
+import os
+import numpy as np
+
+# Torch-free (de)serialization of per-tokenizer detection tables.
+#
+# A detection table is a directory holding
+#   hashes.npy : [vocab_size, 3] int16 channel hashes per token id, -1 for tokens that can never
+#                carry a watermark bit (no Hangul syllable, or special tokens such as BOS/EOS/PAD)
+#   syllables.npy : [vocab_size] int16 last syllable index per token id (-1 without Hangul), needed
+#                by context-dependent hash policies (version 2)
+#   meta.json  : format version, mode, k_bits, policy_id, vocab_size and the special token ids
+# hashes.npy and syllables.npy are loaded with mmap_mode='r', so workers share one page-cache copy.
+# Version 1 tables (no syllables.npy, no policy_id) are still read as plain HashPolicy tables.
+
+TABLE_FORMAT_VERSION = 2
+SUPPORTED_TABLE_VERSIONS = (1, 2)
+
+def save_detection_table(
+    path: str,
+    hashes: np.ndarray,
+    mode: str,
+    k_bits: int,
+    special_ids: list[int],
+    syllables: np.ndarray | None = None,
+    policy_id: str | None = None
+):
+    """
+    Writes a detection table directory (see module comment).
+
+    Args:
+        syllables (np.ndarray | None): [vocab_size] last syllable index per token (-1 without Hangul).
+        policy_id (str | None): HashPolicy.policy_id of the table (default: the plain modulo policy).
+    """
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'hashes.npy'), np.ascontiguousarray(hashes, dtype=np.int16))
+    if syllables is not None:
+        np.save(os.path.join(path, 'syllables.npy'), np.ascontiguousarray(syllables, dtype=np.int16))
+    meta = {
+        'version': TABLE_FORMAT_VERSION,
+        'mode': mode,
+        'k_bits': k_bits,
+        'policy_id': policy_id if policy_id is not None else f"{mode}-k{k_bits}",
+        'vocab_size': int(hashes.shape[0]),
+        'special_ids': sorted(int(i) for i in special_ids),
+    }
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+def load_detection_table(path: str, mmap: bool = True) -> tuple[np.ndarray, dict]:
+    """
+    Loads a detection table directory.
+
+    Returns:
+        The [vocab_size, 3] hash array (memory-mapped unless mmap=False) and the metadata dict.
+    """
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') not in SUPPORTED_TABLE_VERSIONS:
+        raise ValueError(f"Unsupported detection table version {meta.get('version')} (expected {TABLE_FORMAT_VERSION})")
+    meta.setdefault('policy_id', f"{meta['mode']}-k{meta['k_bits']}")
+
+    hashes = np.load(os.path.join(path, 'hashes.npy'), mmap_mode='r' if mmap else None)
+    if hashes.shape != (meta['vocab_size'], 3):
+        raise ValueError(f"Corrupted detection table: hashes.npy has shape {hashes.shape}")
+    return hashes, meta
+
+def load_table_syllables(path: str, mmap: bool = True) -> np.ndarray | None:
+    """
+    [vocab_size] last syllable index per token of a detection table, None if the table has none (version 1).
+    """
+    syllables_path = os.path.join(path, 'syllables.npy')
+    if not os.path.exists(syllables_path):
+        return None
+    return np.load(syllables_path, mmap_mode='r' if mmap else None)
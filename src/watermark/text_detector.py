@@ -0,0 +1,137 @@
+import string
+import numpy as np
+from .jamo_utils import HANGUL_START_CODE, HANGUL_END_CODE
+from .hash_policy import NO_CONTEXT, HashPolicy, apply_context
+from .syllable_table import get_syllable_hash_table
+from .payload_mgr import PayloadManager, PackedPayload
+from .schedule import DEFAULT_SCHEDULE, EmbeddingSchedule
+from .scoring import compute_detection_scores, compute_alignment_scores, greedy_sync, payload_to_symbols, symbols_to_bits
+
+# Characters that end a token in the word-boundary heuristic
+_SEPARATOR_CHARS = string.whitespace + string.punctuation + " 　…·“”‘’「」『』《》〈〉。、"
+_SEPARATOR_CODES = np.array(sorted({ord(char) for char in _SEPARATOR_CHARS}), dtype=np.uint32)
+
+class JamoTextDetector:
+    """
+    Tokenizer-free JamoWatermarkDetector working directly on raw text.
+
+    The text is viewed as an array of UTF-32 codepoints and every Hangul syllable is decomposed at
+    once through a syllable -> channel hash lookup table. Token boundaries ("last syllable per
+    token") come either from a whitespace/punctuation heuristic or from the caller. A
+    context-dependent hash policy hashes every token with the previous token's syllable, which the
+    heuristic's words do not reproduce, so it requires the caller's boundaries.
+    """
+    def __init__(
+        self,
+        original_message: str,
+        mode: str = 'robustness',
+        k_bits: int = 2,
+        schedule: EmbeddingSchedule | None = None,
+        hash_policy: HashPolicy | None = None
+    ):
+        """
+        Args:
+            hash_policy (HashPolicy | None): Policy used at generation; overrides mode and k_bits.
+        """
+        if hash_policy is not None:
+            mode, k_bits = hash_policy.mode, hash_policy.k_bits
+        self.mode = mode
+        self.k_bits = k_bits
+        self.packed_payload = PayloadManager().encode_packed(original_message, k_bits=self.k_bits)
+        self.payload = self.packed_payload.bits
+        self.hash_policy = hash_policy if hash_policy is not None else HashPolicy(mode=self.mode, k_bits=self.k_bits)
+        self.syllable_hashes = get_syllable_hash_table(self.hash_policy)
+        self.schedule = schedule if schedule is not None else DEFAULT_SCHEDULE
+
+    def token_channel_hashes(self, text: str, boundaries: list[int] | np.ndarray | None = None) -> np.ndarray:
+        """
+        Channel hashes of the last Hangul syllable of every token that contains one.
+
+        Args:
+            text (str): Raw text.
+            boundaries: Optional end offsets (in characters, exclusive) of consecutive tokens, e.g. from a
+                tokenizer's offset mapping. If None, runs of non-separator characters are used as tokens.
+
+        Returns:
+            np.ndarray: [num_hangul_tokens, 3] channel hashes, in text order.
+        """
+        return self.token_channel_hashes_with_offsets(text, boundaries)[0]
+
+    def token_channel_hashes_with_offsets(
+        self,
+        text: str,
+        boundaries: list[int] | np.ndarray | None = None,
+        context: int = NO_CONTEXT
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        token_channel_hashes() together with the character offset of each hashed syllable.
+        `context` is the last syllable of the Hangul token before the text (context-dependent policies).
+        """
+        if boundaries is None and self.hash_policy.uses_context:
+            raise ValueError("a context-dependent hash policy needs the token boundaries of the text")
+        last_syllables, last_pos = self.token_syllables_with_offsets(text, boundaries)
+        token_hashes, _ = apply_context(self.syllable_hashes[last_syllables], last_syllables, self.hash_policy.context_masks, context)
+        return token_hashes, last_pos
+
+    def token_syllables_with_offsets(self, text: str, boundaries: list[int] | np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Index (0..11171) and character offset of the last Hangul syllable of every token that contains one.
+        """
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+        is_hangul = (codes >= HANGUL_START_CODE) & (codes <= HANGUL_END_CODE)
+
+        # Token id of every character
+        if boundaries is None:
+            is_separator = np.isin(codes, _SEPARATOR_CODES)
+            token_starts = ~is_separator & np.concatenate([[True], is_separator[:-1]])
+            token_of_char = np.cumsum(token_starts)
+        else:
+            token_of_char = np.searchsorted(np.asarray(boundaries), np.arange(len(codes)), side='right')
+
+        # Keep only the last Hangul syllable of each token
+        hangul_pos = np.flatnonzero(is_hangul)
+        hangul_tokens = token_of_char[hangul_pos]
+        is_last = np.ones(len(hangul_pos), dtype=bool)
+        is_last[:-1] = hangul_tokens[:-1] != hangul_tokens[1:]
+        last_pos = hangul_pos[is_last]
+        last_syllables = codes[last_pos].astype(np.int64) - HANGUL_START_CODE
+
+        return last_syllables, last_pos
+
+    def extract_payload(
+        self,
+        text: str,
+        target_payload: str | PackedPayload | None = None,
+        boundaries: list[int] | np.ndarray | None = None
+    ) -> tuple[float, str, float]:
+        """
+        Extracts the watermark payload from raw text (same matching rule and z-score as
+        JamoWatermarkDetector.extract_payload).
+        """
+        if target_payload is None:
+            target_payload = self.packed_payload
+
+        targets = payload_to_symbols(target_payload, self.k_bits)
+        channels = self.schedule.channels(targets, self.hash_policy)
+        detected_cnt = greedy_sync(self.token_channel_hashes(text, boundaries), targets, self.k_bits, channels)
+
+        extracted_payload = symbols_to_bits(targets[:detected_cnt], self.k_bits, len(target_payload))
+        accuracy, z_score = compute_detection_scores(detected_cnt, len(target_payload) // self.k_bits, self.k_bits)
+        return accuracy, extracted_payload, z_score
+
+    def extract_payload_aligned(
+        self,
+        text: str,
+        target_payload: str | PackedPayload | None = None,
+        boundaries: list[int] | np.ndarray | None = None
+    ) -> tuple[float, int, float]:
+        """
+        Alignment-based detection on raw text (same scores as JamoWatermarkDetector.extract_payload_aligned).
+        """
+        if target_payload is None:
+            target_payload = self.packed_payload
+
+        targets = payload_to_symbols(target_payload, self.k_bits)
+        channels = self.schedule.channels(targets, self.hash_policy)
+        channel_hashes = self.token_channel_hashes(text, boundaries)
+        return compute_alignment_scores(channel_hashes, targets, self.k_bits, channels)
@@ -0,0 +1,160 @@
+import numpy as np
+import torch
+from .jamo_utils import get_last_syllable_jamo, JUNGSEONG_X_JONGSEONG_COUNT, JONGSEONG_COUNT
+from .hash_policy import HashPolicy, NO_CONTEXT
+from .syllable_table import get_syllable_hash_table
+from .table_cache import default_cache_dir, tokenizer_fingerprint, load_cached_arrays, save_cached_arrays
+
+# Tables are expensive to build (one pass over the whole vocabulary), so they are
+# shared between processors/detectors that use the same tokenizer and hash policy.
+# The tokenizer itself is kept in the entry so its id() cannot be reused by another object.
+_TABLE_CACHE: dict[tuple[int, str], tuple[object, "JamoVocabTable"]] = {}
+
+# Table id of the persisted arrays: the Jamo decomposition only, shared by every hash policy
+_JAMO_TABLE_ID = 'jamo'
+
+class JamoVocabTable:
+    """
+    Precomputed channel hashes for every token in a tokenizer's vocabulary.
+    Replaces the per-step convert_ids_to_tokens -> get_last_syllable_jamo -> calculate_channel_hashes
+    chain with plain tensor lookups.
+    """
+    def __init__(self, tokenizer, hash_policy: HashPolicy, cache_dir: str | None = None):
+        """
+        Args:
+            tokenizer: Tokenizer whose vocabulary is decomposed.
+            hash_policy (HashPolicy): Policy used to hash the Jamo indices.
+            cache_dir (str | None): On-disk cache of the Jamo decomposition (see table_cache.py).
+                None disables it. Channel hashes are always computed in memory.
+        """
+        self.vocab_size = len(tokenizer)
+        self.mode = hash_policy.mode
+        self.k_bits = hash_policy.k_bits
+        self.policy_id = hash_policy.policy_id
+
+        arrays = None
+        if cache_dir is not None:
+            fingerprint = tokenizer_fingerprint(tokenizer)
+            arrays = load_cached_arrays(cache_dir, fingerprint, _JAMO_TABLE_ID)
+            if arrays is not None and arrays['jamo'].shape != (self.vocab_size, 3):
+                arrays = None
+        if arrays is None:
+            arrays = self._build_arrays(tokenizer)
+            if cache_dir is not None:
+                save_cached_arrays(cache_dir, fingerprint, _JAMO_TABLE_ID, arrays)
+
+        # Channel hashes through the syllable -> hash table (same values as calculate_channel_hashes)
+        hangul_mask = arrays['hangul_mask']
+        hashes = get_syllable_hash_table(hash_policy)[np.where(hangul_mask, arrays['syllables'], 0)].astype(np.int16)
+        hashes[~hangul_mask] = 0
+
+        self.jamo = torch.from_numpy(arrays['jamo'])                # [vocab_size, 3] (x, y, z), -1 without Hangul
+        self.hangul_mask = torch.from_numpy(arrays['hangul_mask'])  # [vocab_size]
+        self.hashes = torch.from_numpy(hashes)                      # [vocab_size, 3]
+        self.syllables = torch.from_numpy(arrays['syllables'])      # [vocab_size] last syllable index, -1 without Hangul
+        # XOR masks of context-dependent policies, indexed by the previous Hangul syllable (see hash_policy.py)
+        masks = hash_policy.context_masks
+        self.context_masks = torch.from_numpy(masks) if masks is not None else None
+
+    def _build_arrays(self, tokenizer) -> dict[str, np.ndarray]:
+        token_strs = tokenizer.convert_ids_to_tokens(list(range(self.vocab_size)))
+
+        jamo = np.full((self.vocab_size, 3), -1, dtype=np.int16)
+        for token_id, token_str in enumerate(token_strs):
+            jamo_indices = get_last_syllable_jamo(token_str) if token_str is not None else None
+
+            # Tokens without a Hangul syllable can never carry a watermark bit
+            if jamo_indices is not None:
+                jamo[token_id] = jamo_indices
+
+        hangul_mask = jamo[:, 0] >= 0
+        syllable_idx = jamo[:, 0].astype(np.int64) * JUNGSEONG_X_JONGSEONG_COUNT \
+            + jamo[:, 1] * JONGSEONG_COUNT + jamo[:, 2]
+        syllables = np.where(hangul_mask, syllable_idx, -1).astype(np.int16)
+
+        return {'jamo': jamo, 'hangul_mask': hangul_mask, 'syllables': syllables}
+
+    def match_mask(self, token_ids: torch.LongTensor, target_bits: int | torch.LongTensor, channel_idx: int | torch.LongTensor) -> torch.BoolTensor:
+        """
+        Returns a mask that is True where the token's hash on `channel_idx` equals `target_bits`.
+        `target_bits` and `channel_idx` may be ints or tensors broadcastable against `token_ids`.
+        Token ids outside the tokenizer vocabulary (e.g. padded model embeddings, -1 padding) never match.
+        """
+        in_vocab = (token_ids >= 0) & (token_ids < self.vocab_size)
+        safe_ids = torch.where(in_vocab, token_ids, torch.zeros_like(token_ids))
+        matches = self.hangul_mask[safe_ids] & (self.hashes[safe_ids, channel_idx] == target_bits)
+        return matches & in_vocab
+
+    def is_match(self, token_id: int, target_bits: int, channel_idx: int) -> bool:
+        """
+        Single-token version of match_mask().
+        """
+        if not 0 <= token_id < self.vocab_size or not self.hangul_mask[token_id]:
+            return False
+        return int(self.hashes[token_id, channel_idx]) == target_bits
+
+    def contexts_after(self, token_ids: torch.LongTensor) -> torch.LongTensor:
+        """
+        [batch] context following each row of a [batch, seq_len] tensor: the last syllable of its
+        last Hangul token, NO_CONTEXT if it has none.
+        """
+        in_vocab = (token_ids >= 0) & (token_ids < self.vocab_size)
+        syllables = self.syllables.long()[torch.where(in_vocab, token_ids, torch.zeros_like(token_ids))]
+        syllables = torch.where(in_vocab, syllables, torch.full_like(syllables, -1))
+        positions = torch.where(syllables >= 0, torch.arange(token_ids.size(1)), torch.full_like(syllables, -1))
+        last = positions.max(dim=1).values
+        found = syllables.gather(1, last.clamp(min=0)[:, None])[:, 0]
+        return torch.where(last >= 0, found, torch.full_like(found, NO_CONTEXT))
+
+    def next_contexts(self, contexts: torch.LongTensor, token_ids: torch.LongTensor) -> torch.LongTensor:
+        """
+        Contexts after appending one token per row (unchanged for tokens without Hangul).
+        """
+        in_vocab = (token_ids >= 0) & (token_ids < self.vocab_size)
+        syllables = self.syllables.long()[token_ids.clamp(0, self.vocab_size - 1)]
+        return torch.where(in_vocab & (syllables >= 0), syllables, contexts)
+
+    def contextual_hashes(self, token_ids: torch.LongTensor, valid: torch.BoolTensor, context: int = NO_CONTEXT) -> torch.Tensor:
+        """
+        [batch, seq_len, 3] channel hashes of a [batch, seq_len] tensor of token ids. With a
+        context-dependent policy, each hash is XORed with the mask of the previous valid token's
+        syllable (`context` before the first one). Invalid positions (padding, special or non-Hangul
+        tokens) neither carry a hash nor change the context.
+        """
+        safe_ids = torch.where(valid, token_ids, torch.zeros_like(token_ids))
+        hashes = self.hashes[safe_ids]
+        if self.context_masks is None:
+            return hashes
+        syllables = self.syllables.long()[safe_ids]
+        positions = torch.where(valid, torch.arange(token_ids.size(1)), torch.full_like(token_ids, -1))
+        last_valid = positions.cummax(dim=1).values
+        previous = torch.cat([last_valid.new_full((token_ids.size(0), 1), -1), last_valid[:, :-1]], dim=1)
+        previous_syllables = syllables.gather(1, previous.clamp(min=0))
+        previous_syllables = torch.where(previous >= 0, previous_syllables, torch.full_like(previous_syllables, context))
+        return hashes ^ self.context_masks[previous_syllables].to(hashes.dtype)
+
+    def table_targets(self, target_bits: torch.LongTensor, channel_idx: torch.LongTensor, contexts: torch.LongTensor) -> torch.LongTensor:
+        """
+        Table hash a token must have to carry `target_bits` after `contexts` (target XOR context mask).
+        Rows with target_bits -1 (nothing to embed) stay -1.
+        """
+        if self.context_masks is None:
+            return target_bits
+        masked = target_bits ^ self.context_masks[contexts, channel_idx]
+        return torch.where(target_bits >= 0, masked, target_bits)
+
+
+def get_vocab_table(tokenizer, hash_policy: HashPolicy, cache_dir: str | None = None) -> JamoVocabTable:
+    """
+    Returns the (cached) JamoVocabTable for a (tokenizer, hash policy) combination.
+    Tables are also persisted in `cache_dir` (default: $JAMO_WATERMARK_CACHE_DIR, see table_cache.py);
+    without either they are kept in memory only.
+    """
+    key = (id(tokenizer), hash_policy.policy_id)
+    entry = _TABLE_CACHE.get(key)
+    if entry is not None and entry[1].vocab_size == len(tokenizer):
+        return entry[1]
+
+    table = JamoVocabTable(tokenizer, hash_policy, cache_dir=cache_dir or default_cache_dir())
+    _TABLE_CACHE[key] = (tokenizer, table)
+    return table